@@ -0,0 +1,8 @@
+"""
+Load-testing harness: a fake Gemini/Mistral provider and a load driver that
+reports throughput, latency percentiles, event-loop lag and DB lock
+contention as JSON. Run from the repository root:
+
+    python -m backend.bench run --mix chat=6,list=3,create=1 --concurrency 32 --duration 30
+    python -m backend.bench compare bench-results/<old>.json bench-results/<new>.json
+"""
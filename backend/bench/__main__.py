@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import sys
+
+from .loadgen import REPO_ROOT, compare_reports, run_benchmark
+from .startup import PHASES, check_budgets, measure_startup
+
+
+def _run(args) -> int:
+    report = run_benchmark(args)
+    output = args.output
+    if output is None:
+        revision = (report["commit"] or "unknown")[:10] + ("-dirty" if report["dirty"] else "")
+        stamp = report["started_at"].replace(":", "").replace("-", "")[:15]
+        output = os.path.join(REPO_ROOT, "bench-results", f"{stamp}-{revision}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+
+    summary = report["summary"]
+    print(f"{summary['ok']} ok / {summary['requests']} requests in {summary['duration_s']}s: {summary['rps']} req/s")
+    for workload, result in report["workloads"].items():
+        latency = result["latency_ms"] or {}
+        print(f"  {workload:<7} {result['rps']:>8} req/s  p50 {latency.get('p50')} ms  p95 {latency.get('p95')} ms  "
+              f"p99 {latency.get('p99')} ms  errors {result['errors'] or 0}")
+    lag = report["server"]["event_loop_lag_ms"] or {}
+    db = report["server"]["db"]
+    print(f"  event loop lag p99 {lag.get('p99')} ms, DB lock errors {db['lock_errors']}, "
+          f"DB write p99 {(db['write_ms'] or {}).get('p99')} ms")
+    print(f"Report written to {output}")
+    return 0
+
+
+def _compare(args) -> int:
+    with open(args.baseline, encoding="utf-8") as file:
+        baseline = json.load(file)
+    with open(args.candidate, encoding="utf-8") as file:
+        candidate = json.load(file)
+    lines, regressions = compare_reports(baseline, candidate, args.threshold)
+    print("\n".join(lines))
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def _startup(args) -> int:
+    env = dict(item.split("=", 1) for item in args.env)
+    report = measure_startup(args.runs, env, importtime_top=args.importtime)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+    print(f"Cold start over {report['runs']} runs (Python {report['python']}):")
+    for phase in PHASES:
+        result = report["summary"][phase]
+        print(f"  {phase:<14} p50 {result['p50']:>8} ms  max {result['max']:>8} ms  first run {report['first_run'][phase]} ms")
+    if report["slowest_imports_ms"]:
+        print("Slowest imports of backend.main:")
+        for name, ms in report["slowest_imports_ms"]:
+            print(f"  {ms:>8} ms  {name}")
+    over = check_budgets(report, {"import_ms": args.budget_import_ms, "ready_ms": args.budget_ready_ms})
+    if over:
+        print(f"\nStartup budget exceeded: {'; '.join(over)}")
+        return 1
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m backend.bench", description="Load tests for the genana backend.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run a workload and write a JSON report")
+    run.add_argument("--mix", default="chat=6,list=3,create=1",
+                     help="workload weights; workloads: chat, stream, create, list, get")
+    run.add_argument("--concurrency", type=int, default=16, help="closed-loop clients")
+    run.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    run.add_argument("--warmup", type=float, default=5.0, help="seconds run before measuring")
+    run.add_argument("--models", default="mistral-small-latest,gemini-2.5-flash", help="models of the seeded characters")
+    run.add_argument("--characters", type=int, default=20, help="characters created before the run")
+    run.add_argument("--repeat-messages", action="store_true",
+                     help="reuse a few chat messages so the response cache and coalescing can hit")
+    run.add_argument("--seed", type=int, default=None)
+    run.add_argument("--workers", type=int, default=1, help="uvicorn worker processes for the app")
+    run.add_argument("--port", type=int, default=8100, help="port of the app started by the bench")
+    run.add_argument("--provider-port", type=int, default=8765, help="port of the fake provider")
+    run.add_argument("--provider-option", action="append", default=[],
+                     help="option passed to the fake provider, e.g. --provider-option=--error-rate=0.05")
+    run.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                     help="environment of the app, e.g. --env LLM_SINGLE_FLIGHT=false")
+    run.add_argument("--url", default=None, help="benchmark an already running app instead of starting one")
+    run.add_argument("--provider-url", default=None, help="fake provider the app already talks to")
+    run.add_argument("--output", default=None, help="report path (default: bench-results/<time>-<commit>.json)")
+    run.set_defaults(handler=_run)
+
+    compare = commands.add_parser("compare", help="compare two reports")
+    compare.add_argument("baseline")
+    compare.add_argument("candidate")
+    compare.add_argument("--threshold", type=float, default=10.0,
+                         help="percent change counted as a regression (exit code 1)")
+    compare.set_defaults(handler=_compare)
+
+    startup = commands.add_parser("startup", help="measure cold start: import, app creation and lifespan startup")
+    startup.add_argument("--runs", type=int, default=7, help="measured runs, each in a fresh interpreter")
+    startup.add_argument("--budget-import-ms", type=float, default=None,
+                         help="median import time above which the exit code is 1")
+    startup.add_argument("--budget-ready-ms", type=float, default=None,
+                         help="median time to a started app above which the exit code is 1")
+    startup.add_argument("--importtime", type=int, default=10, metavar="N",
+                         help="list the N slowest imports of backend.main (0 to skip)")
+    startup.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                         help="environment of the app, e.g. --env GENANA_WARM_HTTP_POOLS=true")
+    startup.add_argument("--output", default=None, help="also write the report as JSON")
+    startup.set_defaults(handler=_startup)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
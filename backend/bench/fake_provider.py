@@ -0,0 +1,204 @@
+"""
+A stand-in for the Gemini and Mistral HTTP APIs, for load tests. Point the
+backend at it with GEMINI_API_BASE / MISTRAL_API_BASE:
+
+    python -m backend.bench.fake_provider --port 8765 --latency 0.8 --error-rate 0.05
+
+Gemini's cachedContents API is emulated too; --prefill-latency adds time per
+thousand prompt tokens not served from a cached content.
+"""
+import argparse
+import asyncio
+import json
+import random
+import uuid
+from collections import Counter
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Words a reply is made of; one streamed chunk per word
+REPLY_WORDS = ("Arr,", " the", " sea", " is", " calm", " today,", " matey.", " What", " brings", " you", " aboard?")
+
+
+class FakeProviderSettings:
+    def __init__(
+        self,
+        latency: float = 0.5,
+        jitter: float = 0.2,
+        chunk_delay: float = 0.02,
+        reply_words: int = len(REPLY_WORDS),
+        error_rate: float = 0.0,
+        retry_after: float = 1.0,
+        prefill_latency: float = 0.0,
+        seed: int = None,
+    ):
+        # Seconds before the first token, +/- jitter (uniform)
+        self.latency = latency
+        self.jitter = jitter
+        # Seconds between streamed chunks (also added per chunk to plain replies)
+        self.chunk_delay = chunk_delay
+        self.reply_words = max(1, reply_words)
+        # Share of requests answered with 429 and a Retry-After header
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        # Extra seconds before the first token per 1000 uncached prompt tokens
+        self.prefill_latency = prefill_latency
+        self.random = random.Random(seed)
+
+
+def create_app(settings: FakeProviderSettings) -> FastAPI:
+    app = FastAPI()
+    counts = Counter()
+    # Cached content name -> its token count
+    cached_contents = {}
+
+    def words():
+        return [REPLY_WORDS[i % len(REPLY_WORDS)] for i in range(settings.reply_words)]
+
+    def first_token_delay(uncached_tokens: int = 0) -> float:
+        prefill = settings.prefill_latency * uncached_tokens / 1000
+        return max(settings.latency + settings.random.uniform(-settings.jitter, settings.jitter), 0.0) + prefill
+
+    def rate_limited(provider: str):
+        if settings.error_rate > 0 and settings.random.random() < settings.error_rate:
+            counts[f"{provider}_429"] += 1
+            return JSONResponse(
+                {"error": {"code": 429, "message": "Resource has been exhausted (fake provider)."}},
+                status_code=429,
+                headers={"Retry-After": str(settings.retry_after)},
+            )
+        return None
+
+    def usage(prompt: str, completion: list):
+        return max(len(prompt) // 4, 1), len(completion)
+
+    def not_found(name: str):
+        return JSONResponse({"error": {"code": 404, "message": f"{name} not found (fake provider)."}}, status_code=404)
+
+    @app.post("/v1beta/cachedContents")
+    async def create_cached_content(request: Request):
+        body = await request.json()
+        counts["gemini_cache_created"] += 1
+        name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+        cached_contents[name] = usage(json.dumps(body.get("systemInstruction")), [])[0]
+        return {"name": name, "model": body.get("model"), "usageMetadata": {"totalTokenCount": cached_contents[name]}}
+
+    @app.patch("/v1beta/cachedContents/{cache_id}")
+    async def update_cached_content(cache_id: str):
+        name = f"cachedContents/{cache_id}"
+        if name not in cached_contents:
+            return not_found(name)
+        counts["gemini_cache_refreshed"] += 1
+        return {"name": name}
+
+    @app.delete("/v1beta/cachedContents/{cache_id}")
+    async def delete_cached_content(cache_id: str):
+        name = f"cachedContents/{cache_id}"
+        if cached_contents.pop(name, None) is None:
+            return not_found(name)
+        counts["gemini_cache_deleted"] += 1
+        return {}
+
+    @app.post("/v1beta/models/{model_action}")
+    async def gemini(model_action: str, request: Request):
+        body = await request.json()
+        counts["gemini_requests"] += 1
+        error = rate_limited("gemini")
+        if error is not None:
+            return error
+        cached_tokens = 0
+        if body.get("cachedContent"):
+            if body["cachedContent"] not in cached_contents:
+                return not_found(body["cachedContent"])
+            counts["gemini_cache_hits"] += 1
+            cached_tokens = cached_contents[body["cachedContent"]]
+        reply = words()
+        prompt_tokens, completion_tokens = usage(json.dumps(body), reply)
+        prompt_tokens += cached_tokens
+        metadata = {"promptTokenCount": prompt_tokens, "candidatesTokenCount": completion_tokens,
+                    "totalTokenCount": prompt_tokens + completion_tokens}
+        if cached_tokens:
+            metadata["cachedContentTokenCount"] = cached_tokens
+        uncached_tokens = prompt_tokens - cached_tokens
+
+        if model_action.endswith(":streamGenerateContent"):
+            async def stream():
+                await asyncio.sleep(first_token_delay(uncached_tokens))
+                for i, word in enumerate(reply):
+                    if i:
+                        await asyncio.sleep(settings.chunk_delay)
+                    chunk = {"candidates": [{"content": {"parts": [{"text": word}], "role": "model"}}]}
+                    if i == len(reply) - 1:
+                        chunk["usageMetadata"] = metadata
+                    yield f"data: {json.dumps(chunk)}\r\n\r\n"
+            return StreamingResponse(stream(), media_type="text/event-stream")
+
+        await asyncio.sleep(first_token_delay(uncached_tokens) + settings.chunk_delay * (len(reply) - 1))
+        return {
+            "candidates": [{"content": {"parts": [{"text": "".join(reply)}], "role": "model"}, "finishReason": "STOP"}],
+            "usageMetadata": metadata,
+        }
+
+    @app.post("/v1/chat/completions")
+    async def mistral(request: Request):
+        body = await request.json()
+        counts["mistral_requests"] += 1
+        error = rate_limited("mistral")
+        if error is not None:
+            return error
+        reply = words()
+        prompt_tokens, completion_tokens = usage(json.dumps(body.get("messages")), reply)
+        metadata = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens}
+
+        if body.get("stream"):
+            async def stream():
+                await asyncio.sleep(first_token_delay(prompt_tokens))
+                for i, word in enumerate(reply):
+                    if i:
+                        await asyncio.sleep(settings.chunk_delay)
+                    yield f"data: {json.dumps({'choices': [{'index': 0, 'delta': {'content': word}}]})}\n\n"
+                yield f"data: {json.dumps({'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}], 'usage': metadata})}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(stream(), media_type="text/event-stream")
+
+        await asyncio.sleep(first_token_delay(prompt_tokens) + settings.chunk_delay * (len(reply) - 1))
+        return {
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(reply)}, "finish_reason": "stop"}],
+            "usage": metadata,
+        }
+
+    @app.get("/stats")
+    def stats():
+        """Upstream calls seen so far; the bench diffs these to count real provider requests."""
+        return dict(counts)
+
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake Gemini/Mistral API for load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before the first token")
+    parser.add_argument("--jitter", type=float, default=0.2, help="uniform +/- jitter on the latency")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="seconds between streamed chunks")
+    parser.add_argument("--reply-words", type=int, default=len(REPLY_WORDS), help="chunks per reply")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of injected 429s")
+    parser.add_argument("--prefill-latency", type=float, default=0.0, help="extra seconds per 1000 uncached prompt tokens")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    import uvicorn
+    settings = FakeProviderSettings(
+        latency=args.latency, jitter=args.jitter, chunk_delay=args.chunk_delay, reply_words=args.reply_words,
+        error_rate=args.error_rate, retry_after=args.retry_after, prefill_latency=args.prefill_latency, seed=args.seed,
+    )
+    # workers=1: uvicorn would otherwise pick up WEB_CONCURRENCY from the environment
+    uvicorn.run(create_app(settings), host=args.host, port=args.port, workers=1, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
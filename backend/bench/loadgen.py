@@ -0,0 +1,537 @@
+import asyncio
+import datetime
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+# Directory that contains the `backend` package; subprocesses run from here
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REPORT_VERSION = 1
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Messages reused by --repeat-messages, so the response cache and request
+# coalescing get something to hit
+REPEATED_MESSAGES = ("Hello!", "Who are you?", "Tell me a story.", "What do you like?")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+# --- Statistics ---
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of raw samples."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def summarize_ms(values: List[float]) -> Optional[Dict[str, float]]:
+    if not values:
+        return None
+    summary = {f"p{int(q * 100)}": round(percentile(values, q) * 1000, 2) for q in QUANTILES}
+    summary["mean"] = round(sum(values) / len(values) * 1000, 2)
+    summary["max"] = round(max(values) * 1000, 2)
+    return summary
+
+
+_SAMPLE_RE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)$")
+_LABEL_RE = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_metrics(text: str) -> Dict[Tuple[str, Labels], float]:
+    """Parses the Prometheus text format served at /metrics into {(name, labels): value}."""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = _SAMPLE_RE.match(line)
+        if match is None:
+            continue
+        name, labels, value = match.groups()
+        samples[(name, tuple(sorted(_LABEL_RE.findall(labels or ""))))] = float(value)
+    return samples
+
+
+def _matches(labels: Labels, match: Optional[Dict[str, object]]) -> bool:
+    if not match:
+        return True
+    values = dict(labels)
+    for key, expected in match.items():
+        allowed = expected if isinstance(expected, (list, tuple, set)) else (expected,)
+        if values.get(key) not in allowed:
+            return False
+    return True
+
+
+def metric_delta(before, after, name: str, match: Optional[Dict[str, object]] = None) -> float:
+    """Growth of a counter (summed over the matching label sets) between two scrapes."""
+    return sum(
+        value - before.get(key, 0.0)
+        for key, value in after.items()
+        if key[0] == name and _matches(key[1], match)
+    )
+
+
+def histogram_quantiles(before, after, name: str, match: Optional[Dict[str, object]] = None) -> Optional[Dict[str, float]]:
+    """
+    Quantiles (in ms) of the observations a histogram received between two
+    scrapes, interpolated within buckets like PromQL's histogram_quantile.
+    """
+    buckets = defaultdict(float)
+    for key, value in after.items():
+        if key[0] != f"{name}_bucket" or not _matches(key[1], match):
+            continue
+        labels = dict(key[1])
+        bound = math.inf if labels["le"] == "+Inf" else float(labels["le"])
+        buckets[bound] += value - before.get(key, 0.0)
+    bounds = sorted(buckets)
+    if not bounds or buckets[bounds[-1]] <= 0:
+        return None
+    total = buckets[bounds[-1]]
+    result = {}
+    for q in QUANTILES:
+        rank = q * total
+        lower_bound, lower_count = 0.0, 0.0
+        for bound in bounds:
+            count = buckets[bound]
+            if count >= rank:
+                if bound == math.inf:
+                    value = lower_bound
+                else:
+                    value = lower_bound + (bound - lower_bound) * ((rank - lower_count) / (count - lower_count) if count > lower_count else 1.0)
+                break
+            lower_bound, lower_count = bound, count
+        result[f"p{int(q * 100)}"] = round(value * 1000, 2)
+    result["count"] = int(total)
+    return result
+
+
+# --- Workloads ---
+
+class BenchContext:
+    def __init__(self, character_ids: List[str], models: List[str], repeat_messages: bool, seed: Optional[int]):
+        self.character_ids = character_ids
+        self.models = models
+        self.repeat_messages = repeat_messages
+        self.random = random.Random(seed)
+        self.sequence = 0
+
+    def message(self) -> str:
+        if self.repeat_messages:
+            return self.random.choice(REPEATED_MESSAGES)
+        self.sequence += 1
+        return f"Bench message #{self.sequence}: how are you today?"
+
+    def character_id(self) -> str:
+        return self.random.choice(self.character_ids)
+
+
+def character_payload(model: str, index: int, description: Optional[str] = None) -> dict:
+    payload = {
+        "name": f"Bench {index}",
+        "role": "pirate captain",
+        "ai_model": model,
+        "character_traits": ["brave", "loud"],
+        "main_tasks": ["sail"],
+        "language": "English",
+    }
+    if description is not None:
+        payload["description"] = description
+    return payload
+
+
+async def _chat(client: httpx.AsyncClient, context: BenchContext):
+    response = await client.post(f"/api/chat/{context.character_id()}", json={"message": context.message()})
+    return response.status_code, None
+
+
+async def _stream(client: httpx.AsyncClient, context: BenchContext):
+    started = time.perf_counter()
+    first_token = None
+    status = None
+    async with client.stream("POST", f"/api/chat/{context.character_id()}/stream", json={"message": context.message()}) as response:
+        if response.status_code != 200:
+            await response.aread()
+            return response.status_code, None
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+                if event == "token" and first_token is None:
+                    first_token = time.perf_counter() - started
+            elif line.startswith("data: ") and event == "error":
+                # Failures after the first byte arrive as an `error` event on a 200 response
+                status = f"stream_{json.loads(line[6:]).get('status_code')}"
+            elif line.startswith("data: ") and event == "done":
+                status = 200
+    return status or "stream_incomplete", first_token
+
+
+async def _create(client: httpx.AsyncClient, context: BenchContext):
+    # No description: the character is saved at once and the description is
+    # generated by the background job queue
+    context.sequence += 1
+    model = context.models[context.sequence % len(context.models)]
+    response = await client.post("/api/characters", json=character_payload(model, context.sequence))
+    return response.status_code, None
+
+
+async def _list(client: httpx.AsyncClient, context: BenchContext):
+    response = await client.get("/api/characters", params={"limit": 50})
+    return response.status_code, None
+
+
+async def _get(client: httpx.AsyncClient, context: BenchContext):
+    response = await client.get(f"/api/characters/{context.character_id()}")
+    return response.status_code, None
+
+
+WORKLOADS = {
+    "chat": _chat,
+    "stream": _stream,
+    "create": _create,
+    "list": _list,
+    "get": _get,
+}
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """Parses e.g. "chat=6,list=3,create=1" into workload weights."""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in WORKLOADS:
+            raise ValueError(f"Unknown workload {name!r}; choose from {', '.join(WORKLOADS)}")
+        mix[name] = float(weight) if weight else 1.0
+    return mix
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.first_tokens: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+
+    def record(self, workload: str, status, elapsed: float, first_token: Optional[float]):
+        self.statuses[workload][str(status)] += 1
+        if status == 200:
+            self.latencies[workload].append(elapsed)
+            if first_token is not None:
+                self.first_tokens[workload].append(first_token)
+
+    def report(self, duration: float) -> Dict[str, dict]:
+        results = {}
+        for workload, statuses in sorted(self.statuses.items()):
+            requests = sum(statuses.values())
+            ok = statuses.get("200", 0)
+            results[workload] = {
+                "requests": requests,
+                "ok": ok,
+                "rps": round(ok / duration, 2),
+                "errors": {status: count for status, count in statuses.items() if status != "200"},
+                "latency_ms": summarize_ms(self.latencies[workload]),
+                "first_token_ms": summarize_ms(self.first_tokens[workload]),
+            }
+        return results
+
+
+async def _client_lag(samples: List[float], interval: float = 0.05):
+    """Lag of the driver's own loop; high values mean the client, not the server, is saturated."""
+    loop = asyncio.get_running_loop()
+    while True:
+        due = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(loop.time() - due, 0.0))
+
+
+async def _scrape(client: httpx.AsyncClient) -> Dict[Tuple[str, Labels], float]:
+    response = await client.get("/metrics")
+    response.raise_for_status()
+    return parse_metrics(response.text)
+
+
+async def _provider_stats(provider_url: Optional[str]) -> Counter:
+    if not provider_url:
+        return Counter()
+    async with httpx.AsyncClient(base_url=provider_url, timeout=10) as client:
+        try:
+            return Counter((await client.get("/stats")).json())
+        except httpx.HTTPError:
+            return Counter()
+
+
+async def seed_characters(client: httpx.AsyncClient, models: List[str], count: int) -> List[str]:
+    ids = []
+    for index in range(count):
+        payload = character_payload(models[index % len(models)], index, description="A seasoned bench pirate.")
+        response = await client.post("/api/characters", json=payload)
+        response.raise_for_status()
+        ids.append(response.json()["id"])
+    return ids
+
+
+async def run_load(
+    base_url: str,
+    mix: Dict[str, float],
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    models: List[str],
+    characters: int,
+    repeat_messages: bool = False,
+    provider_url: Optional[str] = None,
+    seed: Optional[int] = None,
+) -> dict:
+    """Drives a running server with `concurrency` closed-loop workers and returns the report sections."""
+    limits = httpx.Limits(max_connections=concurrency + 2, max_keepalive_connections=concurrency + 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        character_ids = await seed_characters(client, models, characters)
+        context = BenchContext(character_ids, models, repeat_messages, seed)
+        names, weights = list(mix), list(mix.values())
+        recorder = Recorder()
+        loop = asyncio.get_running_loop()
+        recording = False
+
+        async def worker():
+            while loop.time() < deadline:
+                workload = context.random.choices(names, weights)[0]
+                started = time.perf_counter()
+                try:
+                    status, first_token = await WORKLOADS[workload](client, context)
+                except httpx.HTTPError as e:
+                    status, first_token = type(e).__name__, None
+                if recording:
+                    recorder.record(workload, status, time.perf_counter() - started, first_token)
+
+        client_lag: List[float] = []
+        lag_task = asyncio.create_task(_client_lag(client_lag))
+        deadline = loop.time() + warmup + duration
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        try:
+            await asyncio.sleep(warmup)
+            before = await _scrape(client)
+            provider_before = await _provider_stats(provider_url)
+            client_lag.clear()
+            recording = True
+            started = time.perf_counter()
+            await asyncio.gather(*workers)
+            elapsed = time.perf_counter() - started
+            recording = False
+            after = await _scrape(client)
+            provider_after = await _provider_stats(provider_url)
+        finally:
+            lag_task.cancel()
+            for task in workers:
+                task.cancel()
+
+    workloads = recorder.report(elapsed)
+    ok = sum(result["ok"] for result in workloads.values())
+    requests = sum(result["requests"] for result in workloads.values())
+    writes = {"operation": ("INSERT", "UPDATE", "DELETE")}
+    return {
+        "summary": {
+            "duration_s": round(elapsed, 2),
+            "requests": requests,
+            "ok": ok,
+            "errors": requests - ok,
+            "rps": round(ok / elapsed, 2),
+        },
+        "workloads": workloads,
+        "server": {
+            "event_loop_lag_ms": histogram_quantiles(before, after, "genana_event_loop_lag_seconds"),
+            "db": {
+                "lock_errors": int(metric_delta(before, after, "genana_db_lock_errors_total")),
+                # Under SQLite, lock waits inside busy_timeout show up as slow writes
+                "write_ms": histogram_quantiles(before, after, "genana_db_query_duration_seconds", writes),
+                "read_ms": histogram_quantiles(before, after, "genana_db_query_duration_seconds", {"operation": "SELECT"}),
+            },
+            "llm": {
+                "request_ms": histogram_quantiles(before, after, "genana_llm_request_duration_seconds"),
+                "requests_by_status": {
+                    status: int(metric_delta(before, after, "genana_llm_request_duration_seconds_count", {"status": status}))
+                    for status in sorted({dict(key[1]).get("status") for key in after if key[0] == "genana_llm_request_duration_seconds_count"})
+                },
+                "coalesced": int(metric_delta(before, after, "genana_llm_single_flight_suppressed_total")),
+                "cache_hits": int(metric_delta(before, after, "genana_llm_response_cache_lookups_total", {"result": ("hit", "similar_hit")})),
+                "rate_limit_rejections": int(metric_delta(before, after, "genana_llm_rate_limit_rejected_total")),
+                "upstream_requests": sum(provider_after[key] - provider_before[key] for key in ("gemini_requests", "mistral_requests")),
+                "upstream_429": sum(provider_after[key] - provider_before[key] for key in ("gemini_429", "mistral_429")),
+            },
+            "chat_stages_ms": {
+                stage: histogram_quantiles(before, after, "genana_chat_stage_duration_seconds", {"stage": stage})
+                for stage in sorted({dict(key[1]).get("stage") for key in after if key[0] == "genana_chat_stage_duration_seconds_count"})
+            },
+        },
+        "client": {"event_loop_lag_ms": summarize_ms(client_lag)},
+    }
+
+
+# --- Processes ---
+
+def _wait_ready(url: str, process: subprocess.Popen, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{' '.join(process.args)} exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def start_fake_provider(port: int, options: List[str]) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "backend.bench.fake_provider", "--port", str(port), *options],
+        cwd=REPO_ROOT,
+    )
+    _wait_ready(f"http://127.0.0.1:{port}/stats", process)
+    return process
+
+
+def start_app(port: int, provider_url: str, workdir: str, workers: int, env: Dict[str, str]) -> subprocess.Popen:
+    app_env = dict(os.environ)
+    app_env.update({
+        "GEMINI_API_BASE": provider_url,
+        "MISTRAL_API_BASE": provider_url,
+        "GEMINI_API_KEY": "bench",
+        "MISTRAL_API_KEY": "bench",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "LLM_RESPONSE_CACHE_PATH": os.path.join(workdir, "llm_cache.db"),
+        "LOG_FILE": os.path.join(workdir, "backend.log"),
+        "LOG_LEVEL": "WARNING",
+    })
+    app_env.update(env)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=REPO_ROOT,
+        env=app_env,
+    )
+    _wait_ready(f"http://127.0.0.1:{port}/", process)
+    return process
+
+
+def _stop(process: Optional[subprocess.Popen]):
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def git_revision() -> Dict[str, object]:
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    return {"commit": git("rev-parse", "HEAD") or None, "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def run_benchmark(args) -> dict:
+    """Starts the fake provider and the app unless given URLs, runs the load and returns the full report."""
+    workdir = tempfile.mkdtemp(prefix="genana-bench-")
+    provider = app = None
+    env = dict(item.split("=", 1) for item in args.env)
+    try:
+        provider_url = args.provider_url
+        if provider_url is None and args.url is None:
+            provider = start_fake_provider(args.provider_port, args.provider_option)
+            provider_url = f"http://127.0.0.1:{args.provider_port}"
+        base_url = args.url
+        if base_url is None:
+            app = start_app(args.port, provider_url, workdir, args.workers, env)
+            base_url = f"http://127.0.0.1:{args.port}"
+
+        results = asyncio.run(run_load(
+            base_url,
+            mix=parse_mix(args.mix),
+            concurrency=args.concurrency,
+            duration=args.duration,
+            warmup=args.warmup,
+            models=args.models.split(","),
+            characters=args.characters,
+            repeat_messages=args.repeat_messages,
+            provider_url=provider_url,
+            seed=args.seed,
+        ))
+    finally:
+        _stop(app)
+        _stop(provider)
+
+    return {
+        "version": REPORT_VERSION,
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        **git_revision(),
+        "config": {
+            "mix": args.mix,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "models": args.models,
+            "characters": args.characters,
+            "repeat_messages": args.repeat_messages,
+            "workers": args.workers,
+            "provider_options": args.provider_option,
+            "env": env,
+            # /metrics is per process: with several workers only one of them is scraped
+            "server_metrics_partial": args.url is None and args.workers > 1,
+        },
+        **results,
+    }
+
+
+# --- Comparison ---
+
+def _flatten(report: dict) -> Dict[str, float]:
+    values = {"rps": report["summary"]["rps"], "errors": report["summary"]["errors"]}
+    for workload, result in report["workloads"].items():
+        values[f"{workload}.rps"] = result["rps"]
+        for section in ("latency_ms", "first_token_ms"):
+            for key, value in (result.get(section) or {}).items():
+                if key.startswith("p"):
+                    values[f"{workload}.{section}.{key}"] = value
+    server = report["server"]
+    for name, section in (("event_loop_lag_ms", server["event_loop_lag_ms"]), ("db.write_ms", server["db"]["write_ms"])):
+        for key, value in (section or {}).items():
+            if key.startswith("p"):
+                values[f"server.{name}.{key}"] = value
+    values["server.db.lock_errors"] = server["db"]["lock_errors"]
+    return values
+
+
+def compare_reports(baseline: dict, candidate: dict, threshold: float) -> Tuple[List[str], List[str]]:
+    """
+    Lines of a side-by-side table and the metrics that regressed by more than
+    `threshold` percent (lower RPS, higher latency, lag or errors).
+    """
+    base, new = _flatten(baseline), _flatten(candidate)
+    lines = [f"{'metric':<40} {'baseline':>12} {'candidate':>12} {'change':>9}"]
+    regressions = []
+    for key in sorted(set(base) | set(new)):
+        old_value, new_value = base.get(key), new.get(key)
+        if old_value is None or new_value is None:
+            lines.append(f"{key:<40} {str(old_value):>12} {str(new_value):>12} {'':>9}")
+            continue
+        change = (new_value - old_value) / old_value * 100 if old_value else (0.0 if new_value == old_value else math.inf)
+        higher_is_better = key.endswith("rps")
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > threshold:
+            regressions.append(key)
+            flag = "  <-"
+        lines.append(f"{key:<40} {old_value:>12} {new_value:>12} {change:>+8.1f}%{flag}")
+    return lines, regressions
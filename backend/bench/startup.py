@@ -0,0 +1,129 @@
+"""
+Cold-start measurements: how long a fresh interpreter takes to import the app,
+build it, and run the startup half of its lifespan (the point from which a
+new worker can serve). Each run is a separate process against a database that
+is already migrated, like a worker started next to a running deployment.
+
+    python -m backend.bench startup --runs 7 --budget-import-ms 1500 --budget-ready-ms 2500
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .loadgen import REPO_ROOT, percentile
+
+PHASES = ("process_ms", "import_ms", "create_app_ms", "lifespan_ms", "ready_ms")
+
+# Runs inside the measured interpreter; prints one JSON line
+_PROBE = r"""
+import asyncio, json, sys, time
+started = time.perf_counter()
+import backend.main as main
+imported = time.perf_counter()
+app = main.create_app()
+created = time.perf_counter()
+
+async def startup():
+    async with app.router.lifespan_context(app):
+        return time.perf_counter()
+
+ready = asyncio.run(startup())
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "lifespan_ms": (ready - created) * 1000,
+    "ready_ms": (ready - started) * 1000,
+}))
+"""
+
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def _app_env(directory: str, extra: Dict[str, str]) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(directory, 'startup.db')}",
+        "LLM_RESPONSE_CACHE_PATH": os.path.join(directory, "llm_cache.db"),
+        "LOG_FILE": os.path.join(directory, "backend.log"),
+        "LOG_LEVEL": "WARNING",
+    })
+    env.update(extra)
+    return env
+
+
+def _probe(env: Dict[str, str]) -> Dict[str, float]:
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE], cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=False,
+    )
+    process_ms = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup probe failed:\n{result.stderr[-2000:]}")
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample["process_ms"] = process_ms
+    return sample
+
+
+def slowest_imports(env: Dict[str, str], top: int) -> List[Tuple[str, float]]:
+    """Top-level imports of `backend.main` by cumulative import time (ms), from `-X importtime`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import backend.main"],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=False,
+    )
+    # A module is listed after its children; depth 1 is imported by backend.main itself
+    children, modules = [], []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if not match:
+            continue
+        depth = (len(match.group(3)) - 1) // 2
+        if depth == 1:
+            children.append((match.group(4), int(match.group(2)) / 1000))
+        elif depth == 0:
+            if match.group(4) == "backend.main":
+                modules = children
+            children = []
+    return sorted(modules, key=lambda module: module[1], reverse=True)[:top]
+
+
+def measure_startup(runs: int, env: Optional[Dict[str, str]] = None, importtime_top: int = 0) -> dict:
+    with tempfile.TemporaryDirectory(prefix="genana-startup-") as directory:
+        app_env = _app_env(directory, env or {})
+        migrated = subprocess.run(
+            [sys.executable, "-m", "backend.migrate"], cwd=REPO_ROOT, env=app_env, capture_output=True, text=True, check=False,
+        )
+        if migrated.returncode != 0:
+            raise RuntimeError(f"Migration failed:\n{migrated.stderr[-2000:]}")
+        # The first run also warms the OS file cache; it is reported but not summarised
+        first = _probe(app_env)
+        samples = [_probe(app_env) for _ in range(runs)]
+        imports = slowest_imports(app_env, importtime_top) if importtime_top else []
+
+    summary = {}
+    for phase in PHASES:
+        values = [sample[phase] for sample in samples]
+        summary[phase] = {
+            "p50": round(percentile(values, 0.5), 1),
+            "max": round(max(values), 1),
+        }
+    return {
+        "python": sys.version.split()[0],
+        "runs": runs,
+        "first_run": {phase: round(first[phase], 1) for phase in PHASES},
+        "summary": summary,
+        "slowest_imports_ms": [[name, round(ms, 1)] for name, ms in imports],
+    }
+
+
+def check_budgets(report: dict, budgets: Dict[str, Optional[float]]) -> List[str]:
+    """Phases whose median exceeds their budget (ms)."""
+    return [
+        f"{phase} p50 {report['summary'][phase]['p50']} ms > {budget} ms"
+        for phase, budget in budgets.items()
+        if budget is not None and report["summary"][phase]["p50"] > budget
+    ]
@@ -0,0 +1,31 @@
+import os
+from dotenv import load_dotenv
+
+# Load environment variables from a .env file
+load_dotenv()
+
+
+def env_str(name: str, default: str = None) -> str:
+    """Returns an environment variable, or the default if it is unset or empty."""
+    value = os.getenv(name)
+    return value if value else default
+
+
+def env_int(name: str, default: int) -> int:
+    """Reads an integer environment variable, falling back to the default."""
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def env_float(name: str, default: float) -> float:
+    """Reads a float environment variable, falling back to the default."""
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def env_bool(name: str, default: bool) -> bool:
+    """Reads a boolean environment variable ('1', 'true', 'yes', 'on' are truthy)."""
+    value = os.getenv(name)
+    if not value:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
@@ -0,0 +1,95 @@
+"""
+Chat history archival. A conversation's oldest messages are moved out of
+chat_message into compressed chunks in chat_archive (one row per chunk of
+consecutive messages), which keeps the hot table and its index small. Only
+messages already folded into the conversation's summary are archived, so the
+prompt context never needs them; the history API still serves them, read-only.
+The archiving itself is crud.archive_chat_history.
+"""
+import base64
+import datetime
+import gzip
+import json
+from typing import List, Optional
+
+from ..config import env_float, env_int, env_str
+from . import models
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# --- Archive Configuration ---
+# A message is archived once it is older than CHAT_ARCHIVE_AFTER_DAYS or is
+# not among the newest CHAT_ARCHIVE_KEEP_LAST of its conversation (0 disables a rule)
+CHAT_ARCHIVE_AFTER_DAYS = env_float("CHAT_ARCHIVE_AFTER_DAYS", 30.0)
+CHAT_ARCHIVE_KEEP_LAST = env_int("CHAT_ARCHIVE_KEEP_LAST", 1000)
+# Messages per chunk; only full chunks are written, the rest waits for the next run
+CHAT_ARCHIVE_CHUNK_SIZE = env_int("CHAT_ARCHIVE_CHUNK_SIZE", 500)
+# zstd needs the optional `zstandard` package
+CHAT_ARCHIVE_CODEC = env_str("CHAT_ARCHIVE_CODEC", "zstd" if ZSTD_AVAILABLE else "gzip")
+
+CODECS = ("zstd", "gzip")
+if CHAT_ARCHIVE_CODEC not in CODECS:
+    raise ValueError(f"Unknown CHAT_ARCHIVE_CODEC: {CHAT_ARCHIVE_CODEC}. Expected one of: {', '.join(CODECS)}")
+if CHAT_ARCHIVE_CODEC == "zstd" and not ZSTD_AVAILABLE:
+    raise ValueError("CHAT_ARCHIVE_CODEC=zstd requires the zstandard package")
+
+# History cursors carry the message's position, so they stay valid when the
+# message moves into the archive and never need a lookup. Plain message ids
+# are still accepted as cursors for live messages
+CURSOR_PREFIX = "archived."
+
+
+def compress(payload: bytes, codec: str = CHAT_ARCHIVE_CODEC) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(payload)
+    return gzip.compress(payload, compresslevel=9)
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("Reading a zstd chat archive requires the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "gzip":
+        return gzip.decompress(data)
+    raise ValueError(f"Unknown chat archive codec: {codec}")
+
+
+def pack_messages(messages: List[models.ChatMessage], codec: str = CHAT_ARCHIVE_CODEC) -> bytes:
+    """Compresses messages (oldest first) into a chunk payload."""
+    rows = [[message.id, message.datetime.isoformat(), message.role, message.content] for message in messages]
+    return compress(json.dumps(rows, ensure_ascii=False, separators=(",", ":")).encode(), codec)
+
+
+def unpack_messages(chunk: models.ChatArchive) -> List[models.ChatMessage]:
+    """The messages of a chunk, oldest first, as transient (never added to a session) objects."""
+    rows = json.loads(decompress(chunk.data, chunk.codec))
+    return [
+        models.ChatMessage(
+            id=message_id, character_id=chunk.character_id, conversation_id=chunk.conversation_id,
+            datetime=datetime.datetime.fromisoformat(timestamp), role=role, content=content, archived=True,
+        )
+        for message_id, timestamp, role, content in rows
+    ]
+
+
+def history_cursor(message: models.ChatMessage) -> str:
+    """`before` cursor for the history page that ends with `message`."""
+    raw = json.dumps([message.datetime.isoformat(), message.id], separators=(",", ":"))
+    return CURSOR_PREFIX + base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> Optional[tuple]:
+    """(datetime, id) of a positional cursor, or None if `cursor` is not one."""
+    if not cursor.startswith(CURSOR_PREFIX):
+        return None
+    encoded = cursor[len(CURSOR_PREFIX):]
+    try:
+        timestamp, message_id = json.loads(base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)))
+        return datetime.datetime.fromisoformat(timestamp), str(message_id)
+    except (ValueError, TypeError):
+        return None
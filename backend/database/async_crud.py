@@ -0,0 +1,108 @@
+"""
+Async counterparts of the functions in crud.py, for use from `async def` endpoints.
+
+Every function accepts either an AsyncSession (GENANA_DB_ASYNC enabled) or a
+regular Session. With an AsyncSession the crud function runs through
+`AsyncSession.run_sync`, so all I/O goes through aiosqlite without blocking the
+event loop; with a regular Session it is offloaded to the threadpool.
+"""
+from typing import List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from . import crud, models
+from .cache import character_cache
+from .. import schemas
+
+
+async def _run(db, fn, *args, **kwargs):
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+# CRUD для Character
+async def create_character(db, character_data: dict) -> models.Character:
+    return await _run(db, crud.create_character, character_data)
+
+async def create_characters_bulk(db, characters_data: List[dict]) -> List[Tuple[Optional[models.Character], Optional[str]]]:
+    return await _run(db, crud.create_characters_bulk, characters_data)
+
+async def get_character(db, character_id: str) -> Optional[models.Character]:
+    return await _run(db, crud.get_character, character_id)
+
+async def get_character_version(db, character_id: str):
+    return await _run(db, crud.get_character_version, character_id)
+
+async def get_character_cached(db, character_id: str) -> Optional[schemas.Character]:
+    # Попадание в кэш обслуживается без перехода в пул потоков / greenlet
+    character = character_cache.get(character_id)
+    if character is not None:
+        return character
+    return await _run(db, crud.get_character_cached, character_id)
+
+async def get_characters(db, skip: int = 0, limit: int = 100) -> List[models.Character]:
+    return await _run(db, crud.get_characters, skip=skip, limit=limit)
+
+async def update_character(db, character_id: str, character_data: dict) -> Optional[models.Character]:
+    return await _run(db, crud.update_character, character_id, character_data)
+
+async def delete_character(db, character_id: str) -> Optional[models.Character]:
+    return await _run(db, crud.delete_character, character_id)
+
+# Фоновая генерация описаний
+async def get_character_ids_by_description_status(db, statuses: List[str]) -> List[str]:
+    return await _run(db, crud.get_character_ids_by_description_status, statuses)
+
+async def claim_description_job(db, character_id: str) -> bool:
+    return await _run(db, crud.claim_description_job, character_id)
+
+async def reset_description_jobs(db, character_ids: Optional[List[str]] = None, stale_before=None) -> int:
+    return await _run(db, crud.reset_description_jobs, character_ids=character_ids, stale_before=stale_before)
+
+# CRUD для Conversation
+async def create_conversation(db, character_id: str, title: Optional[str] = None) -> models.Conversation:
+    return await _run(db, crud.create_conversation, character_id, title=title)
+
+async def get_conversation(db, conversation_id: str) -> Optional[models.Conversation]:
+    return await _run(db, crud.get_conversation, conversation_id)
+
+async def get_conversations_by_character(db, character_id: str, skip: int = 0, limit: int = 100) -> List[models.Conversation]:
+    return await _run(db, crud.get_conversations_by_character, character_id, skip=skip, limit=limit)
+
+async def resolve_conversation(db, character_id: str, conversation_id: Optional[str] = None) -> Optional[models.Conversation]:
+    return await _run(db, crud.resolve_conversation, character_id, conversation_id)
+
+# CRUD для ChatMessage
+async def create_chat_message(db, message_data: dict) -> models.ChatMessage:
+    return await _run(db, crud.create_chat_message, message_data)
+
+async def append_chat_turn(
+    db, character_id: str, conversation_id: str, user_msg: str, assistant_msg: str
+) -> Tuple[models.ChatMessage, models.ChatMessage]:
+    return await _run(db, crud.append_chat_turn, character_id, conversation_id, user_msg, assistant_msg)
+
+async def get_chat_history_page(
+    db, conversation_id: str, before: Optional[str] = None, limit: int = 20, after: Optional[crud.MessagePosition] = None
+) -> Optional[List[models.ChatMessage]]:
+    return await _run(db, crud.get_chat_history_page, conversation_id, before=before, limit=limit, after=after)
+
+async def get_chat_messages_range(
+    db, conversation_id: str, after: Optional[crud.MessagePosition], until: crud.MessagePosition, limit: int = 100
+) -> List[models.ChatMessage]:
+    return await _run(db, crud.get_chat_messages_range, conversation_id, after, until, limit=limit)
+
+async def get_recent_chat_messages(db, conversation_id: str, limit: int = 20) -> List[models.ChatMessage]:
+    return await _run(db, crud.get_recent_chat_messages, conversation_id, limit=limit)
+
+# CRUD для ChatSummary
+async def get_chat_summary(db, conversation_id: str) -> Optional[models.ChatSummary]:
+    return await _run(db, crud.get_chat_summary, conversation_id)
+
+async def save_chat_summary(db, conversation_id: str, content: str, covered_until: crud.MessagePosition) -> models.ChatSummary:
+    return await _run(db, crud.save_chat_summary, conversation_id, content, covered_until)
+
+# CRUD для Review
+async def create_review(db, review_data: dict) -> models.Review:
+    return await _run(db, crud.create_review, review_data)
+
+async def get_reviews_by_character(db, character_id: str, skip: int = 0, limit: int = 100) -> List[models.Review]:
+    return await _run(db, crud.get_reviews_by_character, character_id, skip=skip, limit=limit)
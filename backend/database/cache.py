@@ -0,0 +1,165 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+from pydantic import TypeAdapter
+
+from .. import schemas
+from ..config import env_float, env_int, env_str
+
+# --- Cache Configuration ---
+CHARACTER_CACHE_BACKEND = env_str("CHARACTER_CACHE_BACKEND", "memory")
+CHARACTER_CACHE_SIZE = env_int("CHARACTER_CACHE_SIZE", 4096)
+# Seconds an entry may be served; bounds staleness of character details across
+# processes with the in-process backend (list pages are keyed by the DB's catalogue version)
+CHARACTER_CACHE_TTL = env_float("CHARACTER_CACHE_TTL", 300.0)
+
+
+class CacheBackend:
+    """
+    Storage interface for the character cache. Values are JSON strings, so any
+    key-value store (e.g. a Redis client or a local stand-in) can implement it.
+    """
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """Process-local LRU dict bounded by the number of entries."""
+    def __init__(self, max_entries: int = CHARACTER_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl if ttl else 0)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_backends: Dict[str, Callable[[], CacheBackend]] = {
+    "memory": InMemoryCacheBackend,
+}
+
+def register_cache_backend(name: str, factory: Callable[[], CacheBackend]):
+    """Registers a backend factory selectable with CHARACTER_CACHE_BACKEND=<name>."""
+    _backends[name] = factory
+
+
+class CharacterCache:
+    """
+    Read-through cache of characters (as API schemas) in front of crud.get_character
+    and crud.get_characters. Writes go through `invalidate`, which drops the
+    character's entry. List entries are keyed by the catalogue version read from
+    the database (crud.get_catalogue_version), so a write made by any process
+    makes every cached page unreachable at once.
+    """
+
+    def __init__(self, backend: Optional[CacheBackend] = None, ttl: float = CHARACTER_CACHE_TTL):
+        self._backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def backend(self) -> CacheBackend:
+        # Built lazily so that backends registered after import can be selected
+        if self._backend is None:
+            factory = _backends.get(CHARACTER_CACHE_BACKEND)
+            if factory is None:
+                raise ValueError(f"Unknown CHARACTER_CACHE_BACKEND: {CHARACTER_CACHE_BACKEND}")
+            logger.info(f"Using '{CHARACTER_CACHE_BACKEND}' character cache backend.")
+            self._backend = factory()
+        return self._backend
+
+    def _count(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def get(self, character_id: str) -> Optional[schemas.Character]:
+        raw = self.backend.get(f"character:{character_id}")
+        self._count(raw is not None)
+        return schemas.Character.model_validate_json(raw) if raw is not None else None
+
+    def put(self, db_character) -> schemas.Character:
+        character = schemas.Character.model_validate(db_character, from_attributes=True)
+        self.backend.set(f"character:{character.id}", character.model_dump_json(), self.ttl)
+        return character
+
+    def _list_key(self, skip: int, limit: int, version: str) -> str:
+        return f"characters:list:{version}:{skip}:{limit}"
+
+    def get_list(self, skip: int, limit: int, version: str) -> Optional[List[schemas.Character]]:
+        raw = self.backend.get(self._list_key(skip, limit, version))
+        self._count(raw is not None)
+        return _character_list.validate_json(raw) if raw is not None else None
+
+    def put_list(self, skip: int, limit: int, version: str, db_characters) -> List[schemas.Character]:
+        characters = [schemas.Character.model_validate(c, from_attributes=True) for c in db_characters]
+        self.backend.set(self._list_key(skip, limit, version), _character_list.dump_json(characters).decode(), self.ttl)
+        return characters
+
+    def invalidate(self, character_id: str):
+        """Call after every write to an existing character (update/delete)."""
+        self.backend.delete(f"character:{character_id}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": CHARACTER_CACHE_BACKEND,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def character_etag(character: schemas.Character) -> str:
+    version = character.updated_at or character.created_at
+    # Microsecond resolution: two writes within a second must not share an ETag
+    return f'W/"{character.id}-{version.strftime("%Y%m%d%H%M%S%f") if version else 0}"'
+
+def catalogue_etag(version: str, skip: int, limit: int) -> str:
+    return f'W/"characters-{version}-{skip}-{limit}"'
+
+
+def search_etag(version: str, query_string: str) -> str:
+    digest = hashlib.sha1(query_string.encode()).hexdigest()[:16]
+    return f'W/"characters-search-{version}-{digest}"'
+
+
+_character_list = TypeAdapter(List[schemas.Character])
+
+# Process-wide character cache, invalidated by crud on every character write
+character_cache = CharacterCache()
@@ -1,5 +1,13 @@
-from sqlalchemy.orm import Session
-from . import models
+import datetime
+from typing import Iterator, List, Optional, Tuple
+from sqlalchemy import Float, String, and_, cast, func, or_, select, text
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session, load_only
+from . import archive, models, search
+from .cache import character_cache
+from .. import schemas
+from ..external_api.prompt_cache import system_prompt_cache
+from ..logging_config import truncate
 import uuid
 from loguru import logger
 
@@ -9,70 +17,557 @@ def generate_id():
 
 # CRUD для Character
 def create_character(db: Session, character_data: dict):
-    logger.debug(f"Creating character with data: {character_data}")
+    logger.opt(lazy=True).debug("Creating character with data: {}", lambda: truncate(character_data))
     db_character = models.Character(id=generate_id(), **character_data)
     db.add(db_character)
+    # id и created_at заданы на клиенте, refresh не нужен
     db.commit()
-    db.refresh(db_character)
-    logger.debug(f"Character created with ID: {db_character.id}")
+    logger.debug("Character created with ID: {}", db_character.id)
     return db_character
 
+def create_characters_bulk(db: Session, characters_data: List[dict]) -> List[Tuple[Optional[models.Character], Optional[str]]]:
+    """
+    Вставляет пачку персонажей одной транзакцией. Если она не проходит, персонажи
+    вставляются по одному, чтобы ошибка досталась только проблемным строкам.
+    Возвращает (персонаж, None) или (None, текст ошибки) для каждого элемента по порядку.
+    """
+    logger.debug("Creating {} characters in one batch", len(characters_data))
+    db_characters = [models.Character(id=generate_id(), **data) for data in characters_data]
+    try:
+        db.add_all(db_characters)
+        db.commit()
+        results = [(db_character, None) for db_character in db_characters]
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.warning(f"Batch insert of {len(characters_data)} characters failed, retrying one by one: {e}")
+        results = []
+        for data in characters_data:
+            db_character = models.Character(id=generate_id(), **data)
+            try:
+                db.add(db_character)
+                db.commit()
+                results.append((db_character, None))
+            except SQLAlchemyError as row_error:
+                db.rollback()
+                results.append((None, str(getattr(row_error, "orig", None) or row_error)))
+    return results
+
+def iter_characters(db: Session, batch_size: int = 500) -> Iterator[models.Character]:
+    """
+    Все персонажи от старых к новым. yield_per читает строки пачками через
+    серверный курсор, так что память не растёт с размером каталога.
+    """
+    Character = models.Character
+    return db.query(Character).order_by(Character.created_at, Character.id).yield_per(batch_size)
+
 def get_character(db: Session, character_id: str):
-    logger.debug(f"Fetching character with ID: {character_id}")
+    logger.debug("Fetching character with ID: {}", character_id)
     return db.query(models.Character).filter(models.Character.id == character_id).first()
 
+def get_character_version(db: Session, character_id: str) -> Optional[Tuple[Optional[datetime.datetime], Optional[datetime.datetime]]]:
+    """
+    (updated_at, created_at) персонажа или None, если его нет: поиск по первичному
+    ключу без загрузки строки. Чат сверяет по ним скомпилированный промпт, чтобы
+    правка, сделанная другим воркером, была видна сразу.
+    """
+    row = db.query(models.Character.updated_at, models.Character.created_at).filter(models.Character.id == character_id).first()
+    return tuple(row) if row is not None else None
+
 def get_characters(db: Session, skip: int = 0, limit: int = 100):
-    logger.debug(f"Fetching characters with skip: {skip}, limit: {limit}")
+    logger.debug("Fetching characters with skip: {}, limit: {}", skip, limit)
     return db.query(models.Character).offset(skip).limit(limit).all()
 
+# Чтение персонажей через кэш (см. cache.CharacterCache)
+def get_character_cached(db: Session, character_id: str) -> Optional[schemas.Character]:
+    character = character_cache.get(character_id)
+    if character is None:
+        db_character = get_character(db, character_id)
+        if db_character is None:
+            return None
+        character = character_cache.put(db_character)
+    return character
+
+def get_catalogue_version(db: Session) -> str:
+    """
+    Версия каталога, прочитанная из самой БД, поэтому общая для всех воркеров:
+    число персонажей и время последней записи. Любое создание, изменение или
+    удаление меняет хотя бы одно из них (updated_at ставится с микросекундами).
+    """
+    count, last_created, last_updated = db.query(
+        func.count(models.Character.id), func.max(models.Character.created_at), func.max(models.Character.updated_at)
+    ).one()
+    last = max((stamp for stamp in (last_created, last_updated) if stamp is not None), default=None)
+    return f"{count}-{last:%Y%m%d%H%M%S%f}" if last else f"{count}-0"
+
+def get_characters_cached(db: Session, skip: int = 0, limit: int = 100, version: Optional[str] = None) -> List[schemas.Character]:
+    # Версию каталога передаёт эндпоинт, который уже посчитал по ней ETag
+    if version is None:
+        version = get_catalogue_version(db)
+    characters = character_cache.get_list(skip, limit, version)
+    if characters is None:
+        characters = character_cache.put_list(skip, limit, version, get_characters(db, skip=skip, limit=limit))
+    return characters
+
+# Поиск по каталогу (см. search.py). Для списков грузятся только эти колонки
+# (schemas.CharacterSummary), без полей персоны, из которых собирается промпт
+SUMMARY_COLUMNS = (
+    "id", "name", "role", "ai_model", "language", "target_audience",
+    "avatar_url", "tags", "description", "description_status", "created_at",
+)
+
+def _has_tag(db: Session, tag: str):
+    Character = models.Character
+    if db.get_bind().dialect.name == "sqlite":
+        values = func.json_each(Character.tags).table_valued("value")
+        return select(values.c.value).where(values.c.value == tag).exists()
+    # Прочие БД: JSON-массив как текст
+    return cast(Character.tags, String).like(f'%"{tag}"%')
+
+def search_characters(
+    db: Session,
+    query: Optional[str] = None,
+    language: Optional[str] = None,
+    ai_model: Optional[str] = None,
+    target_audience: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+) -> Tuple[List[models.Character], Optional[str]]:
+    """
+    Ищет персонажей по тексту и фильтрам (теги - все перечисленные). С текстом
+    запроса и FTS5 результаты упорядочены по релевантности (bm25), иначе - от
+    новых к старым. Пагинация по ключу: возвращённый курсор передаётся как
+    `cursor` для следующей страницы. ValueError - если курсор не от этого запроса.
+    """
+    logger.debug("Searching characters: {!r}, language: {}, ai_model: {}, tags: {}", query, language, ai_model, tags)
+    Character = models.Character
+    terms = search.search_terms(query)
+    db_query = db.query(Character).options(load_only(*(getattr(Character, name) for name in SUMMARY_COLUMNS)))
+
+    if terms and search.fts_available(db):
+        fts = (
+            text(
+                f"SELECT character_id, {search.rank_expression()} AS rank FROM {search.FTS_TABLE} "
+                f"WHERE {search.FTS_TABLE} MATCH :match"
+            )
+            .bindparams(match=search.match_expression(terms))
+            .columns(character_id=String, rank=Float)
+            .subquery("fts")
+        )
+        db_query = db_query.join(fts, fts.c.character_id == Character.id).add_columns(fts.c.rank)
+        mode = "rank"
+    else:
+        for term in terms:
+            pattern = f"%{term}%"
+            db_query = db_query.filter(or_(
+                Character.name.ilike(pattern), Character.role.ilike(pattern), Character.description.ilike(pattern)
+            ))
+        mode = "recent"
+
+    if language:
+        db_query = db_query.filter(Character.language == language)
+    if ai_model:
+        db_query = db_query.filter(Character.ai_model == ai_model)
+    if target_audience:
+        db_query = db_query.filter(Character.target_audience == target_audience)
+    for tag in tags or []:
+        db_query = db_query.filter(_has_tag(db, tag))
+
+    if cursor:
+        cursor_mode, key, last_id = search.decode_cursor(cursor)
+        if cursor_mode != mode:
+            raise ValueError("Search cursor does not belong to this query")
+        if mode == "rank":
+            db_query = db_query.filter(or_(fts.c.rank > key, and_(fts.c.rank == key, Character.id > last_id)))
+        else:
+            created_at = datetime.datetime.fromisoformat(key)
+            db_query = db_query.filter(or_(
+                Character.created_at < created_at, and_(Character.created_at == created_at, Character.id < last_id)
+            ))
+
+    if mode == "rank":
+        db_query = db_query.order_by(fts.c.rank.asc(), Character.id.asc())
+    else:
+        db_query = db_query.order_by(Character.created_at.desc(), Character.id.desc())
+
+    # Лишняя строка показывает, есть ли следующая страница
+    rows = db_query.limit(limit + 1).all()
+    next_cursor = None
+    if mode == "rank":
+        if len(rows) > limit:
+            last, rank = rows[limit - 1]
+            next_cursor = search.encode_cursor(mode, rank, last.id)
+        characters = [character for character, _ in rows[:limit]]
+    else:
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = search.encode_cursor(mode, last.created_at.isoformat(), last.id)
+        characters = rows[:limit]
+    return characters, next_cursor
+
 def update_character(db: Session, character_id: str, character_data: dict):
-    logger.debug(f"Updating character with ID: {character_id} with data: {character_data}")
+    logger.opt(lazy=True).debug("Updating character with ID: {} with data: {}", lambda: character_id, lambda: truncate(character_data))
     db_character = get_character(db, character_id)
     if db_character:
         for key, value in character_data.items():
             setattr(db_character, key, value)
         db.commit()
         db.refresh(db_character)
-        logger.debug(f"Character with ID: {character_id} updated.")
+        character_cache.invalidate(character_id)
+        system_prompt_cache.invalidate(character_id)
+        logger.debug("Character with ID: {} updated.", character_id)
     else:
         logger.warning(f"Character with ID: {character_id} not found for update.")
     return db_character
 
 def delete_character(db: Session, character_id: str):
-    logger.debug(f"Deleting character with ID: {character_id}")
+    logger.debug("Deleting character with ID: {}", character_id)
     db_character = get_character(db, character_id)
     if db_character:
         db.delete(db_character)
         db.commit()
-        logger.debug(f"Character with ID: {character_id} deleted.")
+        character_cache.invalidate(character_id)
+        system_prompt_cache.invalidate(character_id)
+        logger.debug("Character with ID: {} deleted.", character_id)
     else:
         logger.warning(f"Character with ID: {character_id} not found for deletion.")
     return db_character
 
+# Фоновая генерация описаний (см. backend/external_api/description_jobs.py)
+def get_character_ids_by_description_status(db: Session, statuses: List[str]) -> List[str]:
+    rows = db.query(models.Character.id).filter(models.Character.description_status.in_(statuses)).all()
+    return [row.id for row in rows]
+
+def claim_description_job(db: Session, character_id: str) -> bool:
+    """Атомарно переводит pending -> generating; False, если задачу уже взял другой воркер."""
+    claimed = (
+        db.query(models.Character)
+        .filter(models.Character.id == character_id, models.Character.description_status == "pending")
+        .update({"description_status": "generating"}, synchronize_session=False)
+    )
+    db.commit()
+    if claimed:
+        character_cache.invalidate(character_id)
+    return claimed == 1
+
+def reset_description_jobs(db: Session, character_ids: Optional[List[str]] = None, stale_before: Optional[datetime.datetime] = None) -> int:
+    """
+    Возвращает прерванные задачи (generating) в очередь. character_ids ограничивает
+    сброс задачами этого процесса, stale_before - задачами, которые не обновлялись
+    с этого момента (их процесс, скорее всего, упал), чтобы не отбирать задачи
+    у работающих воркеров.
+    """
+    query = db.query(models.Character).filter(models.Character.description_status == "generating")
+    if character_ids is not None:
+        query = query.filter(models.Character.id.in_(character_ids))
+    if stale_before is not None:
+        query = query.filter(or_(models.Character.updated_at.is_(None), models.Character.updated_at < stale_before))
+    reset = query.update({"description_status": "pending"}, synchronize_session=False)
+    db.commit()
+    if reset:
+        # Без character_ids записи остальных персонажей устаревают по CHARACTER_CACHE_TTL
+        for character_id in character_ids or []:
+            character_cache.invalidate(character_id)
+    return reset
+
+# CRUD для Conversation
+def create_conversation(db: Session, character_id: str, title: Optional[str] = None) -> models.Conversation:
+    logger.debug("Creating conversation for character ID: {}", character_id)
+    db_conversation = models.Conversation(id=generate_id(), character_id=character_id, title=title)
+    db.add(db_conversation)
+    db.commit()
+    return db_conversation
+
+def get_conversation(db: Session, conversation_id: str) -> Optional[models.Conversation]:
+    return db.get(models.Conversation, conversation_id)
+
+def get_conversations_by_character(db: Session, character_id: str, skip: int = 0, limit: int = 100) -> List[models.Conversation]:
+    logger.debug("Fetching conversations for character ID: {} with skip: {}, limit: {}", character_id, skip, limit)
+    Conversation = models.Conversation
+    return (
+        db.query(Conversation)
+        .filter(Conversation.character_id == character_id)
+        .order_by(Conversation.updated_at.desc(), Conversation.id)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+
+def resolve_conversation(db: Session, character_id: str, conversation_id: Optional[str] = None) -> Optional[models.Conversation]:
+    """
+    The conversation a chat request addresses: `conversation_id` if it belongs to
+    the character, else None. Without an id, the character's default conversation
+    (id = character id), created on first use.
+    """
+    if conversation_id is not None and conversation_id != character_id:
+        conversation = get_conversation(db, conversation_id)
+        return conversation if conversation is not None and conversation.character_id == character_id else None
+    conversation = get_conversation(db, character_id)
+    if conversation is None:
+        db.add(models.Conversation(id=character_id, character_id=character_id))
+        try:
+            db.commit()
+        except IntegrityError:
+            # Беседу по умолчанию одновременно создал другой запрос
+            db.rollback()
+        conversation = get_conversation(db, character_id)
+    return conversation
+
 # CRUD для ChatMessage
 def create_chat_message(db: Session, message_data: dict):
-    logger.debug(f"Creating chat message with data: {message_data}")
+    logger.opt(lazy=True).debug("Creating chat message with data: {}", lambda: truncate(message_data))
     db_message = models.ChatMessage(id=generate_id(), **message_data)
     db.add(db_message)
     db.commit()
-    db.refresh(db_message)
-    logger.debug(f"Chat message created with ID: {db_message.id}")
+    logger.debug("Chat message created with ID: {}", db_message.id)
     return db_message
 
-def get_chat_messages_by_character(db: Session, character_id: str, skip: int = 0, limit: int = 100):
-    logger.debug(f"Fetching chat messages for character ID: {character_id} with skip: {skip}, limit: {limit}")
-    return db.query(models.ChatMessage).filter(models.ChatMessage.character_id == character_id).offset(skip).limit(limit).all()
+def append_chat_turn(
+    db: Session, character_id: str, conversation_id: str, user_msg: str, assistant_msg: str
+) -> Tuple[models.ChatMessage, models.ChatMessage]:
+    """
+    Saves the user message and the assistant reply of one chat turn in a single
+    transaction. Ids and timestamps are generated here, so no refresh is needed.
+    """
+    logger.debug("Appending chat turn for conversation ID: {}", conversation_id)
+    now = models.utcnow()
+    user_message = models.ChatMessage(
+        id=generate_id(), character_id=character_id, conversation_id=conversation_id,
+        role="user", content=user_msg, datetime=now,
+    )
+    # The reply is stamped a microsecond later so the turn keeps its order in history
+    assistant_message = models.ChatMessage(
+        id=generate_id(), character_id=character_id, conversation_id=conversation_id,
+        role="assistant", content=assistant_msg, datetime=now + datetime.timedelta(microseconds=1),
+    )
+    db.add_all([user_message, assistant_message])
+    db.query(models.Conversation).filter(models.Conversation.id == conversation_id).update(
+        {"updated_at": assistant_message.datetime}, synchronize_session=False
+    )
+    db.commit()
+    logger.debug("Chat turn saved with IDs: {}, {}", user_message.id, assistant_message.id)
+    return user_message, assistant_message
+
+# Позиция сообщения в истории: (datetime, id)
+MessagePosition = Tuple[datetime.datetime, str]
+
+def _newer_than(position: MessagePosition):
+    ChatMessage = models.ChatMessage
+    return or_(
+        ChatMessage.datetime > position[0],
+        and_(ChatMessage.datetime == position[0], ChatMessage.id > position[1]),
+    )
+
+def _not_newer_than(position: MessagePosition):
+    ChatMessage = models.ChatMessage
+    return or_(
+        ChatMessage.datetime < position[0],
+        and_(ChatMessage.datetime == position[0], ChatMessage.id <= position[1]),
+    )
+
+def get_chat_history_page(
+    db: Session, conversation_id: str, before: Optional[str] = None, limit: int = 20,
+    after: Optional[MessagePosition] = None, include_archived: bool = False,
+) -> Optional[List[models.ChatMessage]]:
+    """
+    Keyset-paginated history, newest first. `before` is the cursor of the previous
+    page (archive.history_cursor); only messages strictly older than it are returned.
+    `after` optionally excludes everything up to and including that position.
+    `include_archived` continues into chat_archive once live messages run out.
+    Returns None if the cursor is neither a positional cursor nor the id of a
+    live message of this conversation.
+    """
+    logger.debug("Fetching chat history page for conversation ID: {} before: {}, limit: {}", conversation_id, before, limit)
+    ChatMessage = models.ChatMessage
+    query = db.query(ChatMessage).filter(ChatMessage.conversation_id == conversation_id)
+    if after is not None:
+        query = query.filter(_newer_than(after))
+    position = None
+    if before:
+        position = _history_position(db, conversation_id, before)
+        if position is None:
+            logger.warning(f"Unknown history cursor {before} for conversation ID: {conversation_id}")
+            return None
+        query = query.filter(or_(
+            ChatMessage.datetime < position[0],
+            and_(ChatMessage.datetime == position[0], ChatMessage.id < position[1]),
+        ))
+    page = query.order_by(ChatMessage.datetime.desc(), ChatMessage.id.desc()).limit(limit).all()
+    if include_archived and after is None and len(page) < limit:
+        # Архив всегда старше живых сообщений, поэтому продолжает страницу
+        oldest = (page[-1].datetime, page[-1].id) if page else position
+        page.extend(_archived_messages_before(db, conversation_id, oldest, limit - len(page)))
+    return page
+
+def _history_position(db: Session, conversation_id: str, cursor: str) -> Optional[MessagePosition]:
+    position = archive.decode_history_cursor(cursor)
+    if position is not None:
+        return position
+    ChatMessage = models.ChatMessage
+    row = (
+        db.query(ChatMessage.datetime, ChatMessage.id)
+        .filter(ChatMessage.id == cursor, ChatMessage.conversation_id == conversation_id)
+        .first()
+    )
+    # Неизвестный id не ищем перебором чанков архива: это распаковка всего
+    # архива на каждый запрос. Курсоры, которые выдаёт API, позиционные
+    return (row.datetime, row.id) if row is not None else None
+
+def get_chat_messages_range(
+    db: Session, conversation_id: str, after: Optional[MessagePosition], until: MessagePosition, limit: int = 100
+) -> List[models.ChatMessage]:
+    """Messages in (after, until], oldest first; `after=None` starts from the beginning."""
+    ChatMessage = models.ChatMessage
+    query = db.query(ChatMessage).filter(ChatMessage.conversation_id == conversation_id, _not_newer_than(until))
+    if after is not None:
+        query = query.filter(_newer_than(after))
+    return query.order_by(ChatMessage.datetime, ChatMessage.id).limit(limit).all()
+
+def get_recent_chat_messages(db: Session, conversation_id: str, limit: int = 20) -> List[models.ChatMessage]:
+    """Returns the last `limit` messages of a conversation in chronological order (for the prompt)."""
+    return list(reversed(get_chat_history_page(db, conversation_id, limit=limit)))
+
+# Архив истории чата (см. database/archive.py)
+def _archived_messages_before(
+    db: Session, conversation_id: str, position: Optional[MessagePosition], limit: Optional[int]
+) -> List[models.ChatMessage]:
+    """Archived messages strictly older than `position` (all if None), newest first."""
+    ChatArchive = models.ChatArchive
+    query = db.query(ChatArchive.id).filter(ChatArchive.conversation_id == conversation_id)
+    if position is not None:
+        query = query.filter(or_(
+            ChatArchive.first_datetime < position[0],
+            and_(ChatArchive.first_datetime == position[0], ChatArchive.first_message_id < position[1]),
+        ))
+    messages = []
+    # Сначала только id чанков: блобы читаются и распаковываются по мере надобности
+    for (chunk_id,) in query.order_by(ChatArchive.last_datetime.desc(), ChatArchive.last_message_id.desc()).all():
+        for message in reversed(archive.unpack_messages(db.get(ChatArchive, chunk_id))):
+            if position is None or (message.datetime, message.id) < position:
+                messages.append(message)
+                if limit is not None and len(messages) == limit:
+                    return messages
+    return messages
+
+def get_archivable_conversation_ids(db: Session) -> List[str]:
+    """Conversations with a summary: only summarised messages may be archived."""
+    rows = db.query(models.ChatSummary.conversation_id).filter(models.ChatSummary.covered_until.isnot(None)).all()
+    return [row.conversation_id for row in rows]
+
+def archive_chat_history(
+    db: Session, conversation_id: str, now: Optional[datetime.datetime] = None,
+    after_days: float = archive.CHAT_ARCHIVE_AFTER_DAYS, keep_last: int = archive.CHAT_ARCHIVE_KEEP_LAST,
+    chunk_size: int = archive.CHAT_ARCHIVE_CHUNK_SIZE,
+) -> int:
+    """
+    Moves a conversation's oldest messages into archive chunks, one transaction per
+    chunk. A message is eligible when it is covered by the summary and is older
+    than `after_days` or not among the newest `keep_last`. Returns the number of
+    messages archived.
+    """
+    ChatMessage = models.ChatMessage
+    summary = get_chat_summary(db, conversation_id)
+    if summary is None or summary.covered_until is None:
+        return 0
+    rules = []
+    if after_days > 0:
+        rules.append(ChatMessage.datetime < (now or models.utcnow()) - datetime.timedelta(days=after_days))
+    if keep_last > 0:
+        boundary = (
+            db.query(ChatMessage.datetime, ChatMessage.id)
+            .filter(ChatMessage.conversation_id == conversation_id)
+            .order_by(ChatMessage.datetime.desc(), ChatMessage.id.desc())
+            .offset(keep_last)
+            .first()
+        )
+        if boundary is not None:
+            rules.append(_not_newer_than((boundary.datetime, boundary.id)))
+    if not rules:
+        return 0
+
+    # Каждое правило отбирает префикс истории, поэтому чанки идут подряд от самых старых
+    query = (
+        db.query(ChatMessage)
+        .filter(
+            ChatMessage.conversation_id == conversation_id,
+            _not_newer_than((summary.covered_until, summary.covered_message_id)),
+            or_(*rules),
+        )
+        .order_by(ChatMessage.datetime, ChatMessage.id)
+        .limit(chunk_size)
+    )
+    archived = 0
+    while True:
+        messages = query.all()
+        if len(messages) < chunk_size:
+            break
+        first, last = messages[0], messages[-1]
+        db.add(models.ChatArchive(
+            id=generate_id(), character_id=first.character_id, conversation_id=conversation_id,
+            first_datetime=first.datetime, first_message_id=first.id,
+            last_datetime=last.datetime, last_message_id=last.id,
+            message_count=len(messages), codec=archive.CHAT_ARCHIVE_CODEC, data=archive.pack_messages(messages),
+        ))
+        deleted = (
+            db.query(ChatMessage)
+            .filter(ChatMessage.id.in_([message.id for message in messages]))
+            .delete(synchronize_session=False)
+        )
+        if deleted != len(messages):
+            # Эти сообщения параллельно архивирует другой процесс
+            db.rollback()
+            logger.warning(f"Conversation {conversation_id} is being archived elsewhere, skipping.")
+            break
+        db.commit()
+        db.expunge_all()
+        archived += len(messages)
+    if archived:
+        logger.info(f"Archived {archived} chat messages of conversation {conversation_id}.")
+    return archived
+
+def incremental_vacuum(db: Session, pages: int = 0) -> Optional[int]:
+    """
+    Returns up to `pages` free pages (0 = all) of an auto_vacuum=INCREMENTAL SQLite
+    database to the OS and reports how many were freed. None if the database
+    cannot vacuum incrementally (another backend, or created before auto_vacuum
+    was enabled: see `python -m backend.migrate --vacuum`).
+    """
+    if db.get_bind().dialect.name != "sqlite":
+        return None
+    connection = db.connection().connection.driver_connection
+    if connection.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return None
+    free_before = connection.execute("PRAGMA freelist_count").fetchone()[0]
+    # sqlite3.execute делает лишь один шаг PRAGMA (одна страница); executescript выполняет её целиком
+    connection.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+    freed = free_before - connection.execute("PRAGMA freelist_count").fetchone()[0]
+    db.commit()
+    return freed
+
+# CRUD для ChatSummary
+def get_chat_summary(db: Session, conversation_id: str) -> Optional[models.ChatSummary]:
+    return db.get(models.ChatSummary, conversation_id)
+
+def save_chat_summary(db: Session, conversation_id: str, content: str, covered_until: MessagePosition) -> models.ChatSummary:
+    logger.debug("Saving chat summary for conversation ID: {} covering until: {}", conversation_id, covered_until[0])
+    db_summary = get_chat_summary(db, conversation_id)
+    if db_summary is None:
+        db_summary = models.ChatSummary(conversation_id=conversation_id)
+        db.add(db_summary)
+    db_summary.content = content
+    db_summary.covered_until, db_summary.covered_message_id = covered_until
+    db.commit()
+    return db_summary
 
 # CRUD для Review
 def create_review(db: Session, review_data: dict):
-    logger.debug(f"Creating review with data: {review_data}")
+    logger.opt(lazy=True).debug("Creating review with data: {}", lambda: truncate(review_data))
     db_review = models.Review(id=generate_id(), **review_data)
     db.add(db_review)
     db.commit()
-    db.refresh(db_review)
-    logger.debug(f"Review created with ID: {db_review.id}")
+    logger.debug("Review created with ID: {}", db_review.id)
     return db_review
 
 def get_reviews_by_character(db: Session, character_id: str, skip: int = 0, limit: int = 100):
-    logger.debug(f"Fetching reviews for character ID: {character_id} with skip: {skip}, limit: {limit}")
+    logger.debug("Fetching reviews for character ID: {} with skip: {}, limit: {}", character_id, skip, limit)
     return db.query(models.Review).filter(models.Review.character_id == character_id).offset(skip).limit(limit).all()
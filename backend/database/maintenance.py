@@ -0,0 +1,92 @@
+import asyncio
+import random
+from typing import Optional
+
+from loguru import logger
+
+from ..config import env_float, env_int
+from ..metrics import CHAT_MESSAGES_ARCHIVED, DB_VACUUM_PAGES_FREED
+from . import crud, database
+
+# --- Maintenance Configuration ---
+# Seconds between maintenance runs (archival, then incremental VACUUM); 0 disables
+DB_MAINTENANCE_INTERVAL = env_float("DB_MAINTENANCE_INTERVAL", 3600.0)
+# Free pages returned to the OS per run; 0 returns all of them
+DB_VACUUM_PAGES = env_int("DB_VACUUM_PAGES", 0)
+
+
+class DatabaseMaintenance:
+    """
+    Periodically moves old chat history into chat_archive and shrinks the
+    SQLite file with an incremental VACUUM. Runs in a worker thread, one
+    transaction per archived chunk, so chat traffic only ever waits for a
+    single chunk. Every worker process runs it; concurrent runs are safe
+    (crud.archive_chat_history backs off when another process got there first).
+    """
+    def __init__(self, interval: float = DB_MAINTENANCE_INTERVAL, vacuum_pages: int = DB_VACUUM_PAGES):
+        self.interval = interval
+        self.vacuum_pages = vacuum_pages
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._vacuum_hint_logged = False
+        self.runs = 0
+        self.archived_messages = 0
+        self.freed_pages = 0
+
+    def start(self):
+        if self.interval <= 0 or self._task is not None:
+            return
+        self._stopping = False
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        # Spread the runs of several worker processes over the interval
+        await asyncio.sleep(random.uniform(0.1, 1.0) * self.interval)
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                logger.exception(f"Database maintenance failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def run_once(self) -> dict:
+        """Archives eligible chat history of every conversation, then vacuums. Blocking."""
+        archived = 0
+        db = database.SessionLocal()
+        try:
+            for conversation_id in crud.get_archivable_conversation_ids(db):
+                if self._stopping:
+                    break
+                archived += crud.archive_chat_history(db, conversation_id)
+            freed = crud.incremental_vacuum(db, self.vacuum_pages)
+        finally:
+            db.close()
+        if freed is None and database.IS_SQLITE and not self._vacuum_hint_logged:
+            self._vacuum_hint_logged = True
+            logger.info("Database was created without auto_vacuum=INCREMENTAL; run `python -m backend.migrate --vacuum` once to enable it.")
+        self.runs += 1
+        self.archived_messages += archived
+        self.freed_pages += freed or 0
+        CHAT_MESSAGES_ARCHIVED.inc(archived)
+        DB_VACUUM_PAGES_FREED.inc(freed or 0)
+        logger.debug("Database maintenance archived {} messages and freed {} pages", archived, freed)
+        return {"archived_messages": archived, "freed_pages": freed}
+
+    def stats(self) -> dict:
+        return {
+            "interval": self.interval,
+            "runs": self.runs,
+            "archived_messages": self.archived_messages,
+            "freed_pages": self.freed_pages,
+        }
+
+
+# Process-wide maintenance scheduler, started in the app lifespan
+db_maintenance = DatabaseMaintenance()
@@ -0,0 +1,130 @@
+from sqlalchemy import Column, Integer, Table, inspect, text
+from loguru import logger
+
+from .database import Base
+
+# Версия схемы. Повышается вместе с добавлением шага в MIGRATIONS.
+SCHEMA_VERSION = 6
+
+schema_version_table = Table(
+    "schema_version",
+    Base.metadata,
+    Column("version", Integer, nullable=False),
+)
+
+
+def _add_column(connection, table: str, column_ddl: str):
+    """ALTER TABLE ... ADD COLUMN, если колонки ещё нет (свежая БД уже создана по моделям)."""
+    column_name = column_ddl.split()[0]
+    existing = {column["name"] for column in inspect(connection).get_columns(table)}
+    if column_name not in existing:
+        logger.info(f"Adding column {table}.{column_name}")
+        connection.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column_ddl}'))
+
+
+def _v1_character_description_status(connection):
+    _add_column(connection, "character", "description_status VARCHAR DEFAULT 'ready'")
+
+
+def _v2_character_llm_policy(connection):
+    _add_column(connection, "character", "llm_policy JSON")
+
+
+def _v3_character_search(connection):
+    # Только SQLite с FTS5; иначе поиск работает через LIKE
+    from .search import create_fts_index
+    create_fts_index(connection)
+
+
+def _v4_chat_archive(connection):
+    # Таблицу chat_archive создаёт create_all; auto_vacuum старой БД меняет только
+    # полный VACUUM, который нельзя выполнить внутри транзакции миграции
+    logger.info("Run `python -m backend.migrate --vacuum` once to enable incremental VACUUM on an existing database.")
+
+
+def _v5_conversations(connection):
+    # Общая история персонажа становится его беседой по умолчанию (id беседы = id персонажа)
+    _add_column(connection, "chat_message", "conversation_id VARCHAR REFERENCES conversation (id)")
+    _add_column(connection, "chat_archive", "conversation_id VARCHAR REFERENCES conversation (id)")
+    connection.execute(text("UPDATE chat_message SET conversation_id = character_id WHERE conversation_id IS NULL"))
+    connection.execute(text("UPDATE chat_archive SET conversation_id = character_id WHERE conversation_id IS NULL"))
+    connection.execute(text("DROP INDEX IF EXISTS ix_chat_archive_character_id_last"))
+    connection.execute(text(
+        "INSERT INTO conversation (id, character_id, created_at, updated_at)"
+        " SELECT character_id, character_id, MIN(datetime), MAX(datetime) FROM chat_message"
+        " WHERE character_id IS NOT NULL AND character_id NOT IN (SELECT id FROM conversation)"
+        " GROUP BY character_id"
+    ))
+    # Первичный ключ chat_summary в SQLite не поменять, поэтому сводки переезжают в новую таблицу
+    if inspect(connection).has_table("chat_summary"):
+        connection.execute(text(
+            "INSERT INTO conversation (id, character_id, created_at, updated_at)"
+            " SELECT character_id, character_id, updated_at, updated_at FROM chat_summary"
+            " WHERE character_id NOT IN (SELECT id FROM conversation)"
+        ))
+        connection.execute(text(
+            "INSERT INTO conversation_summary (conversation_id, content, covered_until, covered_message_id, updated_at)"
+            " SELECT character_id, content, covered_until, covered_message_id, updated_at FROM chat_summary"
+        ))
+        connection.execute(text("DROP TABLE chat_summary"))
+
+
+def _v6_character_updated_at_index(connection):
+    # Индекс создаёт общий проход по индексам после миграций; шаг нужен, чтобы
+    # повысить версию схемы (при актуальной версии этот проход пропускается)
+    logger.info("Indexing character.updated_at for the catalogue version.")
+
+
+# (версия, описание, функция). Шаги должны быть идемпотентны.
+MIGRATIONS = [
+    (1, "character.description_status", _v1_character_description_status),
+    (2, "character.llm_policy", _v2_character_llm_policy),
+    (3, "character_fts full-text index", _v3_character_search),
+    (4, "chat_archive", _v4_chat_archive),
+    (5, "conversations", _v5_conversations),
+    (6, "character.updated_at index", _v6_character_updated_at_index),
+]
+
+
+def get_schema_version(connection) -> int:
+    if not inspect(connection).has_table("schema_version"):
+        return 0
+    return connection.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+
+def upgrade(engine, full: bool = False) -> bool:
+    """
+    Создаёт недостающие таблицы и индексы и применяет невыполненные шаги миграций.
+    Если версия схемы уже актуальна, сверка таблиц и индексов пропускается
+    (это десятки запросов при каждом старте воркера); full=True выполняет её
+    всегда. Возвращает False, если делать ничего не пришлось.
+    """
+    # Импортируем модели здесь, чтобы избежать циклических зависимостей
+    from . import models  # noqa: F401
+
+    if not full:
+        with engine.connect() as connection:
+            if get_schema_version(connection) >= SCHEMA_VERSION:
+                logger.debug("Database schema is current, skipping the schema check.")
+                return False
+
+    Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as connection:
+        current = get_schema_version(connection)
+        for version, description, step in MIGRATIONS:
+            if version > current:
+                logger.info(f"Applying migration {version}: {description}")
+                step(connection)
+        if current < SCHEMA_VERSION:
+            connection.execute(text("DELETE FROM schema_version"))
+            connection.execute(schema_version_table.insert().values(version=SCHEMA_VERSION))
+            logger.info(f"Database schema upgraded from version {current} to {SCHEMA_VERSION}")
+
+    # create_all пропускает уже существующие таблицы вместе с их индексами,
+    # поэтому новые индексы добавляем отдельно — после миграций, которые
+    # могли добавить проиндексированные колонки
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    return True
@@ -1,3 +1,4 @@
+import datetime
 from sqlalchemy import (
     create_engine,
     Column,
@@ -8,26 +9,41 @@ from sqlalchemy import (
     Boolean,
     ForeignKey,
     JSON,
+    LargeBinary,
+    Index,
     func,
 )
 from sqlalchemy.orm import relationship
 from .database import Base
 
 
+def utcnow() -> datetime.datetime:
+    """Naive UTC timestamp with microseconds, matching what SQLite's CURRENT_TIMESTAMP stores."""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
 class Character(Base):
     __tablename__ = "character"
+    __table_args__ = (
+        # Catalogue order (newest first) and keyset pagination over it
+        Index("ix_character_created_at_id", "created_at", "id"),
+        # MAX(updated_at) for the catalogue version (crud.get_catalogue_version)
+        Index("ix_character_updated_at", "updated_at"),
+    )
 
     id = Column(String, primary_key=True, index=True)
-    created_at = Column(TIMESTAMP, server_default=func.now())
-    updated_at = Column(TIMESTAMP, onupdate=func.now())
+    created_at = Column(TIMESTAMP, default=utcnow, server_default=func.now())
+    # Stamped by the client with microseconds: CURRENT_TIMESTAMP has one-second
+    # resolution, and the ETag and the prompt caches are keyed by this version
+    updated_at = Column(TIMESTAMP, onupdate=utcnow)
 
     # General Info
     name = Column(String, nullable=False)
     role = Column(String, nullable=False)
-    ai_model = Column(String, nullable=False)
+    ai_model = Column(String, nullable=False, index=True)
     format = Column(String)
-    target_audience = Column(String)
-    language = Column(String)
+    target_audience = Column(String, index=True)
+    language = Column(String, index=True)
     custom_language = Column(String)
 
     # Behavior
@@ -55,23 +71,99 @@ class Character(Base):
     avatar_url = Column(String)
     tags = Column(JSON)  # Stored as JSON array
     description = Column(String)
+    # Background description generation: pending -> generating -> ready | failed
+    description_status = Column(String, default="ready", server_default="ready")
+
+    # LLM request policy: retries, circuit breaker and fallback models (schemas.LLMPolicy)
+    llm_policy = Column(JSON)
 
     # Relationships
+    conversations = relationship("Conversation", back_populates="character")
     chat_messages = relationship("ChatMessage", back_populates="character")
     reviews = relationship("Review", back_populates="character")
 
 
+class Conversation(Base):
+    """
+    One chat thread with a character; each user or session gets its own, so
+    histories and prompt contexts do not mix. The default conversation, used
+    when a request names none, has the character's id as its own.
+    """
+    __tablename__ = "conversation"
+    __table_args__ = (
+        # A character's conversations, most recently active first
+        Index("ix_conversation_character_id_updated_at", "character_id", "updated_at"),
+    )
+
+    id = Column(String, primary_key=True)
+    character_id = Column(String, ForeignKey("character.id"))
+    title = Column(String)
+    created_at = Column(TIMESTAMP, default=utcnow, server_default=func.now())
+    # Time of the last chat turn
+    updated_at = Column(TIMESTAMP, default=utcnow)
+
+    # Relationships
+    character = relationship("Character", back_populates="conversations")
+    chat_messages = relationship("ChatMessage", back_populates="conversation")
+
+
 class ChatMessage(Base):
     __tablename__ = "chat_message"
+    __table_args__ = (
+        # Serves "latest N messages of a conversation" and keyset pagination over history
+        Index("ix_chat_message_conversation_id_datetime", "conversation_id", "datetime"),
+        Index("ix_chat_message_character_id_datetime", "character_id", "datetime"),
+    )
 
     id = Column(String, primary_key=True, index=True)
     character_id = Column(String, ForeignKey("character.id"))
-    datetime = Column(TIMESTAMP, server_default=func.now())
+    conversation_id = Column(String, ForeignKey("conversation.id"))
+    # Set client-side: CURRENT_TIMESTAMP only has second precision, which
+    # makes the user/assistant messages of one turn indistinguishable by time
+    datetime = Column(TIMESTAMP, default=utcnow, server_default=func.now())
     role = Column(String)  # 'user' or 'assistant'
     content = Column(Text, nullable=False)
 
-    # Relationship
+    # Relationships
     character = relationship("Character", back_populates="chat_messages")
+    conversation = relationship("Conversation", back_populates="chat_messages")
+
+    # Not a column: True on messages read back from chat_archive
+    archived = False
+
+
+class ChatArchive(Base):
+    """A compressed chunk of a conversation's oldest chat messages (see database/archive.py)."""
+    __tablename__ = "chat_archive"
+    __table_args__ = (
+        # Chunks of a conversation, newest first, when paging into the archive
+        Index("ix_chat_archive_conversation_id_last", "conversation_id", "last_datetime", "last_message_id"),
+    )
+
+    id = Column(String, primary_key=True)
+    character_id = Column(String, ForeignKey("character.id"))
+    conversation_id = Column(String, ForeignKey("conversation.id"))
+    # (datetime, id) of the oldest and the newest message in the chunk
+    first_datetime = Column(TIMESTAMP, nullable=False)
+    first_message_id = Column(String, nullable=False)
+    last_datetime = Column(TIMESTAMP, nullable=False)
+    last_message_id = Column(String, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    codec = Column(String, nullable=False)  # 'zstd' or 'gzip'
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(TIMESTAMP, default=utcnow)
+
+
+class ChatSummary(Base):
+    """Rolling summary of the older part of a conversation."""
+    __tablename__ = "conversation_summary"
+
+    conversation_id = Column(String, ForeignKey("conversation.id"), primary_key=True)
+    content = Column(Text, nullable=False)
+    # Newest message folded into the summary; later messages are sent verbatim
+    covered_until = Column(TIMESTAMP)
+    covered_message_id = Column(String)
+    updated_at = Column(TIMESTAMP, default=utcnow, onupdate=utcnow)
 
 
 class Review(Base):
@@ -79,7 +171,7 @@ class Review(Base):
 
     id = Column(String, primary_key=True, index=True)
     character_id = Column(String, ForeignKey("character.id"))
-    created_at = Column(TIMESTAMP, server_default=func.now())
+    created_at = Column(TIMESTAMP, default=utcnow, server_default=func.now())
     rating = Column(Integer)  # 1 to 5
     comment = Column(Text)
 
@@ -0,0 +1,103 @@
+"""
+Full-text search over the character catalogue: an SQLite FTS5 index over
+name, role, description and tags, kept in sync with the character table by
+triggers (so every write path, bulk UPDATEs included, updates it). Databases
+without FTS5 (or other backends) fall back to LIKE matching in crud.
+"""
+import base64
+import json
+import re
+from typing import List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+FTS_TABLE = "character_fts"
+
+# bm25 weight per FTS column: a hit in the name counts most, then tags and role
+BM25_WEIGHTS = {"character_id": 0.0, "name": 10.0, "role": 4.0, "description": 1.0, "tags": 6.0}
+
+# Tags are stored as a JSON array; the index gets them as space-separated words
+_TAGS_TEXT = "(SELECT group_concat(value, ' ') FROM json_each(COALESCE({row}.tags, '[]')))"
+
+_INSERT_ROW = (
+    f"INSERT INTO {FTS_TABLE} (character_id, name, role, description, tags) "
+    f"VALUES (NEW.id, NEW.name, NEW.role, NEW.description, {_TAGS_TEXT.format(row='NEW')});"
+)
+
+FTS_DDL = [
+    # unicode61 folds case for Cyrillic as well as Latin text
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "character_id UNINDEXED, name, role, description, tags, tokenize = 'unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS character_fts_insert AFTER INSERT ON character BEGIN {_INSERT_ROW} END",
+    # Writes that only touch other columns (e.g. description_status) leave the index alone
+    f"CREATE TRIGGER IF NOT EXISTS character_fts_update AFTER UPDATE OF name, role, description, tags ON character BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE character_id = OLD.id; {_INSERT_ROW} END",
+    f"CREATE TRIGGER IF NOT EXISTS character_fts_delete AFTER DELETE ON character BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE character_id = OLD.id; END",
+]
+
+_fts_available: Optional[bool] = None
+
+
+def create_fts_index(connection) -> bool:
+    """Creates the index and its triggers and fills it from the character table. False without FTS5."""
+    global _fts_available
+    if connection.dialect.name != "sqlite":
+        return False
+    try:
+        for statement in FTS_DDL:
+            connection.execute(text(statement))
+    except OperationalError as e:
+        logger.warning(f"SQLite FTS5 is unavailable, character search falls back to LIKE: {e}")
+        _fts_available = False
+        return False
+    connection.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    connection.execute(text(
+        f"INSERT INTO {FTS_TABLE} (character_id, name, role, description, tags) "
+        f"SELECT id, name, role, description, {_TAGS_TEXT.format(row='character')} FROM character"
+    ))
+    _fts_available = True
+    return True
+
+
+def fts_available(db) -> bool:
+    global _fts_available
+    if _fts_available is None:
+        bind = db.get_bind()
+        _fts_available = bind.dialect.name == "sqlite" and db.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}
+        ).first() is not None
+    return _fts_available
+
+
+def search_terms(query: Optional[str]) -> List[str]:
+    """Words of a user query; punctuation and FTS operators are dropped."""
+    return re.findall(r"\w+", query or "")[:16]
+
+
+def match_expression(terms: List[str]) -> str:
+    """FTS5 query matching rows that contain every term, each as a prefix (search-as-you-type)."""
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def rank_expression() -> str:
+    return f"bm25({FTS_TABLE}, {', '.join(str(weight) for weight in BM25_WEIGHTS.values())})"
+
+
+def encode_cursor(mode: str, key, character_id: str) -> str:
+    raw = json.dumps([mode, key, character_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, object, str]:
+    """Inverse of encode_cursor; raises ValueError on a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        mode, key, character_id = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid search cursor") from e
+    if not isinstance(mode, str) or not isinstance(character_id, str):
+        raise ValueError("Invalid search cursor")
+    return mode, key, character_id
@@ -0,0 +1,140 @@
+import asyncio
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from loguru import logger
+
+from ..config import env_int, env_str
+from ..database import async_crud, database
+from ..database.crud import MessagePosition
+from .llm import GEMINI_FLASH, llm_factory
+from .prompt_builder import build_summary_prompt
+from .tokens import estimate_tokens
+
+# --- Context Configuration ---
+# Upper bound on history rows read per chat turn, whatever the token budget
+CONTEXT_FETCH_LIMIT = env_int("CONTEXT_FETCH_LIMIT", 200)
+
+# Model used to fold older turns into the summary, and how many messages one pass folds
+SUMMARY_MODEL = env_str("SUMMARY_MODEL", GEMINI_FLASH)
+SUMMARY_BATCH_SIZE = env_int("SUMMARY_BATCH_SIZE", 100)
+
+
+class ContextWindow(NamedTuple):
+    history: List[Dict[str, str]]  # chronological, ready for BaseLLMClient
+    summary: Optional[str]
+    tokens: int
+    # Newest message left out of the window but not yet folded into the summary
+    fold_until: Optional[MessagePosition]
+
+
+def pack_context(messages, budget: int, summary: Optional[str] = None, truncated: bool = False) -> ContextWindow:
+    """
+    Packs the newest messages (given newest first) that fit in `budget` tokens
+    next to the summary. `truncated` means older unsummarised messages exist
+    beyond the ones passed in.
+    """
+    tokens = estimate_tokens(summary) if summary else 0
+    packed = []
+    fold_until = None
+    for message in messages:
+        cost = estimate_tokens(message.content)
+        if tokens + cost > budget:
+            fold_until = (message.datetime, message.id)
+            break
+        tokens += cost
+        packed.append(message)
+    else:
+        if truncated and packed:
+            # Everything fetched fits, but older turns are missing; give up the
+            # oldest packed message so the summary can be extended up to it
+            oldest = packed.pop()
+            tokens -= estimate_tokens(oldest.content)
+            fold_until = (oldest.datetime, oldest.id)
+
+    history = [{"role": message.role, "content": message.content} for message in reversed(packed)]
+    return ContextWindow(history=history, summary=summary, tokens=tokens, fold_until=fold_until)
+
+
+async def build_chat_context(db, character_id: str, conversation_id: str, model_name: str) -> ContextWindow:
+    """
+    Builds the token-bounded history for a chat turn: the conversation's persisted
+    summary plus the newest verbatim messages not covered by it. Schedules a
+    background summary refresh when unsummarised turns had to be left out.
+    """
+    summary = await async_crud.get_chat_summary(db, conversation_id)
+    covered = (summary.covered_until, summary.covered_message_id) if summary and summary.covered_until else None
+    messages = await async_crud.get_chat_history_page(db, conversation_id, limit=CONTEXT_FETCH_LIMIT, after=covered)
+
+    window = pack_context(
+        messages,
+        budget=llm_factory.history_budget(model_name),
+        summary=summary.content if summary else None,
+        truncated=len(messages) == CONTEXT_FETCH_LIMIT,
+    )
+    logger.debug("Context for conversation {}: {} messages, ~{} tokens", conversation_id, len(window.history), window.tokens)
+    if window.fold_until is not None:
+        summary_refresher.schedule(character_id, conversation_id, window.fold_until)
+    return window
+
+
+class SummaryRefresher:
+    """
+    Folds older chat turns into the persisted per-conversation summary in the
+    background, at most one pass per conversation at a time. Each pass folds up to
+    SUMMARY_BATCH_SIZE messages; the next chat turn schedules another pass if needed.
+    """
+    def __init__(self):
+        self._running: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def schedule(self, character_id: str, conversation_id: str, fold_until: MessagePosition):
+        if conversation_id in self._running:
+            return
+        self._running.add(conversation_id)
+        task = asyncio.create_task(self._refresh(character_id, conversation_id, fold_until))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, character_id: str, conversation_id: str, fold_until: MessagePosition):
+        try:
+            # The session is closed before the LLM call: holding its pooled
+            # connection for the whole generation would starve request handlers
+            async with database.open_session() as db:
+                summary = await async_crud.get_chat_summary(db, conversation_id)
+                covered = (summary.covered_until, summary.covered_message_id) if summary and summary.covered_until else None
+                messages = await async_crud.get_chat_messages_range(
+                    db, conversation_id, after=covered, until=fold_until, limit=SUMMARY_BATCH_SIZE
+                )
+                if not messages:
+                    return
+                character = await async_crud.get_character_cached(db, character_id)
+            prompt = build_summary_prompt(
+                character.context_memory if character else None,
+                summary.content if summary else None,
+                [{"role": message.role, "content": message.content} for message in messages],
+            )
+            content = await llm_factory.get_client(SUMMARY_MODEL).generate_text(
+                system_prompt="You are a precise conversation summarizer.",
+                user_message=prompt,
+                history=[],
+            )
+            last = messages[-1]
+            async with database.open_session() as db:
+                await async_crud.save_chat_summary(db, conversation_id, content.strip(), (last.datetime, last.id))
+            logger.info(f"Folded {len(messages)} messages into the summary of conversation {conversation_id}")
+        except Exception as e:
+            logger.error(f"Failed to refresh chat summary for conversation {conversation_id}: {e}")
+        finally:
+            self._running.discard(conversation_id)
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Waits for running summary passes (called on shutdown); cancels those still running after `timeout`."""
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+summary_refresher = SummaryRefresher()
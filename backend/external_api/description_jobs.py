@@ -0,0 +1,249 @@
+import asyncio
+import datetime
+from typing import Dict, Optional, Set
+
+from loguru import logger
+
+from .. import schemas
+from ..config import env_float, env_int
+from ..database import async_crud, database
+from ..database.models import utcnow
+from .llm import DESCRIPTION_FALLBACK, generate_description_text
+
+# --- Description Job Configuration ---
+# Concurrent LLM calls spent on descriptions; keeps bulk imports from starving chat traffic
+DESCRIPTION_WORKERS = env_int("DESCRIPTION_WORKERS", 2)
+DESCRIPTION_MAX_ATTEMPTS = env_int("DESCRIPTION_MAX_ATTEMPTS", 3)
+# Delay before the first retry, doubled on each further attempt
+DESCRIPTION_RETRY_DELAY = env_float("DESCRIPTION_RETRY_DELAY", 2.0)
+# Seconds after which a job left in "generating" is taken to belong to a dead
+# process and is requeued; also the interval of that check
+DESCRIPTION_JOB_LEASE = env_float("DESCRIPTION_JOB_LEASE", 300.0)
+# Seconds between description_status checks while long-polling a job that
+# another worker process may be running
+DESCRIPTION_POLL_INTERVAL = env_float("DESCRIPTION_POLL_INTERVAL", 1.0)
+
+# Shown until the background job has written the real description
+DESCRIPTION_PLACEHOLDER = "Описание персонажа генерируется..."
+
+# Values of Character.description_status
+PENDING = "pending"
+GENERATING = "generating"
+READY = "ready"
+FAILED = "failed"
+
+
+class DescriptionJobQueue:
+    """
+    Generates missing character descriptions in the background. The job state
+    lives in Character.description_status, so unfinished jobs survive a restart
+    and several processes can share the table: a worker only runs a job after
+    atomically moving it from pending to generating.
+    """
+    def __init__(self, workers: int = DESCRIPTION_WORKERS, max_attempts: int = DESCRIPTION_MAX_ATTEMPTS):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: Set[asyncio.Task] = set()
+        # Backoff task -> character it will requeue
+        self._retries: Dict[asyncio.Task, str] = {}
+        # Worker task -> character it is generating for
+        self._busy: Dict[asyncio.Task, str] = {}
+        self._reclaimer: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._done: Dict[str, asyncio.Event] = {}
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self):
+        """Starts the workers and requeues jobs left unfinished by a previous run."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._stopping = False
+        await self._reclaim()
+        for number in range(self.workers):
+            task = asyncio.create_task(self._worker(number))
+            self._workers.add(task)
+        self._reclaimer = asyncio.create_task(self._reclaim_periodically())
+
+    async def _reclaim(self):
+        """
+        Queues pending jobs, and requeues generating jobs whose lease ran out.
+        Other worker processes share the table, so fresh generating jobs are
+        theirs and are left alone.
+        """
+        stale_before = utcnow() - datetime.timedelta(seconds=DESCRIPTION_JOB_LEASE)
+        async with database.open_session() as db:
+            reset = await async_crud.reset_description_jobs(db, stale_before=stale_before)
+            pending = await async_crud.get_character_ids_by_description_status(db, [PENDING])
+        pending = [character_id for character_id in pending if character_id not in self._done]
+        for character_id in pending:
+            self.enqueue(character_id)
+        if pending or reset:
+            logger.info(f"Requeued {len(pending)} pending description jobs ({reset} abandoned).")
+
+    async def _reclaim_periodically(self):
+        while True:
+            await asyncio.sleep(DESCRIPTION_JOB_LEASE)
+            try:
+                await self._reclaim()
+            except Exception as e:
+                logger.error(f"Failed to reclaim description jobs: {e}")
+
+    def enqueue(self, character_id: str, attempt: int = 1):
+        """Queues a character whose description_status is pending."""
+        if self._queue is None:
+            logger.warning(f"Description queue is not running; job for character {character_id} stays pending.")
+            return
+        self._done.setdefault(character_id, asyncio.Event())
+        self._queue.put_nowait((character_id, attempt))
+
+    async def wait_for(self, character_id: str, timeout: float) -> bool:
+        """
+        Waits until the job of a character is finished, by any process; False
+        on timeout. A job of this process wakes the caller as soon as it ends.
+        Jobs claimed by other workers are only visible in description_status,
+        which is re-read every DESCRIPTION_POLL_INTERVAL seconds.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            if await self._finished(character_id):
+                return True
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            interval = min(DESCRIPTION_POLL_INTERVAL, remaining)
+            event = self._done.get(character_id)
+            if event is None:
+                await asyncio.sleep(interval)
+                continue
+            try:
+                await asyncio.wait_for(event.wait(), interval)
+                return True
+            except asyncio.TimeoutError:
+                pass
+
+    @staticmethod
+    async def _finished(character_id: str) -> bool:
+        async with database.open_session() as db:
+            character = await async_crud.get_character(db, character_id)
+        return character is None or character.description_status not in (PENDING, GENERATING)
+
+    async def _worker(self, number: int):
+        task = asyncio.current_task()
+        while not self._stopping:
+            character_id, attempt = await self._queue.get()
+            self._busy[task] = character_id
+            try:
+                await self._run(character_id, attempt)
+            except Exception as e:
+                logger.error(f"Description worker {number} failed on character {character_id}: {e}")
+                self._finish(character_id)
+            finally:
+                del self._busy[task]
+                self._queue.task_done()
+
+    async def _run(self, character_id: str, attempt: int):
+        async with database.open_session() as db:
+            # Retries keep the claim taken by the first attempt
+            if attempt == 1 and not await async_crud.claim_description_job(db, character_id):
+                logger.debug("Description job for character {} already taken.", character_id)
+                self._finish(character_id)
+                return
+            db_character = await async_crud.get_character(db, character_id)
+            if db_character is None:
+                self._finish(character_id)
+                return
+            character_data = schemas.CharacterCreate.model_validate(db_character, from_attributes=True).dict(exclude={"description", "llm_policy"})
+
+        try:
+            description = await generate_description_text(character_data)
+        except Exception as e:
+            if attempt < self.max_attempts:
+                delay = DESCRIPTION_RETRY_DELAY * 2 ** (attempt - 1)
+                logger.warning(f"Description attempt {attempt} for character {character_id} failed: {e}. Retrying in {delay}s.")
+                self.retried += 1
+                self._retry_later(character_id, attempt + 1, delay)
+                return
+            logger.error(f"Giving up on the description of character {character_id} after {attempt} attempts: {e}")
+            await self._save(character_id, DESCRIPTION_FALLBACK, FAILED)
+            self.failed += 1
+        else:
+            await self._save(character_id, description, READY)
+            self.completed += 1
+        self._finish(character_id)
+
+    def _retry_later(self, character_id: str, attempt: int, delay: float):
+        async def retry():
+            await asyncio.sleep(delay)
+            self.enqueue(character_id, attempt)
+
+        # Backoff waits outside the workers, so a failing provider does not hold their slots
+        task = asyncio.create_task(retry())
+        self._retries[task] = character_id
+        task.add_done_callback(lambda done: self._retries.pop(done, None))
+
+    async def _save(self, character_id: str, description: str, status: str):
+        async with database.open_session() as db:
+            await async_crud.update_character(db, character_id, {"description": description, "description_status": status})
+
+    def _finish(self, character_id: str):
+        event = self._done.pop(character_id, None)
+        if event is not None:
+            event.set()
+
+    async def stop(self, timeout: float = 0.0):
+        """
+        Stops taking jobs. Workers in the middle of a job get up to `timeout`
+        seconds to finish it; jobs still running after that are cancelled and
+        put back to pending, so any process can pick them up again.
+        """
+        self._stopping = True
+        busy = dict(self._busy)
+        interrupted = []
+        tasks = set(self._workers)
+        if self._reclaimer is not None:
+            tasks.add(self._reclaimer)
+        for task in tasks - set(busy):
+            task.cancel()
+        if busy and timeout > 0:
+            logger.info(f"Waiting up to {timeout:.0f}s for {len(busy)} running description jobs.")
+            await asyncio.wait(busy, timeout=timeout)
+        interrupted.extend(character_id for task, character_id in busy.items() if not task.done())
+        # Jobs waiting for a retry (including ones that failed during the wait) keep their claim
+        retries = dict(self._retries)
+        interrupted.extend(retries.values())
+        tasks |= set(retries)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if interrupted:
+            async with database.open_session() as db:
+                await async_crud.reset_description_jobs(db, character_ids=interrupted)
+            logger.info(f"Returned {len(interrupted)} interrupted description jobs to the queue.")
+        self._workers.clear()
+        self._retries.clear()
+        self._busy.clear()
+        self._reclaimer = None
+        self._queue = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._workers),
+            "queued": self._queue.qsize() if self._queue else 0,
+            "waiting_retry": len(self._retries),
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+
+# Process-wide queue, started and stopped by the application lifespan
+description_jobs = DescriptionJobQueue()
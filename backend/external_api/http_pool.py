@@ -0,0 +1,183 @@
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from loguru import logger
+
+from ..config import env_bool, env_float, env_int
+from ..metrics import registry
+
+# --- Pool Configuration ---
+LLM_POOL_MAX_CONNECTIONS = env_int("LLM_POOL_MAX_CONNECTIONS", 20)
+LLM_POOL_MAX_KEEPALIVE = env_int("LLM_POOL_MAX_KEEPALIVE", 10)
+LLM_POOL_KEEPALIVE_EXPIRY = env_float("LLM_POOL_KEEPALIVE_EXPIRY", 30.0)
+LLM_POOL_ACQUIRE_TIMEOUT = env_float("LLM_POOL_ACQUIRE_TIMEOUT", 10.0)
+LLM_HTTP_TIMEOUT = env_float("LLM_HTTP_TIMEOUT", 60.0)
+LLM_HTTP2 = env_bool("LLM_HTTP2", True)
+
+try:
+    import h2  # noqa: F401  (required by httpx for HTTP/2)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class ProviderPool:
+    """
+    A long-lived httpx.AsyncClient bound to a single provider host.
+    Keeps connections alive between chat turns and records pool metrics
+    (new vs. reused connections and time spent waiting for a free connection).
+    """
+    def __init__(
+        self,
+        base_url: str,
+        max_connections: int = LLM_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections: int = LLM_POOL_MAX_KEEPALIVE,
+        keepalive_expiry: float = LLM_POOL_KEEPALIVE_EXPIRY,
+        acquire_timeout: float = LLM_POOL_ACQUIRE_TIMEOUT,
+        timeout: float = LLM_HTTP_TIMEOUT,
+        http2: bool = LLM_HTTP2,
+    ):
+        self.base_url = base_url
+        self.http2 = http2 and HTTP2_AVAILABLE
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning(f"HTTP/2 requested for {base_url}, but the 'h2' package is not installed. Falling back to HTTP/1.1.")
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout, pool=acquire_timeout)
+        self._transport: Optional[httpx.AsyncHTTPTransport] = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+        self.requests_total = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            logger.info(f"Opening HTTP connection pool for {self.base_url} (http2={self.http2})")
+            self._transport = httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+            self._client = httpx.AsyncClient(transport=self._transport, timeout=self.timeout)
+        return self._client
+
+    def _make_trace(self):
+        """
+        Builds an httpcore trace hook for one request. The first connection-level
+        event tells us how long the request waited for the pool and whether a new
+        TCP connection had to be opened.
+        """
+        started = time.perf_counter()
+        state = {"seen": False}
+
+        async def trace(event_name: str, info: dict):
+            if state["seen"]:
+                return
+            if event_name == "connection.connect_tcp.started":
+                self.connections_created += 1
+            elif event_name.endswith("send_request_headers.started"):
+                self.connections_reused += 1
+            else:
+                return
+            state["seen"] = True
+            waited = time.perf_counter() - started
+            self.queue_wait_total += waited
+            self.queue_wait_max = max(self.queue_wait_max, waited)
+
+        return trace
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        client = self.client
+        self.requests_total += 1
+        extensions = kwargs.pop("extensions", None) or {}
+        extensions["trace"] = self._make_trace()
+        return await client.request(method, url, extensions=extensions, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """Streams a response body; the connection returns to the pool on exit."""
+        client = self.client
+        self.requests_total += 1
+        extensions = kwargs.pop("extensions", None) or {}
+        extensions["trace"] = self._make_trace()
+        async with client.stream(method, url, extensions=extensions, **kwargs) as response:
+            yield response
+
+    def open_connections(self) -> int:
+        pool = getattr(self._transport, "_pool", None)
+        if pool is None or self._client is None or self._client.is_closed:
+            return 0
+        return len(pool.connections)
+
+    def stats(self) -> dict:
+        acquired = self.connections_created + self.connections_reused
+        return {
+            "http2": self.http2,
+            "requests_total": self.requests_total,
+            "connections_open": self.open_connections(),
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "reuse_ratio": round(self.connections_reused / acquired, 4) if acquired else 0.0,
+            "queue_wait_avg_ms": round(self.queue_wait_total / acquired * 1000, 3) if acquired else 0.0,
+            "queue_wait_max_ms": round(self.queue_wait_max * 1000, 3),
+        }
+
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
+            logger.info(f"Closing HTTP connection pool for {self.base_url}")
+            await self._client.aclose()
+        self._client = None
+        self._transport = None
+
+
+class HTTPPoolManager:
+    """Holds one ProviderPool per provider host (scheme + host + port)."""
+    def __init__(self):
+        self._pools: Dict[str, ProviderPool] = {}
+
+    @staticmethod
+    def _key(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def get_pool(self, url: str) -> ProviderPool:
+        key = self._key(url)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = ProviderPool(key)
+            self._pools[key] = pool
+        return pool
+
+    def start(self, *urls: str):
+        """Eagerly opens pools for the given provider URLs (called from the app lifespan)."""
+        for url in urls:
+            self.get_pool(url).client
+
+    def stats(self) -> Dict[str, dict]:
+        return {key: pool.stats() for key, pool in self._pools.items()}
+
+    async def aclose(self):
+        for pool in self._pools.values():
+            await pool.aclose()
+
+
+# Process-wide pool manager, opened and closed by the FastAPI lifespan
+http_pools = HTTPPoolManager()
+
+registry.callback(
+    "genana_llm_http_connections_open", "Open connections in each provider pool.",
+    ("host",), lambda: {(host,): pool.open_connections() for host, pool in http_pools._pools.items()},
+)
+registry.callback(
+    "genana_llm_http_connections_created_total", "Connections opened by each provider pool.",
+    ("host",), lambda: {(host,): pool.connections_created for host, pool in http_pools._pools.items()}, type_name="counter",
+)
@@ -1,51 +1,278 @@
 import os
+import re
+import json
+import asyncio
+import hashlib
+import time
 import httpx
-from typing import List, Dict, Any
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, AsyncIterator, Awaitable, Callable, Tuple
 from loguru import logger
 from dotenv import load_dotenv
+from ..config import env_bool, env_float, env_int, env_str
+from ..logging_config import truncate
+from ..metrics import LLM_REQUEST_SECONDS, LLM_TOKENS, registry
+from .http_pool import ProviderPool, http_pools
 from .prompt_builder import build_description_prompt
-
-# Load environment variables from a .env file
-load_dotenv()
+from .provider_cache import PromptCache, PromptCacheKey, prompt_caches
+from .rate_limit import LLM_RATE_COMPLETION_TOKENS, ProviderRateLimiter, rate_limiters
+from .response_cache import response_cache
+from .tokens import estimate_tokens
 
 # --- API Configuration ---
+# The base URLs can point at a local fake provider, e.g. GEMINI_API_BASE=http://127.0.0.1:8765
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+GEMINI_API_BASE = env_str("GEMINI_API_BASE", "https://generativelanguage.googleapis.com").rstrip("/")
+GEMINI_API_URL = GEMINI_API_BASE + "/v1beta/models/{model}:generateContent"
+GEMINI_STREAM_API_URL = GEMINI_API_BASE + "/v1beta/models/{model}:streamGenerateContent"
 
 MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
-MISTRAL_API_URL = "https://api.mistral.ai/v1/chat/completions"
+MISTRAL_API_BASE = env_str("MISTRAL_API_BASE", "https://api.mistral.ai").rstrip("/")
+MISTRAL_API_URL = MISTRAL_API_BASE + "/v1/chat/completions"
 
 # --- Model Name Constants ---
 GEMINI_FLASH = "gemini-2.5-flash"
 MISTRAL_LARGE = "mistral-large-latest"
 MISTRAL_SMALL = "mistral-small-latest"
 
+# --- Concurrency Limits ---
+# Default number of in-flight requests per model; override per model with
+# e.g. LLM_MAX_CONCURRENCY_MISTRAL_LARGE_LATEST=4
+LLM_MAX_CONCURRENCY = env_int("LLM_MAX_CONCURRENCY", 8)
+# How long a request may wait for a free slot before the model is reported busy
+LLM_QUEUE_TIMEOUT = env_float("LLM_QUEUE_TIMEOUT", 30.0)
+
+# Share one upstream call between concurrent identical requests
+LLM_SINGLE_FLIGHT = env_bool("LLM_SINGLE_FLIGHT", True)
+
+
+class ModelBusyError(Exception):
+    """Raised when a model's concurrency limit stays saturated for longer than the queue timeout."""
+    def __init__(self, model: str):
+        super().__init__(f"Model {model} is at its concurrency limit.")
+        self.model = model
+
+
+async def _iter_sse_data(response: httpx.Response) -> AsyncIterator[str]:
+    """Yields the payload of every `data:` line of a Server-Sent Events response."""
+    async for line in response.aiter_lines():
+        if line.startswith("data:"):
+            yield line[len("data:"):].strip()
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent identical calls: the first caller for a key starts
+    the call as a task and later callers await the same task instead of making
+    their own. The task is shielded, so a caller that goes away (e.g. a closed
+    connection) does not cancel the result for the others.
+    """
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.suppressed = 0
+
+    @staticmethod
+    def key(*parts) -> str:
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False, sort_keys=True).encode()).hexdigest()
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is not None:
+            self.suppressed += 1
+            logger.debug("Joining in-flight LLM call {}", key[:12])
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(call())
+        self._calls[key] = task
+        self.leaders += 1
+        task.add_done_callback(lambda finished: self._forget(key, finished))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the error as retrieved even if every caller has gone away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "suppressed": self.suppressed,
+        }
+
+
+single_flight = SingleFlight()
+
+registry.callback(
+    "genana_llm_single_flight_suppressed_total", "LLM calls served by joining an identical in-flight call.",
+    (), lambda: {(): single_flight.suppressed}, type_name="counter",
+)
+
+
+def _status_label(e: Optional[BaseException]) -> str:
+    if e is None:
+        return "ok"
+    if isinstance(e, httpx.HTTPStatusError):
+        return str(e.response.status_code)
+    return type(e).__name__
+
 
 class BaseLLMClient:
-    """Base class for LLM clients."""
-    def __init__(self, api_key: str, api_url: str, model: str):
+    """
+    Base class for LLM clients.
+    Subclasses implement `_generate_text` / `_stream_text`; the public methods
+    pace requests through the provider key's rate limiter and bound the number
+    of concurrent requests to the model with a semaphore. Concurrent identical
+    `generate_text` calls share a single upstream request. `cache_key` names the
+    character version the system prompt was compiled from, for providers that
+    can cache it (see provider_cache.py).
+    """
+    provider: str = None
+    api_base: str = None
+    api_key_env: str = None
+    # Sampling parameters sent with every request (also part of response cache keys)
+    generation_params: Dict[str, Any] = {}
+
+    def __init__(
+        self,
+        api_key: str,
+        api_url: str,
+        model: str,
+        http_pool: Optional[ProviderPool] = None,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+    ):
         if not api_key:
             raise ValueError(f"API key for {self.__class__.__name__} is not set.")
         self.api_key = api_key
         self.api_url = api_url
         self.model = model
+        self._http_pool = http_pool
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def http(self) -> ProviderPool:
+        """The shared connection pool for this provider's host."""
+        return self._http_pool or http_pools.get_pool(self.api_url)
+
+    @property
+    def prompt_cache(self) -> PromptCache:
+        """This provider's strategy for caching system prompts on the provider side."""
+        return prompt_caches.get(self.provider)
+
+    @property
+    def rate_limiter(self) -> ProviderRateLimiter:
+        """The requests/min and tokens/min budget shared by every model on this API key."""
+        return rate_limiters.get(self.provider, self.api_key)
+
+    @staticmethod
+    def _request_tokens(system_prompt: str, user_message: str, history: List[Dict[str, str]]) -> int:
+        prompt_tokens = estimate_tokens(system_prompt) + estimate_tokens(user_message)
+        prompt_tokens += sum(estimate_tokens(item["content"]) for item in history)
+        return prompt_tokens + LLM_RATE_COMPLETION_TOKENS
+
+    @asynccontextmanager
+    async def _slot(self):
+        """Holds one of the model's concurrency slots for the duration of a request."""
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=LLM_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Timed out waiting for a free slot on model {self.model}")
+            raise ModelBusyError(self.model)
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
 
     async def generate_text(
-        self, system_prompt: str, user_message: str, history: List[Dict[str, str]]
+        self, system_prompt: str, user_message: str, history: List[Dict[str, str]],
+        cache_key: Optional[PromptCacheKey] = None,
+    ) -> str:
+        if not LLM_SINGLE_FLIGHT:
+            return await self._generate_once(system_prompt, user_message, history, cache_key)
+        key = single_flight.key(self.model, self.generation_params, system_prompt, history, user_message)
+        return await single_flight.do(key, lambda: self._generate_once(system_prompt, user_message, history, cache_key))
+
+    async def _generate_once(
+        self, system_prompt: str, user_message: str, history: List[Dict[str, str]],
+        cache_key: Optional[PromptCacheKey] = None,
+    ) -> str:
+        await self.rate_limiter.acquire(self._request_tokens(system_prompt, user_message, history))
+        async with self._slot():
+            started, error = time.perf_counter(), None
+            try:
+                return await self._generate_text(system_prompt, user_message, history, cache_key)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, model=self.model, status=_status_label(error))
+
+    async def stream_text(
+        self, system_prompt: str, user_message: str, history: List[Dict[str, str]],
+        cache_key: Optional[PromptCacheKey] = None,
+    ) -> AsyncIterator[str]:
+        """Yields the completion incrementally, one text chunk at a time."""
+        await self.rate_limiter.acquire(self._request_tokens(system_prompt, user_message, history))
+        async with self._slot():
+            started, error = time.perf_counter(), None
+            try:
+                async for chunk in self._stream_text(system_prompt, user_message, history, cache_key):
+                    yield chunk
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, model=self.model, status=_status_label(error))
+
+    @staticmethod
+    def _parse_usage(data: Dict[str, Any]) -> Optional[Tuple[int, int, int]]:
+        """(prompt, completion, cached prompt) tokens reported in a response body or stream chunk."""
+        return None
+
+    def _record_usage(self, usage: Optional[Tuple[int, int, int]]):
+        if usage is not None:
+            LLM_TOKENS.inc(usage[0], model=self.model, kind="prompt")
+            LLM_TOKENS.inc(usage[1], model=self.model, kind="completion")
+            # Part of the prompt tokens, served from the provider's cache at a lower rate
+            LLM_TOKENS.inc(usage[2], model=self.model, kind="cached_prompt")
+
+    async def _generate_text(
+        self, system_prompt: str, user_message: str, history: List[Dict[str, str]],
+        cache_key: Optional[PromptCacheKey] = None,
     ) -> str:
         raise NotImplementedError
 
+    async def _stream_text(
+        self, system_prompt: str, user_message: str, history: List[Dict[str, str]],
+        cache_key: Optional[PromptCacheKey] = None,
+    ) -> AsyncIterator[str]:
+        raise NotImplementedError
+        yield  # pragma: no cover  (makes this an async generator)
+
 class GeminiClient(BaseLLMClient):
     """Client for Google Gemini API."""
-    def __init__(self, api_key: str = GEMINI_API_KEY, model: str = GEMINI_FLASH):
-        super().__init__(api_key, GEMINI_API_URL.format(model=model), model)
+    provider = "gemini"
+    api_key_env = "GEMINI_API_KEY"
+    api_base = GEMINI_API_BASE
+    generation_params = {
+        "temperature": 0.7,
+        "topP": 0.95,
+    }
 
-    async def generate_text(
-        self, system_prompt: str, user_message: str, history: List[Dict[str, str]]
-    ) -> str:
-        headers = {"Content-Type": "application/json"}
-        params = {"key": self.api_key}
-        
+    def __init__(self, api_key: str = GEMINI_API_KEY, model: str = GEMINI_FLASH, http_pool: Optional[ProviderPool] = None, **kwargs):
+        super().__init__(api_key, GEMINI_API_URL.format(model=model), model, http_pool, **kwargs)
+        self.stream_url = GEMINI_STREAM_API_URL.format(model=model)
+
+    def _build_payload(
+        self, system_prompt: str, user_message: str, history: List[Dict[str, str]], cached_content: Optional[str] = None
+    ) -> Dict[str, Any]:
         # Gemini uses a specific format for contents
         contents = []
         for item in history:
@@ -56,68 +283,209 @@ class GeminiClient(BaseLLMClient):
 
         payload = {
             "contents": contents,
-            "systemInstruction": {"parts": [{"text": system_prompt}]},
-            "generationConfig": {
-                "temperature": 0.7,
-                "topP": 0.95,
-            },
+            "generationConfig": dict(self.generation_params),
         }
+        # A cached content already holds the system instruction
+        if cached_content:
+            payload["cachedContent"] = cached_content
+        else:
+            payload["systemInstruction"] = {"parts": [{"text": system_prompt}]}
+        return payload
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(self.api_url, headers=headers, params=params, json=payload, timeout=60)
-                response.raise_for_status()
-                data = response.json()
-                return data["candidates"][0]["content"]["parts"][0]["text"]
-            except httpx.HTTPStatusError as e:
-                logger.error(f"Gemini API Error: {e.response.text}")
-                raise
-            except Exception as e:
-                logger.error(f"An unexpected error occurred with Gemini client: {e}")
-                raise
+    def _rejected_cache(self, response: httpx.Response, cached_content: Optional[str]) -> bool:
+        """
+        True if the request failed because the provider no longer has the cached
+        content (expired or deleted elsewhere); the handle is dropped and the
+        request can be repeated with the prompt inline. Other errors (e.g. an
+        invalid argument or a context that is too long) keep the handle and are
+        raised as they are, so they are not sent a second time.
+        """
+        if not cached_content or response.status_code not in (400, 403, 404):
+            return False
+        try:
+            error = response.json().get("error") or {}
+        except ValueError:
+            return False
+        status = error.get("status")
+        if status not in ("NOT_FOUND", "PERMISSION_DENIED") and not (
+            status == "INVALID_ARGUMENT" and "cachedcontent" in str(error.get("message", "")).lower()
+        ):
+            return False
+        logger.warning(f"Gemini rejected cached content {cached_content} ({status}), resending the system prompt inline")
+        self.prompt_cache.forget(cached_content)
+        return True
+
+    async def _generate_text(
+        self, system_prompt: str, user_message: str, history: List[Dict[str, str]],
+        cache_key: Optional[PromptCacheKey] = None,
+    ) -> str:
+        headers = {"Content-Type": "application/json"}
+        params = {"key": self.api_key}
+        cached_content = await self.prompt_cache.resolve(self, cache_key, system_prompt)
+
+        try:
+            payload = self._build_payload(system_prompt, user_message, history, cached_content)
+            response = await self.http.post(self.api_url, headers=headers, params=params, json=payload)
+            if self._rejected_cache(response, cached_content):
+                payload = self._build_payload(system_prompt, user_message, history)
+                response = await self.http.post(self.api_url, headers=headers, params=params, json=payload)
+            response.raise_for_status()
+            data = response.json()
+            self._record_usage(self._parse_usage(data))
+            return data["candidates"][0]["content"]["parts"][0]["text"]
+        except httpx.HTTPStatusError as e:
+            logger.error("Gemini API Error: {}", truncate(e.response.text))
+            raise
+        except Exception as e:
+            logger.error(f"An unexpected error occurred with Gemini client: {e}")
+            raise
+
+    async def _stream_text(
+        self, system_prompt: str, user_message: str, history: List[Dict[str, str]],
+        cache_key: Optional[PromptCacheKey] = None,
+    ) -> AsyncIterator[str]:
+        headers = {"Content-Type": "application/json"}
+        params = {"key": self.api_key, "alt": "sse"}
+        cached_content = await self.prompt_cache.resolve(self, cache_key, system_prompt)
+
+        try:
+            while True:
+                payload = self._build_payload(system_prompt, user_message, history, cached_content)
+                async with self.http.stream("POST", self.stream_url, headers=headers, params=params, json=payload) as response:
+                    if response.is_error:
+                        await response.aread()
+                        # Rejected before the first chunk, so the request can be repeated
+                        if self._rejected_cache(response, cached_content):
+                            cached_content = None
+                            continue
+                    response.raise_for_status()
+                    usage = None
+                    async for data in _iter_sse_data(response):
+                        chunk = json.loads(data)
+                        # Every chunk carries the running totals; the last one counts
+                        usage = self._parse_usage(chunk) or usage
+                        for candidate in chunk.get("candidates", [])[:1]:
+                            for part in candidate.get("content", {}).get("parts", []):
+                                if part.get("text"):
+                                    yield part["text"]
+                    self._record_usage(usage)
+                    return
+        except httpx.HTTPStatusError as e:
+            logger.error("Gemini API Error: {}", truncate(e.response.text))
+            raise
+        except Exception as e:
+            logger.error(f"An unexpected error occurred with Gemini stream: {e}")
+            raise
+
+    @staticmethod
+    def _parse_usage(data: Dict[str, Any]) -> Optional[Tuple[int, int, int]]:
+        usage = data.get("usageMetadata")
+        if not usage:
+            return None
+        # Thinking tokens of 2.5 models are billed as output
+        completion = usage.get("candidatesTokenCount", 0) + usage.get("thoughtsTokenCount", 0)
+        return usage.get("promptTokenCount", 0), completion, usage.get("cachedContentTokenCount", 0)
 
 class MistralClient(BaseLLMClient):
     """Client for Mistral AI API."""
-    def __init__(self, api_key: str = MISTRAL_API_KEY, model: str = MISTRAL_LARGE):
-        super().__init__(api_key, MISTRAL_API_URL, model)
+    provider = "mistral"
+    api_key_env = "MISTRAL_API_KEY"
+    api_base = MISTRAL_API_BASE
+    generation_params = {
+        "temperature": 0.7,
+        "top_p": 1,
+        "safe_prompt": True,
+    }
 
-    async def generate_text(
+    def __init__(self, api_key: str = MISTRAL_API_KEY, model: str = MISTRAL_LARGE, http_pool: Optional[ProviderPool] = None, **kwargs):
+        super().__init__(api_key, MISTRAL_API_URL, model, http_pool, **kwargs)
+
+    def _build_payload(
         self, system_prompt: str, user_message: str, history: List[Dict[str, str]]
-    ) -> str:
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
-        
+    ) -> Dict[str, Any]:
         messages = [
             {"role": "system", "content": system_prompt},
             *history,
             {"role": "user", "content": user_message},
         ]
 
-        payload = {
+        return {
             "model": self.model,
             "messages": messages,
-            "temperature": 0.7,
-            "top_p": 1,
-            "safe_prompt": True,
+            **self.generation_params,
         }
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(self.api_url, headers=headers, json=payload, timeout=60)
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+    async def _generate_text(
+        self, system_prompt: str, user_message: str, history: List[Dict[str, str]],
+        cache_key: Optional[PromptCacheKey] = None,
+    ) -> str:
+        payload = self._build_payload(system_prompt, user_message, history)
+
+        try:
+            response = await self.http.post(self.api_url, headers=self._headers(), json=payload)
+            response.raise_for_status()
+            data = response.json()
+            self._record_usage(self._parse_usage(data))
+            return data["choices"][0]["message"]["content"]
+        except httpx.HTTPStatusError as e:
+            logger.error("Mistral API Error: {}", truncate(e.response.text))
+            raise
+        except Exception as e:
+            logger.error(f"An unexpected error occurred with Mistral client: {e}")
+            raise
+
+    async def _stream_text(
+        self, system_prompt: str, user_message: str, history: List[Dict[str, str]],
+        cache_key: Optional[PromptCacheKey] = None,
+    ) -> AsyncIterator[str]:
+        payload = self._build_payload(system_prompt, user_message, history)
+        payload["stream"] = True
+
+        try:
+            async with self.http.stream("POST", self.api_url, headers=self._headers(), json=payload) as response:
+                if response.is_error:
+                    await response.aread()
                 response.raise_for_status()
-                data = response.json()
-                return data["choices"][0]["message"]["content"]
-            except httpx.HTTPStatusError as e:
-                logger.error(f"Mistral API Error: {e.response.text}")
-                raise
-            except Exception as e:
-                logger.error(f"An unexpected error occurred with Mistral client: {e}")
-                raise
+                usage = None
+                async for data in _iter_sse_data(response):
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    # Sent with the final chunk
+                    usage = self._parse_usage(chunk) or usage
+                    for choice in chunk.get("choices", [])[:1]:
+                        content = choice.get("delta", {}).get("content")
+                        if content:
+                            yield content
+                self._record_usage(usage)
+        except httpx.HTTPStatusError as e:
+            logger.error("Mistral API Error: {}", truncate(e.response.text))
+            raise
+        except Exception as e:
+            logger.error(f"An unexpected error occurred with Mistral stream: {e}")
+            raise
+
+    @staticmethod
+    def _parse_usage(data: Dict[str, Any]) -> Optional[Tuple[int, int, int]]:
+        usage = data.get("usage")
+        if not usage:
+            return None
+        # Mistral has no explicit cache; the field is read in case it reports implicit hits
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), cached
 
 class LLMFactory:
-    """Factory to get the appropriate LLM client based on the model name."""
+    """
+    Registry of LLM clients keyed by model name. Each client is built once, on
+    first use, and reused by every request; `reload()` rebuilds the clients
+    whose API key has changed.
+    """
     
     _clients = {
         GEMINI_FLASH: GeminiClient,
@@ -125,43 +493,144 @@ class LLMFactory:
         MISTRAL_SMALL: MistralClient,
     }
 
+    # Tokens of chat history (summary + recent turns) sent with each request.
+    # Far below the models' context windows on purpose: it bounds prompt cost
+    # and latency. Override with e.g. LLM_HISTORY_TOKENS_GEMINI_2_5_FLASH=16000
+    _history_budgets = {
+        GEMINI_FLASH: 8000,
+        MISTRAL_LARGE: 6000,
+        MISTRAL_SMALL: 4000,
+    }
+
+    def __init__(self):
+        self._instances: Dict[str, BaseLLMClient] = {}
+
     @staticmethod
-    def get_client(model_name: str) -> BaseLLMClient:
-        client_class = LLMFactory._clients.get(model_name)
+    def _env_suffix(model_name: str) -> str:
+        return re.sub(r"[^A-Za-z0-9]", "_", model_name).upper()
+
+    @classmethod
+    def concurrency_limit(cls, model_name: str) -> int:
+        return env_int("LLM_MAX_CONCURRENCY_" + cls._env_suffix(model_name), LLM_MAX_CONCURRENCY)
+
+    @classmethod
+    def history_budget(cls, model_name: str) -> int:
+        return env_int("LLM_HISTORY_TOKENS_" + cls._env_suffix(model_name), cls._history_budgets.get(model_name, 4000))
+
+    def get_client(self, model_name: str) -> BaseLLMClient:
+        client = self._instances.get(model_name)
+        if client is not None:
+            return client
+
+        client_class = self._clients.get(model_name)
         if not client_class:
             raise ValueError(f"Unsupported AI model: {model_name}")
         
         logger.info(f"Initializing LLM client for model: {model_name}")
-        return client_class(model=model_name)
+        client = client_class(
+            api_key=os.getenv(client_class.api_key_env),
+            model=model_name,
+            max_concurrency=self.concurrency_limit(model_name),
+        )
+        self._instances[model_name] = client
+        return client
+
+    def reload(self) -> List[str]:
+        """
+        Re-reads the .env file and drops clients whose API key or concurrency
+        limit changed, so they are rebuilt on next use. In-flight requests keep
+        the old instance until they finish. Returns the reloaded model names.
+        """
+        load_dotenv(override=True)
+        reloaded = []
+        for model_name, client in list(self._instances.items()):
+            if client.api_key != os.getenv(client.api_key_env) or client.max_concurrency != self.concurrency_limit(model_name):
+                del self._instances[model_name]
+                reloaded.append(model_name)
+        logger.info(f"LLM client registry reloaded, rebuilt clients: {reloaded}")
+        return reloaded
+
+    def in_flight(self) -> int:
+        return sum(client.in_flight for client in self._instances.values())
+
+    async def drain(self, timeout: float) -> bool:
+        """
+        Waits up to `timeout` seconds for LLM requests still running (e.g.
+        coalesced calls whose callers went away), so that they are not cut off
+        when the connection pools close. False if some were still running.
+        """
+        deadline = time.monotonic() + timeout
+        while self.in_flight() or single_flight.stats()["in_flight"]:
+            if time.monotonic() >= deadline:
+                logger.warning(f"Shutting down with {self.in_flight()} LLM requests still in flight.")
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    def describe_models(self) -> List[Dict[str, Any]]:
+        """Lists the supported models with their concurrency limits and current load."""
+        models = []
+        for model_name, client_class in self._clients.items():
+            client = self._instances.get(model_name)
+            models.append({
+                "name": model_name,
+                "provider": client_class.provider,
+                "max_concurrency": client.max_concurrency if client else self.concurrency_limit(model_name),
+                "in_flight": client.in_flight if client else 0,
+                "history_tokens": self.history_budget(model_name),
+            })
+        return models
 
 # Instantiate the factory
 llm_factory = LLMFactory()
 
-async def generate_description(character_data: dict) -> str:
+registry.callback(
+    "genana_llm_in_flight", "LLM requests holding a concurrency slot, by model.",
+    ("model",), lambda: {(name,): client.in_flight for name, client in llm_factory._instances.items()},
+)
+
+DESCRIPTION_FALLBACK = "Загадочный персонаж, готовый к общению."
+# Response cache mode for descriptions; the prompt is built from the character
+# dict alone, so re-runs for the same dict can reuse the reply
+DESCRIPTION_RESPONSE_CACHE = env_str("DESCRIPTION_RESPONSE_CACHE", "exact")
+
+async def generate_description_text(character_data: dict) -> str:
     """
-    Generates a character description using an LLM.
+    Generates a character description using an LLM, raising on failure.
     Uses Gemini Flash by default as a cost-effective choice.
     """
     logger.info(f"Generating description for character: {character_data.get('name')}")
-    try:
-        # Build the specific prompt for description generation
-        prompt = build_description_prompt(character_data)
-        
-        # For description generation, we can hardcode a cost-effective model
-        # or make it configurable if needed later.
-        client = GeminiClient(model=GEMINI_FLASH)
+    # Build the specific prompt for description generation
+    prompt = build_description_prompt(character_data)
+    
+    # For description generation, we can hardcode a cost-effective model
+    # or make it configurable if needed later.
+    client = llm_factory.get_client(GEMINI_FLASH)
 
+    system_prompt = "You are a creative copywriter." # A simple, relevant system prompt
+    description = await response_cache.get(
+        DESCRIPTION_RESPONSE_CACHE, client.model, system_prompt, [], prompt, client.generation_params
+    )
+    if description is None:
         # Use the generate_text method with a simplified payload
         # No system prompt or history is needed, the user message is the whole prompt
         description = await client.generate_text(
-            system_prompt="You are a creative copywriter.", # A simple, relevant system prompt
+            system_prompt=system_prompt,
             user_message=prompt,
             history=[]
         )
-        
-        logger.info(f"Successfully generated description: {description}")
-        return description.strip().replace('"', '') # Clean up quotes
+        await response_cache.put(
+            DESCRIPTION_RESPONSE_CACHE, client.model, system_prompt, [], prompt, client.generation_params, description
+        )
+    
+    logger.info("Successfully generated description: {}", truncate(description))
+    return description.strip().replace('"', '') # Clean up quotes
+
+async def generate_description(character_data: dict) -> str:
+    """Like generate_description_text, but falls back to a default description on failure."""
+    try:
+        return await generate_description_text(character_data)
     except Exception as e:
         logger.error(f"Failed to generate character description: {e}")
         # Return a default or empty description on failure
-        return "Загадочный персонаж, готовый к общению."
+        return DESCRIPTION_FALLBACK
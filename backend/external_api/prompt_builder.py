@@ -63,3 +63,47 @@ def build_description_prompt(character_data: dict) -> str:
 Твой результат должен быть только текстом описания, без лишних фраз вроде "Вот описание:", только само описание!.
 """
     return prompt.strip()
+
+
+def build_summary_prompt(context_memory: str, previous_summary: str, messages: List[dict]) -> str:
+    """
+    Constructs a prompt that folds older chat messages into the running conversation summary.
+    The character's `context_memory` setting decides what the summary must preserve.
+    """
+    transcript = "\n".join(f"{message['role']}: {message['content']}" for message in messages)
+    prompt_parts = [
+        "You maintain a running summary of a role-play conversation between a user and a character.",
+        "Update the summary with the new messages below. Keep it concise (at most a few short paragraphs), "
+        "written in the language of the conversation, and preserve names, facts, decisions and open threads.",
+        f"**Memory Policy:** {context_memory or 'Remember the key facts and the flow of the conversation.'}",
+        "\n--- CURRENT SUMMARY ---",
+        previous_summary or "(empty)",
+        "\n--- NEW MESSAGES ---",
+        transcript,
+        "\nReply with the updated summary only.",
+    ]
+    return "\n".join(prompt_parts)
+
+
+# Assistant reply that closes the summary turn when the kept history starts with the user
+SUMMARY_ACKNOWLEDGEMENT = "Understood, I remember our earlier conversation."
+
+
+def with_conversation_summary(history: List[dict], summary: str) -> List[dict]:
+    """
+    Prepends the summary of older turns, which are no longer sent verbatim, to the
+    history. It travels as a message rather than in the system prompt, so the
+    system prompt stays identical across turns and can be cached by the provider.
+    The summary is a user turn marked as context, answered by a short assistant
+    acknowledgement unless the kept history already opens with the assistant,
+    so roles keep alternating.
+    """
+    if not summary:
+        return history
+    turns = [{
+        "role": "user",
+        "content": f"--- EARLIER CONVERSATION (SUMMARY, context only, not a new message) ---\n{summary}",
+    }]
+    if not history or history[0]["role"] != "assistant":
+        turns.append({"role": "assistant", "content": SUMMARY_ACKNOWLEDGEMENT})
+    return [*turns, *history]
@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from loguru import logger
+
+from ..config import env_float, env_int
+from .prompt_builder import build_system_prompt
+from .provider_cache import PromptCacheKey, prompt_caches
+from .resilience import ResiliencePolicy, resolve_policy
+from .response_cache import resolve_cache_mode
+
+# --- Cache Configuration ---
+PROMPT_CACHE_SIZE = env_int("PROMPT_CACHE_SIZE", 1024)
+# Seconds before a compiled prompt is rebuilt; lookups check the character's
+# version, so updates made by other processes are seen regardless. 0 disables expiry.
+PROMPT_CACHE_TTL = env_float("PROMPT_CACHE_TTL", 300.0)
+
+
+class CompiledPrompt(NamedTuple):
+    """A system prompt compiled from one version of a character, with its LLM request policy."""
+    character_id: str
+    version: Optional[datetime]
+    ai_model: str
+    system_prompt: str
+    policy: ResiliencePolicy
+    response_cache: str
+
+    @property
+    def cache_key(self) -> PromptCacheKey:
+        """Names this system prompt for provider-side caching."""
+        return self.character_id, self.version
+
+
+def character_version(character) -> Optional[datetime]:
+    """A character's version: the last update time, or the creation time if never updated."""
+    return character.updated_at or character.created_at
+
+
+class SystemPromptCache:
+    """
+    In-process LRU cache of compiled system prompts keyed by (character id, version).
+    `lookup` takes the version read from the database (a primary key lookup of two
+    columns), so hot characters skip loading the row and assembling the prompt,
+    yet an update made by another worker is picked up on the next request.
+    Writes to a character call `invalidate` to free the old entry early.
+    """
+    def __init__(self, max_size: int = PROMPT_CACHE_SIZE, ttl: float = PROMPT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, Optional[datetime]], Tuple[CompiledPrompt, float]]" = OrderedDict()
+        self._latest: Dict[str, Tuple[str, Optional[datetime]]] = {}
+        # Sync endpoints run in the threadpool, so guard the shared dicts
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key) -> Optional[CompiledPrompt]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        compiled, expires_at = entry
+        if expires_at and expires_at < time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return compiled
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        if self._latest.get(key[0]) == key:
+            del self._latest[key[0]]
+
+    def lookup(self, character_id: str, version: Optional[datetime]) -> Optional[CompiledPrompt]:
+        """Returns the compiled prompt of this version of a character, if cached."""
+        with self._lock:
+            compiled = self._get((character_id, version))
+            if compiled is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return compiled
+
+    def get_or_build(self, character) -> CompiledPrompt:
+        """Returns the compiled prompt for this version of the character, building it on a miss."""
+        key = (character.id, character_version(character))
+        with self._lock:
+            compiled = self._get(key)
+            if compiled is not None:
+                return compiled
+
+        compiled = CompiledPrompt(
+            character_id=character.id,
+            version=key[1],
+            ai_model=character.ai_model,
+            system_prompt=build_system_prompt(character),
+            policy=resolve_policy(character.llm_policy),
+            response_cache=resolve_cache_mode(character.llm_policy),
+        )
+        with self._lock:
+            stale_key = self._latest.get(character.id)
+            if stale_key is not None and stale_key != key:
+                self._entries.pop(stale_key, None)
+            self._entries[key] = (compiled, time.monotonic() + self.ttl if self.ttl else 0)
+            self._entries.move_to_end(key)
+            self._latest[character.id] = key
+            while len(self._entries) > self.max_size:
+                oldest_key, _ = self._entries.popitem(last=False)
+                if self._latest.get(oldest_key[0]) == oldest_key:
+                    del self._latest[oldest_key[0]]
+        return compiled
+
+    def invalidate(self, character_id: str):
+        with self._lock:
+            # Only the latest version of a character is ever kept
+            key = self._latest.pop(character_id, None)
+            if key is not None:
+                self._entries.pop(key, None)
+        # Handles of the old version held by the providers are released too
+        prompt_caches.invalidate(character_id)
+        logger.debug("Invalidated compiled system prompt for character ID: {}", character_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._latest.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Process-wide cache used by the chat endpoints and invalidated by crud
+system_prompt_cache = SystemPromptCache()
@@ -0,0 +1,284 @@
+"""
+Provider-side caching of the static system prompt (the compiled persona).
+
+The system prompt of a character is identical on every turn (the conversation
+summary travels in the contents), so providers that can cache a prefix only
+need it uploaded once per character version. Gemini keeps a `cachedContents`
+resource per (model, character, version) that requests reference by name; its
+tokens are then neither re-sent nor billed at the full input rate. Mistral has
+no such API and uses the "off" strategy, which sends the prompt inline. A
+provider gains caching by registering a strategy in PROMPT_CACHE_STRATEGIES.
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+import httpx
+from loguru import logger
+
+from ..config import env_float, env_int, env_str
+from ..metrics import registry
+from .tokens import estimate_tokens
+
+# --- Prompt Cache Configuration ---
+# Strategy per provider: "cached_content" (Gemini only) or "off"
+LLM_PROMPT_CACHE_GEMINI = env_str("LLM_PROMPT_CACHE_GEMINI", "cached_content")
+LLM_PROMPT_CACHE_MISTRAL = env_str("LLM_PROMPT_CACHE_MISTRAL", "off")
+# Seconds a cached persona is kept by Gemini after its last refresh; storage is billed per hour
+GEMINI_CONTEXT_CACHE_TTL = env_float("GEMINI_CONTEXT_CACHE_TTL", 3600.0)
+# A used handle gets its TTL extended once less than this share of it remains
+GEMINI_CONTEXT_CACHE_REFRESH = env_float("GEMINI_CONTEXT_CACHE_REFRESH", 0.5)
+# Gemini rejects caches below a model-specific size (1024 tokens on 2.5 Flash);
+# shorter prompts are always sent inline
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = env_int("GEMINI_CONTEXT_CACHE_MIN_TOKENS", 1024)
+# After a failed creation the prompt is sent inline for this many seconds before trying again
+GEMINI_CONTEXT_CACHE_RETRY = env_float("GEMINI_CONTEXT_CACHE_RETRY", 300.0)
+
+# (character id, character version) of a compiled prompt
+PromptCacheKey = Tuple[str, Optional[datetime]]
+
+
+class PromptCache:
+    """
+    The "off" strategy and the interface of the others: `resolve` returns a
+    provider handle standing for the system prompt, or None to send it inline.
+    """
+    name = "off"
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.hits = 0
+        self.created = 0
+        self.refreshed = 0
+        self.errors = 0
+
+    async def resolve(self, client, key: Optional[PromptCacheKey], system_prompt: str) -> Optional[str]:
+        return None
+
+    def forget(self, handle: str):
+        """Drops a handle the provider no longer accepts (expired or deleted)."""
+
+    def invalidate(self, character_id: str):
+        """Drops the handles of every version of a character. Safe to call from any thread."""
+
+    async def aclose(self, timeout: float = 5.0):
+        """Releases provider-side resources held by this process (called on shutdown)."""
+
+    def stats(self) -> dict:
+        return {"strategy": self.name, "hits": self.hits, "created": self.created, "refreshed": self.refreshed, "errors": self.errors}
+
+
+class _CachedContent:
+    __slots__ = ("client", "version", "name", "expires_at", "refreshing")
+
+    def __init__(self, client, version: Optional[datetime], name: str, expires_at: float):
+        self.client = client
+        self.version = version
+        self.name = name
+        self.expires_at = expires_at
+        self.refreshing = False
+
+
+class GeminiCachedContent(PromptCache):
+    """
+    One Gemini `cachedContents` resource per (model, character), replaced when the
+    character's version changes. Creation is shared by concurrent turns; the TTL
+    is extended in the background while the character is in use, and unused
+    handles simply expire at the provider. Handles are per process: every worker
+    creates its own.
+    """
+    name = "cached_content"
+
+    def __init__(
+        self,
+        provider: str,
+        ttl: float = GEMINI_CONTEXT_CACHE_TTL,
+        min_tokens: int = GEMINI_CONTEXT_CACHE_MIN_TOKENS,
+        retry_after: float = GEMINI_CONTEXT_CACHE_RETRY,
+    ):
+        super().__init__(provider)
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.retry_after = retry_after
+        # (model, character id) -> its current handle
+        self._entries: Dict[Tuple[str, str], _CachedContent] = {}
+        # (model, character id, version) -> monotonic time of the next creation attempt
+        self._failures: Dict[Tuple[str, str, Optional[datetime]], float] = {}
+        self._creating: Dict[Tuple[str, str, Optional[datetime]], asyncio.Task] = {}
+        # Handles to delete at the provider, queued by invalidate() from any thread
+        self._stale: List[_CachedContent] = []
+        self._tasks: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _url(client, name: str = "cachedContents") -> str:
+        return f"{client.api_base}/v1beta/{name}"
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def resolve(self, client, key: Optional[PromptCacheKey], system_prompt: str) -> Optional[str]:
+        if key is None or estimate_tokens(system_prompt) < self.min_tokens:
+            return None
+        character_id, version = key
+        slot = (client.model, character_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(slot)
+            stale, self._stale = self._stale, []
+        for old in stale:
+            self._spawn(self._delete(old))
+        # A handle about to expire is not handed out: the request could outlive it
+        if entry is not None and entry.version == version and entry.expires_at > now + 30:
+            self.hits += 1
+            if not entry.refreshing and entry.expires_at - now < self.ttl * GEMINI_CONTEXT_CACHE_REFRESH:
+                entry.refreshing = True
+                self._spawn(self._refresh(entry))
+            return entry.name
+
+        attempt = (client.model, character_id, version)
+        if self._failures.get(attempt, 0) > now:
+            return None
+        task = self._creating.get(attempt)
+        if task is None:
+            task = asyncio.ensure_future(self._create(client, slot, version, system_prompt))
+            self._creating[attempt] = task
+            task.add_done_callback(lambda _: self._creating.pop(attempt, None))
+        return await asyncio.shield(task)
+
+    async def _create(self, client, slot: Tuple[str, str], version: Optional[datetime], system_prompt: str) -> Optional[str]:
+        body = {
+            "model": f"models/{client.model}",
+            "systemInstruction": {"parts": [{"text": system_prompt}]},
+            "ttl": f"{self.ttl:.0f}s",
+            "displayName": f"genana:{slot[1]}",
+        }
+        try:
+            response = await client.http.post(self._url(client), params={"key": client.api_key}, json=body)
+            response.raise_for_status()
+            name = response.json()["name"]
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            self.errors += 1
+            self._failures[(slot[0], slot[1], version)] = time.monotonic() + self.retry_after
+            logger.warning(f"Could not cache the system prompt of character {slot[1]} on {client.model}, sending it inline: {e}")
+            return None
+        entry = _CachedContent(client, version, name, time.monotonic() + self.ttl)
+        with self._lock:
+            old = self._entries.get(slot)
+            self._entries[slot] = entry
+        if old is not None:
+            self._spawn(self._delete(old))
+        self.created += 1
+        logger.debug("Cached system prompt of character {} on {} as {}", slot[1], client.model, name)
+        return name
+
+    async def _refresh(self, entry: _CachedContent):
+        client = entry.client
+        try:
+            response = await client.http.request(
+                "PATCH", self._url(client, entry.name),
+                params={"key": client.api_key, "updateMask": "ttl"}, json={"ttl": f"{self.ttl:.0f}s"},
+            )
+            response.raise_for_status()
+            entry.expires_at = time.monotonic() + self.ttl
+            self.refreshed += 1
+        except httpx.HTTPError as e:
+            self.errors += 1
+            logger.warning(f"Could not extend cached content {entry.name}: {e}")
+            if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 404:
+                self.forget(entry.name)
+        finally:
+            entry.refreshing = False
+
+    async def _delete(self, entry: _CachedContent):
+        client = entry.client
+        try:
+            response = await client.http.request("DELETE", self._url(client, entry.name), params={"key": client.api_key})
+            if response.status_code != 404:
+                response.raise_for_status()
+        except httpx.HTTPError as e:
+            # It still expires with its TTL
+            logger.debug("Could not delete cached content {}: {}", entry.name, e)
+
+    def forget(self, handle: str):
+        with self._lock:
+            for slot, entry in list(self._entries.items()):
+                if entry.name == handle:
+                    del self._entries[slot]
+
+    def invalidate(self, character_id: str):
+        with self._lock:
+            for slot in [slot for slot in self._entries if slot[1] == character_id]:
+                self._stale.append(self._entries.pop(slot))
+
+    async def aclose(self, timeout: float = 5.0):
+        with self._lock:
+            entries = list(self._entries.values()) + self._stale
+            self._entries.clear()
+            self._stale = []
+        tasks = [asyncio.create_task(self._delete(entry)) for entry in entries] + list(self._tasks)
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["handles"] = len(self._entries)
+        return stats
+
+
+PROMPT_CACHE_STRATEGIES = {
+    PromptCache.name: PromptCache,
+    GeminiCachedContent.name: GeminiCachedContent,
+}
+
+
+class PromptCaches:
+    """The prompt cache strategy of each provider, built on first use."""
+    def __init__(self, strategies: Dict[str, str]):
+        for provider, strategy in strategies.items():
+            if strategy not in PROMPT_CACHE_STRATEGIES:
+                raise ValueError(
+                    f"Unknown prompt cache strategy for {provider}: {strategy}. "
+                    f"Expected one of: {', '.join(PROMPT_CACHE_STRATEGIES)}"
+                )
+        self._strategies = strategies
+        self._caches: Dict[str, PromptCache] = {}
+
+    def get(self, provider: str) -> PromptCache:
+        cache = self._caches.get(provider)
+        if cache is None:
+            strategy = self._strategies.get(provider, PromptCache.name)
+            cache = self._caches[provider] = PROMPT_CACHE_STRATEGIES[strategy](provider)
+        return cache
+
+    def invalidate(self, character_id: str):
+        for cache in list(self._caches.values()):
+            cache.invalidate(character_id)
+
+    async def aclose(self, timeout: float = 5.0):
+        for cache in list(self._caches.values()):
+            await cache.aclose(timeout)
+
+    def stats(self) -> dict:
+        return {provider: cache.stats() for provider, cache in self._caches.items()}
+
+
+# Process-wide strategies; SystemPromptCache.invalidate drops a character's handles
+prompt_caches = PromptCaches({"gemini": LLM_PROMPT_CACHE_GEMINI, "mistral": LLM_PROMPT_CACHE_MISTRAL})
+
+registry.callback(
+    "genana_llm_prompt_cache_total", "Provider-side system prompt cache events by provider and result (hit, created, refreshed, error).",
+    ("provider", "result"),
+    lambda: {
+        (provider, result): count
+        for provider, cache in list(prompt_caches._caches.items())
+        for result, count in (("hit", cache.hits), ("created", cache.created), ("refreshed", cache.refreshed), ("error", cache.errors))
+    },
+    type_name="counter",
+)
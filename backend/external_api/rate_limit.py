@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import re
+import time
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+from ..config import env_float, env_int
+from ..metrics import registry
+
+# --- Rate Limit Configuration ---
+# Per provider and API key, e.g. LLM_RATE_RPM_GEMINI=15, LLM_RATE_TPM_MISTRAL=500000.
+# 0 (the default) leaves that dimension unlimited.
+# Longest a request may queue for quota before it is rejected with 429
+LLM_RATE_MAX_WAIT = env_float("LLM_RATE_MAX_WAIT", 10.0)
+# Completion tokens reserved per request on top of the prompt estimate
+LLM_RATE_COMPLETION_TOKENS = env_int("LLM_RATE_COMPLETION_TOKENS", 512)
+# Worker processes sharing the limits; each process enforces limit / WORKER_PROCESSES.
+# The share is not rounded: below 1 per minute a worker admits one request every
+# 60 / share seconds, so the workers together never exceed the configured limit.
+# Set by gunicorn.conf.py, or by hand when running `uvicorn --workers`.
+WORKER_PROCESSES = max(env_int("WEB_CONCURRENCY", 1), 1)
+
+
+class RateLimitedError(Exception):
+    """Raised when a request would have to wait longer than the limiter's max wait for quota."""
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"Rate limit for provider {provider} is saturated.")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Refills continuously at `per_minute / 60` per second up to `per_minute`, i.e.
+    one minute of burst. A fractional limit (a worker's share below 1/min) still
+    holds one whole request but starts from its share, so requests are spaced
+    `60 / per_minute` seconds apart.
+    """
+    def __init__(self, per_minute: float):
+        self.capacity = max(float(per_minute), 1.0)
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self._updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until `amount` is available (after a refill)."""
+        # A single request larger than the bucket would never fit; let it through on a full bucket
+        amount = min(amount, self.capacity)
+        return max(amount - self.level, 0.0) / self.rate
+
+    def consume(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+
+class ProviderRateLimiter:
+    """
+    Requests/min and tokens/min buckets for one provider API key. Requests are
+    admitted strictly in arrival order: asyncio.Lock wakes its waiters FIFO, and
+    the holder sleeps until both buckets cover it. A request whose projected
+    wait (everything queued ahead of it included) exceeds `max_wait` is
+    rejected immediately instead of queueing.
+    """
+    def __init__(self, name: str, rpm: float = 0, tpm: float = 0, max_wait: float = LLM_RATE_MAX_WAIT):
+        self.name = name
+        self.max_wait = max_wait
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self._lock = asyncio.Lock()
+        self._queued_requests = 0
+        self._queued_tokens = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    def _wait(self, requests: int, tokens: int) -> float:
+        """Seconds until both buckets hold `requests` requests and `tokens` tokens."""
+        wait = 0.0
+        if self.requests is not None:
+            self.requests.refill()
+            wait = max(wait, self.requests.time_until(requests))
+        if self.tokens is not None:
+            self.tokens.refill()
+            wait = max(wait, self.tokens.time_until(tokens))
+        return wait
+
+    async def acquire(self, tokens: int):
+        """Waits for quota for one request of about `tokens` tokens, or raises RateLimitedError."""
+        if not self.enabled:
+            return
+        projected = self._wait(self._queued_requests + 1, self._queued_tokens + tokens)
+        if projected > self.max_wait:
+            self.rejected += 1
+            logger.warning(f"Rate limit queue for {self.name} is saturated (projected wait {projected:.1f}s)")
+            raise RateLimitedError(self.name, projected)
+
+        started = time.monotonic()
+        self._queued_requests += 1
+        self._queued_tokens += tokens
+        try:
+            async with self._lock:
+                while True:
+                    wait = self._wait(1, tokens)
+                    if wait <= 0:
+                        break
+                    await asyncio.sleep(wait)
+                if self.requests is not None:
+                    self.requests.consume(1)
+                if self.tokens is not None:
+                    self.tokens.consume(tokens)
+        finally:
+            self._queued_requests -= 1
+            self._queued_tokens -= tokens
+        self.admitted += 1
+        self.wait_total += time.monotonic() - started
+
+    def stats(self) -> dict:
+        return {
+            "rpm": round(self.requests.rate * 60, 3) if self.requests else None,
+            "tpm": round(self.tokens.rate * 60, 3) if self.tokens else None,
+            "queued": self._queued_requests,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.wait_total / self.admitted * 1000, 2) if self.admitted else 0.0,
+        }
+
+
+def _key_fingerprint(api_key: Optional[str]) -> str:
+    # Never keep or expose the key itself
+    return hashlib.sha256((api_key or "").encode()).hexdigest()[:8]
+
+
+class RateLimiterRegistry:
+    """One limiter per (provider, API key); a rotated key starts with fresh buckets."""
+    def __init__(self):
+        self._limiters: Dict[Tuple[str, str], ProviderRateLimiter] = {}
+
+    @staticmethod
+    def _limit(kind: str, provider: str) -> float:
+        """This worker's share of the configured per-minute limit (0 = unlimited)."""
+        name = f"LLM_RATE_{kind}_" + re.sub(r"[^A-Za-z0-9]", "_", provider).upper()
+        limit = env_int(name, 0)
+        if limit <= 0:
+            return 0
+        share = limit / WORKER_PROCESSES
+        if share < 1:
+            logger.warning(
+                f"{name}={limit} split between {WORKER_PROCESSES} workers leaves {share:.2f}/min per worker; "
+                f"each worker admits one request every {60 / share:.0f}s"
+            )
+        return share
+
+    def get(self, provider: str, api_key: Optional[str]) -> ProviderRateLimiter:
+        key = (provider, _key_fingerprint(api_key))
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limiter = ProviderRateLimiter(
+                name=f"{provider}:{key[1]}",
+                rpm=self._limit("RPM", provider),
+                tpm=self._limit("TPM", provider),
+            )
+            self._limiters[key] = limiter
+        return limiter
+
+    def stats(self) -> Dict[str, dict]:
+        return {limiter.name: limiter.stats() for limiter in self._limiters.values() if limiter.enabled}
+
+
+rate_limiters = RateLimiterRegistry()
+
+registry.callback(
+    "genana_llm_rate_limit_queued", "Requests waiting for rate limit quota, by provider key.",
+    ("limiter",), lambda: {(limiter.name,): limiter._queued_requests for limiter in rate_limiters._limiters.values() if limiter.enabled},
+)
+registry.callback(
+    "genana_llm_rate_limit_rejected_total", "Requests rejected because the rate limit queue was saturated.",
+    ("limiter",), lambda: {(limiter.name,): limiter.rejected for limiter in rate_limiters._limiters.values() if limiter.enabled},
+    type_name="counter",
+)
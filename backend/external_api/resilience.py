@@ -0,0 +1,327 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple, TypeVar
+
+import httpx
+from loguru import logger
+
+from ..config import env_float, env_int, env_str
+from ..metrics import registry
+from .llm import BaseLLMClient, ModelBusyError, llm_factory
+from .provider_cache import PromptCacheKey
+from .rate_limit import RateLimitedError
+
+# --- Resilience Configuration ---
+# Attempts per model (the first try included) before moving on to the fallback chain
+LLM_RETRY_ATTEMPTS = env_int("LLM_RETRY_ATTEMPTS", 3)
+# Full-jitter exponential backoff: a random delay in [0, min(MAX, BASE * 2^n)]
+LLM_RETRY_BASE_DELAY = env_float("LLM_RETRY_BASE_DELAY", 0.5)
+LLM_RETRY_MAX_DELAY = env_float("LLM_RETRY_MAX_DELAY", 8.0)
+# A Retry-After longer than this is not waited out; the next model in the chain is tried instead
+LLM_RETRY_AFTER_MAX = env_float("LLM_RETRY_AFTER_MAX", 20.0)
+# Comma-separated models tried after the character's own, e.g. "mistral-small-latest,gemini-2.5-flash"
+LLM_FALLBACK_MODELS = env_str("LLM_FALLBACK_MODELS", "")
+
+# Consecutive failures that open a model's circuit, and how long it stays open
+LLM_BREAKER_THRESHOLD = env_int("LLM_BREAKER_THRESHOLD", 5)
+LLM_BREAKER_RESET_TIMEOUT = env_float("LLM_BREAKER_RESET_TIMEOUT", 30.0)
+
+# Upstream statuses worth retrying; other 4xx mean the request itself is wrong
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+# Raised before the provider is called, so they say nothing about its health
+LOCAL_ERRORS = (ModelBusyError, RateLimitedError)
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the provider while a model's circuit breaker is open."""
+    def __init__(self, model: str, retry_after: float):
+        super().__init__(f"Circuit breaker for model {model} is open.")
+        self.model = model
+        self.retry_after = retry_after
+
+
+class ResiliencePolicy(NamedTuple):
+    """How a chat request reacts to provider errors; built per character by `resolve_policy`."""
+    max_attempts: int = LLM_RETRY_ATTEMPTS
+    base_delay: float = LLM_RETRY_BASE_DELAY
+    max_delay: float = LLM_RETRY_MAX_DELAY
+    fallback_models: Tuple[str, ...] = ()
+    circuit_breaker: bool = True
+
+
+def resolve_policy(settings=None) -> ResiliencePolicy:
+    """
+    Merges a character's `llm_policy` (a schemas.LLMPolicy or the stored dict)
+    over the process defaults. Unset fields keep the defaults.
+    """
+    if settings is None:
+        settings = {}
+    elif not isinstance(settings, dict):
+        settings = settings.dict()
+    fallback = settings.get("fallback_models")
+    if fallback is None:
+        fallback = [model for model in LLM_FALLBACK_MODELS.split(",") if model.strip()]
+    defaults = ResiliencePolicy()
+    return ResiliencePolicy(
+        max_attempts=max(1, settings.get("max_attempts") or defaults.max_attempts),
+        base_delay=settings.get("retry_base_delay") if settings.get("retry_base_delay") is not None else defaults.base_delay,
+        max_delay=settings.get("retry_max_delay") if settings.get("retry_max_delay") is not None else defaults.max_delay,
+        fallback_models=tuple(model.strip() for model in fallback),
+        circuit_breaker=settings.get("circuit_breaker") if settings.get("circuit_breaker") is not None else defaults.circuit_breaker,
+    )
+
+
+class CircuitBreaker:
+    """
+    Per-model breaker: closed until `threshold` consecutive failures, then open
+    for `reset_timeout` seconds, then half-open, letting a single probe request
+    through whose outcome closes or re-opens it.
+    """
+    def __init__(self, model: str, threshold: int = LLM_BREAKER_THRESHOLD, reset_timeout: float = LLM_BREAKER_RESET_TIMEOUT):
+        self.model = model
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def before_call(self):
+        """Raises CircuitOpenError unless a request may go to the provider now."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                logger.info(f"Circuit breaker for model {self.model} is half-open, sending a probe request")
+                return
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            raise CircuitOpenError(self.model, max(remaining, 1.0))
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"Circuit breaker for model {self.model} closed")
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or (self.opened_at is None and self.failures >= self.threshold):
+                logger.warning(f"Circuit breaker for model {self.model} opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def release_probe(self):
+        """Lets another request probe when the probe never reached the provider."""
+        with self._lock:
+            self._probing = False
+
+    def stats(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+
+class CircuitBreakerRegistry:
+    """One breaker per model name, shared by every request in the process."""
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(model)
+            if breaker is None:
+                breaker = self._breakers[model] = CircuitBreaker(model)
+            return breaker
+
+    def stats(self) -> Dict[str, dict]:
+        return {model: breaker.stats() for model, breaker in self._breakers.items()}
+
+
+circuit_breakers = CircuitBreakerRegistry()
+
+registry.callback(
+    "genana_llm_circuit_open", "1 while a model's circuit breaker is open or half-open.",
+    ("model",), lambda: {(model,): int(breaker.state != "closed") for model, breaker in circuit_breakers._breakers.items()},
+)
+
+
+def is_retryable(e: Exception) -> bool:
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(e, httpx.TransportError)
+
+def is_provider_failure(e: Exception) -> bool:
+    """Errors that say nothing about the request itself, so another model may still succeed."""
+    return is_retryable(e) or isinstance(e, (CircuitOpenError, *LOCAL_ERRORS))
+
+def retry_after_seconds(e: Exception) -> Optional[float]:
+    """Parses the Retry-After header (delta-seconds or an HTTP date) of an upstream error."""
+    if not isinstance(e, httpx.HTTPStatusError):
+        return None
+    value = e.response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt: int, policy: ResiliencePolicy, retry_after: Optional[float] = None) -> float:
+    """Delay before retry number `attempt` (1-based); never shorter than the server's Retry-After."""
+    delay = random.uniform(0, min(policy.max_delay, policy.base_delay * 2 ** (attempt - 1)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def _model_chain(model: str, policy: ResiliencePolicy) -> List[str]:
+    chain = [model]
+    for fallback in policy.fallback_models:
+        if fallback not in chain:
+            chain.append(fallback)
+    return chain
+
+
+async def _call_model(client: BaseLLMClient, policy: ResiliencePolicy, call: Callable[[BaseLLMClient], Awaitable[T]]) -> T:
+    """Runs `call` against one model with the policy's retries and circuit breaker."""
+    model = client.model
+    breaker = circuit_breakers.get(model) if policy.circuit_breaker else None
+    attempt = 1
+    while True:
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = await call(client)
+        except asyncio.CancelledError:
+            if breaker is not None:
+                breaker.release_probe()
+            raise
+        except Exception as e:
+            if breaker is not None:
+                if is_retryable(e):
+                    breaker.record_failure()
+                elif isinstance(e, LOCAL_ERRORS):
+                    breaker.release_probe()
+                else:
+                    # The provider answered, even if it rejected the request
+                    breaker.record_success()
+            if not is_retryable(e) or attempt >= policy.max_attempts:
+                raise
+            retry_after = retry_after_seconds(e)
+            if retry_after is not None and retry_after > LLM_RETRY_AFTER_MAX:
+                logger.warning(f"Model {model} asked to retry after {retry_after:.1f}s, not waiting")
+                raise
+            delay = backoff_delay(attempt, policy, retry_after)
+            logger.warning(f"Attempt {attempt} on model {model} failed ({e}); retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        if breaker is not None:
+            breaker.record_success()
+        return result
+
+
+async def _call_with_fallback(model: str, policy: ResiliencePolicy, call: Callable[[BaseLLMClient], Awaitable[T]]) -> Tuple[T, str]:
+    """
+    Tries the character's model, then each fallback in turn, as long as the
+    failures are the provider's. Raises the primary model's error when the
+    whole chain fails.
+    """
+    first_error = None
+    for index, candidate in enumerate(_model_chain(model, policy)):
+        try:
+            client = llm_factory.get_client(candidate)
+        except ValueError as e:
+            # Unknown model or missing API key: fatal for the primary model,
+            # a misconfigured fallback is skipped
+            if index == 0:
+                raise
+            logger.warning(f"Skipping fallback model {candidate}: {e}")
+            continue
+        try:
+            result = await _call_model(client, policy, call)
+        except Exception as e:
+            if not is_provider_failure(e):
+                raise
+            first_error = first_error or e
+            logger.warning(f"Model {candidate} failed: {e}")
+            continue
+        if index > 0:
+            logger.info(f"Model {model} unavailable, answered by fallback {candidate}")
+        return result, candidate
+    raise first_error
+
+
+async def generate_text(
+    model: str,
+    policy: ResiliencePolicy,
+    system_prompt: str,
+    user_message: str,
+    history: List[Dict[str, str]],
+    cache_key: Optional[PromptCacheKey] = None,
+) -> Tuple[str, str]:
+    """
+    `BaseLLMClient.generate_text` with retries, circuit breaking and the fallback
+    chain of `policy`. Returns the reply and the model that produced it.
+    """
+    return await _call_with_fallback(
+        model, policy, lambda client: client.generate_text(system_prompt, user_message, history, cache_key)
+    )
+
+
+async def stream_text(
+    model: str,
+    policy: ResiliencePolicy,
+    system_prompt: str,
+    user_message: str,
+    history: List[Dict[str, str]],
+    on_model: Optional[Callable[[str], None]] = None,
+    cache_key: Optional[PromptCacheKey] = None,
+) -> AsyncIterator[str]:
+    """
+    `BaseLLMClient.stream_text` with the same policy as `generate_text`. Retries
+    and fallbacks only cover the wait for the first chunk; once text has reached
+    the client, a failure is raised as is. `on_model` is told which model answers.
+    """
+    async def open_stream(client: BaseLLMClient):
+        stream = client.stream_text(system_prompt, user_message, history, cache_key)
+        try:
+            return await stream.__anext__(), stream
+        except StopAsyncIteration:
+            return None, stream
+        except BaseException:
+            await stream.aclose()
+            raise
+
+    (first, stream), answered_by = await _call_with_fallback(model, policy, open_stream)
+    if on_model is not None:
+        on_model(answered_by)
+    if first is None:
+        return
+    try:
+        yield first
+        async for chunk in stream:
+            yield chunk
+    finally:
+        await stream.aclose()
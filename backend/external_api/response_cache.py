@@ -0,0 +1,222 @@
+import asyncio
+import difflib
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from ..config import env_float, env_int, env_str
+from ..metrics import registry
+
+# --- Response Cache Configuration ---
+# SQLite file of the completion cache, kept apart from the main database so
+# cache writes never contend with chat writes
+LLM_RESPONSE_CACHE_PATH = env_str(
+    "LLM_RESPONSE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "llm_cache.db"),
+)
+LLM_RESPONSE_CACHE_SIZE = env_int("LLM_RESPONSE_CACHE_SIZE", 10000)
+LLM_RESPONSE_CACHE_TTL = env_float("LLM_RESPONSE_CACHE_TTL", 86400.0)
+# Mode for characters that do not set llm_policy.response_cache: off, exact or similar
+LLM_RESPONSE_CACHE_DEFAULT = env_str("LLM_RESPONSE_CACHE_DEFAULT", "off")
+# "similar" mode: first-turn messages at most this long whose similarity ratio
+# to a cached first turn reaches the threshold reuse its reply
+LLM_RESPONSE_CACHE_SIMILARITY = env_float("LLM_RESPONSE_CACHE_SIMILARITY", 0.85)
+LLM_RESPONSE_CACHE_SIMILAR_MAX_CHARS = env_int("LLM_RESPONSE_CACHE_SIMILAR_MAX_CHARS", 64)
+# Cached first turns compared per lookup in "similar" mode
+SIMILAR_CANDIDATES = 200
+
+CACHE_MODES = ("off", "exact", "similar")
+
+
+def normalize_text(text: str) -> str:
+    """Case- and whitespace-insensitive form of a message used in cache keys."""
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def _digest(value) -> str:
+    return hashlib.sha256(json.dumps(value, ensure_ascii=False, sort_keys=True).encode()).hexdigest()
+
+
+def resolve_cache_mode(settings=None) -> str:
+    """A character's response cache mode from its `llm_policy`, or the process default."""
+    if settings is not None and not isinstance(settings, dict):
+        settings = settings.dict()
+    mode = (settings or {}).get("response_cache") or LLM_RESPONSE_CACHE_DEFAULT
+    if mode not in CACHE_MODES:
+        logger.warning(f"Unknown response cache mode {mode!r}, caching disabled")
+        return "off"
+    return mode
+
+
+class ResponseCache:
+    """
+    Completion cache in a SQLite file, keyed by a hash of (model, system prompt,
+    generation params, normalized history, normalized user message). Entries
+    expire after `ttl` seconds and the least recently used ones are evicted
+    beyond `max_entries`. In "similar" mode a first turn (no history) may also
+    reuse the reply to a close-enough cached first turn of the same scope.
+    Blocking SQLite calls run in a worker thread.
+    """
+    def __init__(self, path: str = LLM_RESPONSE_CACHE_PATH, max_entries: int = LLM_RESPONSE_CACHE_SIZE, ttl: float = LLM_RESPONSE_CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._connection: Optional[sqlite3.Connection] = None
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            logger.info(f"Opening LLM response cache at {self.path}")
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                " key TEXT PRIMARY KEY, scope TEXT NOT NULL, first_turn TEXT,"
+                " response TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_response_cache_last_used ON response_cache (last_used)")
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_response_cache_scope ON response_cache (scope, first_turn)")
+            self._size = connection.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+            self._connection = connection
+        return self._connection
+
+    @staticmethod
+    def _scope(model: str, system_prompt: str, params: Dict) -> str:
+        return _digest([model, system_prompt, params])
+
+    @staticmethod
+    def _key(scope: str, history: List[Dict[str, str]], user_message: str) -> str:
+        normalized = [[item["role"], normalize_text(item["content"])] for item in history]
+        return _digest([scope, normalized, normalize_text(user_message)])
+
+    def _get(self, mode: str, model: str, system_prompt: str, history, user_message: str, params: Dict) -> Optional[str]:
+        scope = self._scope(model, system_prompt, params)
+        key = self._key(scope, history, user_message)
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT response FROM response_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is not None:
+                connection.execute("UPDATE response_cache SET last_used = ? WHERE key = ?", (now, key))
+                self.hits += 1
+                return row[0]
+
+            first_turn = normalize_text(user_message)
+            if mode == "similar" and not history and len(first_turn) <= LLM_RESPONSE_CACHE_SIMILAR_MAX_CHARS:
+                candidates = connection.execute(
+                    "SELECT key, first_turn, response FROM response_cache"
+                    " WHERE scope = ? AND first_turn IS NOT NULL AND expires_at > ?"
+                    " ORDER BY last_used DESC LIMIT ?",
+                    (scope, now, SIMILAR_CANDIDATES),
+                ).fetchall()
+                best_ratio, best = 0.0, None
+                for candidate_key, candidate_text, response in candidates:
+                    ratio = difflib.SequenceMatcher(None, first_turn, candidate_text).ratio()
+                    if ratio > best_ratio:
+                        best_ratio, best = ratio, (candidate_key, response)
+                if best is not None and best_ratio >= LLM_RESPONSE_CACHE_SIMILARITY:
+                    connection.execute("UPDATE response_cache SET last_used = ? WHERE key = ?", (now, best[0]))
+                    self.similar_hits += 1
+                    return best[1]
+
+            self.misses += 1
+            return None
+
+    def _put(self, model: str, system_prompt: str, history, user_message: str, params: Dict, response: str):
+        scope = self._scope(model, system_prompt, params)
+        key = self._key(scope, history, user_message)
+        first_turn = normalize_text(user_message) if not history else None
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            # SQLite reports a rowcount of 1 for a replaced row too, so only a new key grows the count
+            exists = connection.execute("SELECT 1 FROM response_cache WHERE key = ?", (key,)).fetchone() is not None
+            connection.execute(
+                "INSERT OR REPLACE INTO response_cache (key, scope, first_turn, response, expires_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, scope, first_turn, response, now + self.ttl, now),
+            )
+            self.stores += 1
+            if not exists:
+                self._size += 1
+            if self._size > self.max_entries:
+                self._evict(connection, now)
+
+    def _evict(self, connection: sqlite3.Connection, now: float):
+        expired = connection.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,)).rowcount
+        self._size = connection.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+        # Evict down to 90% so that eviction does not run on every insert
+        excess = self._size - int(self.max_entries * 0.9)
+        evicted = 0
+        if excess > 0:
+            evicted = connection.execute(
+                "DELETE FROM response_cache WHERE key IN"
+                " (SELECT key FROM response_cache ORDER BY last_used LIMIT ?)",
+                (excess,),
+            ).rowcount
+            self._size -= evicted
+        self.evictions += expired + evicted
+        logger.debug("Response cache evicted {} expired and {} least recently used entries", expired, evicted)
+
+    async def get(self, mode: str, model: str, system_prompt: str, history: List[Dict[str, str]], user_message: str, params: Dict) -> Optional[str]:
+        """Returns a cached completion, or None on a miss or when `mode` is off."""
+        if mode == "off":
+            return None
+        try:
+            return await asyncio.to_thread(self._get, mode, model, system_prompt, history, user_message, params)
+        except sqlite3.Error as e:
+            logger.error(f"Response cache lookup failed: {e}")
+            return None
+
+    async def put(self, mode: str, model: str, system_prompt: str, history: List[Dict[str, str]], user_message: str, params: Dict, response: str):
+        if mode == "off" or not response:
+            return
+        try:
+            await asyncio.to_thread(self._put, model, system_prompt, history, user_message, params, response)
+        except sqlite3.Error as e:
+            logger.error(f"Response cache store failed: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.similar_hits + self.misses
+        return {
+            "size": self._size,
+            "max_size": self.max_entries,
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "hit_ratio": round((self.hits + self.similar_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Process-wide completion cache; characters opt in through llm_policy.response_cache
+response_cache = ResponseCache()
+
+registry.callback(
+    "genana_llm_response_cache_lookups_total", "Response cache lookups by result (hit, similar_hit, miss).",
+    ("result",), lambda: {("hit",): response_cache.hits, ("similar_hit",): response_cache.similar_hits, ("miss",): response_cache.misses},
+    type_name="counter",
+)
@@ -0,0 +1,13 @@
+import math
+
+from ..config import env_float
+
+# Rough characters-per-token ratio; 3.5 is a compromise between English (~4) and Russian (~3)
+CONTEXT_CHARS_PER_TOKEN = env_float("CONTEXT_CHARS_PER_TOKEN", 3.5)
+# Role markers and separators added by the providers around each message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local token estimate; no tokenizer round-trip on the hot path."""
+    return math.ceil(len(text) / CONTEXT_CHARS_PER_TOKEN) + MESSAGE_OVERHEAD_TOKENS
@@ -0,0 +1,69 @@
+"""
+Multi-worker deployment: gunicorn supervising uvicorn workers, one per core.
+Run from the repository root:
+
+    gunicorn -c backend/gunicorn.conf.py backend.main:app
+
+The master applies migrations once before forking, so workers only check the
+schema version. Every worker then builds its own DB connections, HTTP pools,
+description queue and caches in the app lifespan. On SIGTERM a worker stops
+accepting connections, finishes open requests, and drains background LLM
+work for up to SHUTDOWN_DRAIN_TIMEOUT seconds.
+
+Without gunicorn, the equivalent is:
+
+    python -m backend.migrate
+    GENANA_MIGRATE_ON_STARTUP=false WEB_CONCURRENCY=4 uvicorn backend.main:app --workers 4
+
+`backend.main:app` is built on first access by `create_app()`; importing
+backend.main alone sets nothing up. Workers skip the table and index check
+when the schema version is current, and open provider connection pools on
+the first LLM call; `python -m backend.bench startup` measures the cold start.
+
+POST /api/ai-models/reload only reloads the worker that serves it. To pick up
+new API keys or LLM limits from .env on every worker, send SIGHUP to the
+master (`kill -HUP <master pid>`): it replaces the workers gracefully.
+
+State that stays per process: the character detail cache (bounded by
+CHARACTER_CACHE_TTL; list and search ETags come from the catalogue version
+in the database, so they change on every worker), LLM concurrency limits (LLM_MAX_CONCURRENCY, per
+worker) and the rate limit buckets (each worker enforces 1/WEB_CONCURRENCY of
+LLM_RATE_*, unrounded: with more workers than the limit each one spaces its
+requests more than a minute apart, and logs a warning). The response cache is a shared SQLite file. Use the "prod" DB
+profile (WAL) so that workers do not block each other's reads.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("GENANA_BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+# The app is async and I/O bound: one event loop per core
+workers = int(os.getenv("WEB_CONCURRENCY") or multiprocessing.cpu_count())
+# Workers import the app themselves, after the fork
+preload_app = False
+
+# Must exceed SHUTDOWN_DRAIN_TIMEOUT, or workers are killed mid-drain
+graceful_timeout = int(os.getenv("GENANA_GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("GENANA_WORKER_TIMEOUT", "120"))
+keepalive = 5
+
+# Inherited by the workers
+os.environ["WEB_CONCURRENCY"] = str(workers)
+os.environ.setdefault("GENANA_DB_PROFILE", "prod")
+os.environ.setdefault("LOG_FILE", "logs/backend-{pid}.log")
+os.environ.setdefault("SHUTDOWN_DRAIN_TIMEOUT", str(max(graceful_timeout - 5, 1)))
+
+
+def on_starting(server):
+    # Once, in the master, before any worker exists. Set before the import:
+    # forked workers inherit the already imported database module.
+    os.environ["GENANA_MIGRATE_ON_STARTUP"] = "false"
+    from backend.migrate import migrate
+    if migrate() != 0:
+        raise RuntimeError("Database migration failed.")
+
+
+def post_fork(server, worker):
+    # The master opened DB connections to migrate; they must not be shared
+    from backend.database import database
+    database.dispose_after_fork()
@@ -1,9 +1,92 @@
+import json
+import os
+import random
 import sys
+import uuid
+from contextvars import ContextVar
 from loguru import logger
+from .config import env_bool, env_float, env_int, env_str
+
+# --- Logging Configuration ---
+LOG_LEVEL = env_str("LOG_LEVEL", "INFO")
+# "{pid}" is replaced with the process id; use it when several worker
+# processes run, so that each one writes (and rotates) a file of its own
+LOG_FILE = env_str("LOG_FILE", "logs/backend.log")
+LOG_FILE_LEVEL = env_str("LOG_FILE_LEVEL", "DEBUG")
+# One JSON object per line in the log file (stderr stays human-readable)
+LOG_JSON = env_bool("LOG_JSON", True)
+# Share of DEBUG records kept; hot-path debug events are sampled instead of all written
+LOG_DEBUG_SAMPLE_RATE = env_float("LOG_DEBUG_SAMPLE_RATE", 1.0)
+# Longest message written; payloads such as chat content are cut beyond this
+LOG_MAX_MESSAGE_CHARS = env_int("LOG_MAX_MESSAGE_CHARS", 2000)
+# Longest single value rendered by `truncate`
+LOG_MAX_FIELD_CHARS = env_int("LOG_MAX_FIELD_CHARS", 200)
+
+# Correlation id of the request being handled; set by the middleware in main.py
+# and inherited by threadpool calls and tasks started while handling it
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def truncate(value, limit: int = LOG_MAX_FIELD_CHARS) -> str:
+    """Renders a value for a log line, cut to `limit` characters."""
+    text = str(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... ({len(text)} chars)"
+
+
+def _patch(record):
+    record["extra"].setdefault("request_id", request_id_var.get())
+    message = record["message"]
+    if len(message) > LOG_MAX_MESSAGE_CHARS:
+        record["message"] = f"{message[:LOG_MAX_MESSAGE_CHARS]}... ({len(message)} chars)"
+
+
+def _sample(record) -> bool:
+    if record["level"].name == "DEBUG" and LOG_DEBUG_SAMPLE_RATE < 1.0:
+        return random.random() < LOG_DEBUG_SAMPLE_RATE
+    return True
+
+
+def _json_format(record) -> str:
+    entry = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "request_id": record["extra"].get("request_id"),
+        "message": record["message"],
+    }
+    if record["exception"] is not None:
+        entry["exception"] = repr(record["exception"].value)
+    record["extra"]["_json"] = json.dumps(entry, ensure_ascii=False, default=str)
+    return "{extra[_json]}\n"
+
 
 def setup_logging():
     logger.remove()
-    logger.add(sys.stderr, level="INFO")
-    logger.add("logs/backend.log", rotation="10 MB", retention="10 days", level="DEBUG")
-
-logger.info("Logger setup complete.")
+    logger.configure(patcher=_patch)
+    # enqueue=True: records are written by a background thread, so disk I/O
+    # never blocks the event loop
+    logger.add(
+        sys.stderr,
+        level=LOG_LEVEL,
+        enqueue=True,
+        format="<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+               "{extra[request_id]} | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
+    )
+    logger.add(
+        LOG_FILE.replace("{pid}", str(os.getpid())),
+        rotation="10 MB",
+        retention="10 days",
+        level=LOG_FILE_LEVEL,
+        enqueue=True,
+        filter=_sample,
+        format=_json_format if LOG_JSON else "{time} | {level: <8} | {extra[request_id]} | {name}:{function}:{line} - {message}",
+    )
+    logger.info("Logger setup complete.")
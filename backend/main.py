@@ -1,50 +1,205 @@
-from fastapi import FastAPI, Depends, HTTPException
+import asyncio
+import json
+import math
+import secrets
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from fastapi import APIRouter, FastAPI, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 import httpx
 from sqlalchemy.orm import Session
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from typing import AsyncIterator, List, Optional, Tuple
 from loguru import logger
+from pydantic import ValidationError
 
-from .database import database, crud
+from .database import database, crud, async_crud
+from .database.archive import history_cursor
+from .database.maintenance import db_maintenance
+from .database.cache import character_cache, character_etag, catalogue_etag, search_etag
 from . import schemas
-from .logging_config import setup_logging
-from .external_api.llm import llm_factory, GEMINI_FLASH, MISTRAL_LARGE, MISTRAL_SMALL, generate_description
-from .external_api.prompt_builder import build_system_prompt
+from .config import env_bool, env_float, env_int, env_str
+from .logging_config import new_request_id, request_id_var, setup_logging, truncate
+from .external_api.llm import llm_factory, single_flight, GEMINI_API_URL, MISTRAL_API_URL, ModelBusyError
+from .external_api.http_pool import http_pools
+from .external_api.prompt_cache import system_prompt_cache
+from .external_api.provider_cache import prompt_caches
+from .external_api.prompt_builder import with_conversation_summary
+from .external_api.context_builder import build_chat_context, summary_refresher
+from .external_api import resilience
+from .external_api.resilience import CircuitOpenError, circuit_breakers
+from .external_api.rate_limit import RateLimitedError, rate_limiters
+from .external_api.response_cache import response_cache
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, EVENT_LOOP_LAG_INTERVAL, HTTP_IN_FLIGHT, HTTP_REQUEST_SECONDS, StageTimer, monitor_event_loop_lag, registry
+from .external_api.description_jobs import description_jobs, DESCRIPTION_PLACEHOLDER, PENDING, READY
 
 
-setup_logging()
+# Seconds background work (description jobs, summaries, LLM calls) gets to
+# finish on shutdown; keep it below the process manager's graceful timeout
+SHUTDOWN_DRAIN_TIMEOUT = env_float("SHUTDOWN_DRAIN_TIMEOUT", 20.0)
 
-app = FastAPI()
+# Bulk import/export: characters inserted per transaction, longest accepted
+# NDJSON line, and rows fetched per round trip (and per chunk) when exporting
+BULK_IMPORT_BATCH_SIZE = env_int("BULK_IMPORT_BATCH_SIZE", 200)
+BULK_IMPORT_MAX_LINE_BYTES = env_int("BULK_IMPORT_MAX_LINE_BYTES", 1024 * 1024)
+BULK_EXPORT_BATCH_SIZE = env_int("BULK_EXPORT_BATCH_SIZE", 500)
 
-# Настройка CORS
-origins = [
-    "http://localhost",
-    "http://localhost:3000",
-]
+# Open the provider connection pools at startup instead of on the first LLM call.
+# Each costs a TLS context (~0.1-0.2 s); off by default so workers become ready sooner
+WARM_HTTP_POOLS = env_bool("GENANA_WARM_HTTP_POOLS", False)
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"], # Разрешаем все методы, включая OPTIONS
-    allow_headers=["*"],
-)
+# Token expected in the X-Admin-Token header of admin endpoints (POST
+# /api/ai-models/reload); unset disables those endpoints
+ADMIN_TOKEN = env_str("GENANA_ADMIN_TOKEN")
 
-@app.on_event("startup")
-def on_startup():
-    logger.info("Starting up and creating database tables.")
-    database.create_db_and_tables()
 
-@app.post("/api/characters", response_model=schemas.Character)
-async def create_character_endpoint(character: schemas.CharacterCreate, db: Session = Depends(database.get_db)):
-    logger.info(f"Creating character with name: {character.name}")
+@dataclass
+class Settings:
+    """
+    What `create_app` sets up. The defaults come from the environment; tests and
+    tools pass their own, e.g. Settings(setup_logging=False, background_tasks=False).
+    The database itself is still configured through DATABASE_URL and friends.
+    """
+    setup_logging: bool = True
+    # Apply pending migrations (False: only check the schema version)
+    migrate_on_startup: bool = database.MIGRATE_ON_STARTUP
+    warm_http_pools: bool = WARM_HTTP_POOLS
+    # Description workers, database maintenance and the event loop lag monitor
+    background_tasks: bool = True
+    shutdown_drain_timeout: float = SHUTDOWN_DRAIN_TIMEOUT
+    cors_origins: Tuple[str, ...] = ("http://localhost", "http://localhost:3000")
+    admin_token: Optional[str] = ADMIN_TOKEN
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs in every worker process after it has started (i.e. after the fork),
+    # so connection pools, queues and background tasks are per process
+    settings: Settings = app.state.settings
+    logger.info("Starting up and preparing the database.")
+    database.init_db(migrate=settings.migrate_on_startup)
+    if settings.warm_http_pools:
+        http_pools.start(GEMINI_API_URL, MISTRAL_API_URL)
+    lag_monitor = None
+    if settings.background_tasks:
+        await description_jobs.start()
+        db_maintenance.start()
+        if EVENT_LOOP_LAG_INTERVAL > 0:
+            lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    yield
+    # The server has stopped accepting requests and waited for open ones
+    logger.info("Shutting down, draining background work.")
+    if lag_monitor is not None:
+        lag_monitor.cancel()
+    await db_maintenance.stop()
+    drain_until = time.monotonic() + settings.shutdown_drain_timeout
+    await description_jobs.stop(timeout=settings.shutdown_drain_timeout)
+    await summary_refresher.drain(timeout=max(drain_until - time.monotonic(), 0.0))
+    await llm_factory.drain(timeout=max(drain_until - time.monotonic(), 0.0))
+    # Provider-side prompt caches are deleted rather than left to expire (and be billed)
+    await prompt_caches.aclose(timeout=max(drain_until - time.monotonic(), 1.0))
+    logger.info("Closing HTTP connection pools.")
+    await http_pools.aclose()
+    response_cache.close()
+    await database.dispose_engines()
+    # Flush records still queued for the enqueued log sinks
+    await logger.complete()
+
+
+# Endpoints; create_app mounts them on a new application
+router = APIRouter()
+
+
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    """
+    Builds the application. Importing this module sets nothing up: logging is
+    configured here, and the database, connection pools and background work
+    are started lazily or in the lifespan of each worker.
+    """
+    settings = settings or Settings()
+    if settings.setup_logging:
+        setup_logging()
+    app = FastAPI(lifespan=lifespan)
+    app.state.settings = settings
+
+    # Настройка CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=list(settings.cors_origins),
+        allow_credentials=True,
+        allow_methods=["*"], # Разрешаем все методы, включая OPTIONS
+        allow_headers=["*"],
+    )
+    app.middleware("http")(metrics_middleware)
+    app.middleware("http")(request_id_middleware)
+    app.include_router(router)
+    return app
+
+
+_app: Optional[FastAPI] = None
+
+
+def __getattr__(name: str):
+    # `backend.main:app` (uvicorn, gunicorn) builds the default app on first access
+    global _app
+    if name == "app":
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+async def metrics_middleware(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        with HTTP_IN_FLIGHT.track():
+            response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # The route template keeps the label set bounded (no ids in paths)
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=status,
+        )
+
+async def request_id_middleware(request: Request, call_next):
+    # Every log line written while handling the request carries this id
+    request_id = request.headers.get("x-request-id") or new_request_id()
+    token = request_id_var.set(request_id[:64])
+    try:
+        response = await call_next(request)
+        response.headers["X-Request-ID"] = request_id_var.get()
+        return response
+    finally:
+        request_id_var.reset(token)
+
+@router.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    return Response(registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def _character_data(character: schemas.CharacterCreate) -> Tuple[dict, bool]:
+    """Row values for a new character, and whether its description must be generated."""
     character_data = character.dict()
 
-    # Generate description if it's missing
-    if not character_data.get('description'):
-        logger.info("Description is missing, generating a new one...")
-        generated_description = await generate_description(character_data)
-        character_data['description'] = generated_description
+    # A missing description is generated in the background; the character is
+    # saved right away with a placeholder
+    generate_description = not character_data.get('description')
+    if generate_description:
+        character_data['description'] = DESCRIPTION_PLACEHOLDER
+    character_data['description_status'] = PENDING if generate_description else READY
 
     # Form tags
     tags = []
@@ -56,23 +211,173 @@ async def create_character_endpoint(character: schemas.CharacterCreate, db: Sess
 
     if 'content_filter' in character_data and isinstance(character_data['content_filter'], str):
         character_data['content_filter'] = character_data['content_filter'].lower() in ['true', 'yes', '1']
-    
-    db_character = crud.create_character(db=db, character_data=character_data)
+    return character_data, generate_description
+
+@router.post("/api/characters", response_model=schemas.Character)
+async def create_character_endpoint(character: schemas.CharacterCreate, db = Depends(database.get_session)):
+    logger.info(f"Creating character with name: {character.name}")
+    character_data, generate_description = _character_data(character)
+    if generate_description:
+        logger.info("Description is missing, queueing generation...")
+
+    db_character = await async_crud.create_character(db, character_data=character_data)
     logger.info(f"Character {db_character.name} created with ID: {db_character.id}")
+    if generate_description:
+        description_jobs.enqueue(db_character.id)
     return db_character
 
-@app.get("/api/characters", response_model=List[schemas.Character])
-def get_characters_endpoint(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db)):
+async def _ndjson_lines(request: Request) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """
+    Yields (line number, line) for every non-empty line of an NDJSON body as it
+    arrives. A line longer than BULK_IMPORT_MAX_LINE_BYTES is yielded as None.
+    """
+    buffer = b""
+    line_number = 0
+    oversized = False
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if oversized or len(line) > BULK_IMPORT_MAX_LINE_BYTES:
+                oversized = False
+                yield line_number, None
+            elif line.strip():
+                yield line_number, line
+        if len(buffer) > BULK_IMPORT_MAX_LINE_BYTES:
+            # Drop the rest of an oversized line instead of buffering it
+            oversized = True
+            buffer = b""
+    if oversized or len(buffer) > BULK_IMPORT_MAX_LINE_BYTES:
+        yield line_number + 1, None
+    elif buffer.strip():
+        yield line_number + 1, buffer
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in item['loc']) or 'line'}: {item['msg']}" for item in error.errors())
+
+@router.post("/api/characters:bulk", response_model=schemas.BulkImportResult)
+async def bulk_import_characters_endpoint(request: Request, db = Depends(database.get_session)):
+    """
+    Imports characters from an NDJSON body, one CharacterCreate object per line.
+    The body is validated as it streams in and inserted in batches of
+    BULK_IMPORT_BATCH_SIZE, each in its own transaction. Rejected lines are
+    reported without stopping the import; missing descriptions are queued for
+    background generation rather than awaited.
+    """
+    logger.info("Starting bulk character import.")
+    items: List[dict] = []
+    batch: List[Tuple[int, dict, bool]] = []
+
+    async def flush():
+        results = await async_crud.create_characters_bulk(db, [character_data for _, character_data, _ in batch])
+        for (line_number, _, generate_description), (db_character, error) in zip(batch, results):
+            if db_character is None:
+                items.append({"line": line_number, "error": error})
+                continue
+            items.append({"line": line_number, "id": db_character.id})
+            if generate_description:
+                description_jobs.enqueue(db_character.id)
+        batch.clear()
+
+    async for line_number, line in _ndjson_lines(request):
+        if line is None:
+            items.append({"line": line_number, "error": f"Line exceeds {BULK_IMPORT_MAX_LINE_BYTES} bytes"})
+            continue
+        try:
+            character = schemas.CharacterCreate.model_validate_json(line)
+        except ValidationError as e:
+            items.append({"line": line_number, "error": _validation_message(e)})
+            continue
+        character_data, generate_description = _character_data(character)
+        batch.append((line_number, character_data, generate_description))
+        if len(batch) >= BULK_IMPORT_BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+
+    items.sort(key=lambda item: item["line"])
+    created = sum(1 for item in items if item.get("id"))
+    logger.info(f"Bulk import finished: {created} created, {len(items) - created} rejected.")
+    return {"created": created, "failed": len(items) - created, "items": items}
+
+@router.get("/api/characters:export")
+def export_characters_endpoint():
+    """
+    Streams the whole catalogue as NDJSON (one Character per line, oldest first).
+    The output can be posted back to /api/characters:bulk.
+    """
+    logger.info("Exporting characters.")
+
+    def lines():
+        # The request-scoped session is closed before the body is streamed
+        db = database.SessionLocal()
+        try:
+            chunk = []
+            for db_character in crud.iter_characters(db, batch_size=BULK_EXPORT_BATCH_SIZE):
+                chunk.append(schemas.Character.model_validate(db_character, from_attributes=True).model_dump_json())
+                if len(chunk) >= BULK_EXPORT_BATCH_SIZE:
+                    yield "\n".join(chunk) + "\n"
+                    chunk = []
+            if chunk:
+                yield "\n".join(chunk) + "\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="characters.ndjson"'},
+    )
+
+@router.get("/api/characters", response_model=List[schemas.Character])
+def get_characters_endpoint(request: Request, response: Response, skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db)):
     logger.info(f"Fetching characters with skip: {skip} and limit: {limit}")
-    characters = crud.get_characters(db, skip=skip, limit=limit)
-    logger.debug(f"Found {len(characters)} characters.")
+    # The ETag only depends on the catalogue version (one aggregate query, shared
+    # by all workers), so an unchanged catalogue is answered without loading rows
+    version = crud.get_catalogue_version(db)
+    etag = catalogue_etag(version, skip, limit)
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    characters = crud.get_characters_cached(db, skip=skip, limit=limit, version=version)
+    logger.debug("Found {} characters.", len(characters))
+    response.headers["ETag"] = etag
     return characters
 
-@app.get("/api/characters/recommended", response_model=schemas.Character)
+@router.get("/api/characters/search", response_model=schemas.CharacterSearchPage)
+def search_characters_endpoint(
+    request: Request,
+    response: Response,
+    q: Optional[str] = Query(default=None, max_length=200),
+    language: Optional[str] = None,
+    ai_model: Optional[str] = None,
+    target_audience: Optional[str] = None,
+    tags: List[str] = Query(default=[]),
+    cursor: Optional[str] = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    db: Session = Depends(database.get_db),
+):
+    """Full-text search with filters over the catalogue; returns slim list entries, best match first."""
+    logger.info(f"Searching characters: q={q!r} language={language} ai_model={ai_model} tags={tags}")
+    # Results only change with the catalogue, so its version plus the query identify them
+    etag = search_etag(crud.get_catalogue_version(db), str(request.query_params))
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    try:
+        characters, next_cursor = crud.search_characters(
+            db, query=q, language=language, ai_model=ai_model, target_audience=target_audience,
+            tags=tags, cursor=cursor, limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response.headers["ETag"] = etag
+    return {"characters": characters, "next_cursor": next_cursor}
+
+@router.get("/api/characters/recommended", response_model=schemas.Character)
 def get_recommended_character_endpoint(db: Session = Depends(database.get_db)):
     logger.info("Fetching recommended character.")
     # Временная реализация: возвращаем первого персонажа или 404
-    character = crud.get_characters(db, limit=1)
+    character = crud.get_characters_cached(db, limit=1)
     if not character:
         logger.warning("No characters found to recommend.")
         raise HTTPException(status_code=404, detail="No characters found")
@@ -80,93 +385,354 @@ def get_recommended_character_endpoint(db: Session = Depends(database.get_db)):
     return character[0]
 
 
-@app.get("/api/characters/{character_id}", response_model=schemas.Character)
-def get_character_endpoint(character_id: str, db: Session = Depends(database.get_db)):
+@router.get("/api/characters/{character_id}", response_model=schemas.Character)
+def get_character_endpoint(character_id: str, request: Request, response: Response, db: Session = Depends(database.get_db)):
     logger.info(f"Fetching character with id: {character_id}")
-    db_character = crud.get_character(db, character_id=character_id)
-    if db_character is None:
+    character = crud.get_character_cached(db, character_id=character_id)
+    if character is None:
         logger.warning(f"Character with id {character_id} not found")
         raise HTTPException(status_code=404, detail="Character not found")
-    logger.debug(f"Found character with id {character_id}")
-    return db_character
+    etag = character_etag(character)
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    logger.debug("Found character with id {}", character_id)
+    response.headers["ETag"] = etag
+    return character
 
-@app.get("/api/ai-models", response_model=List[str])
+@router.get("/api/characters/{character_id}/description", response_model=schemas.CharacterDescription)
+async def get_character_description_endpoint(
+    character_id: str,
+    wait: float = Query(default=0, ge=0, le=30),
+    db = Depends(database.get_session)
+):
+    """
+    Returns the description and its generation status. With `wait`, a pending
+    description is long-polled for up to that many seconds.
+    """
+    logger.info(f"Fetching description of character {character_id} (wait: {wait})")
+    if wait:
+        await description_jobs.wait_for(character_id, timeout=wait)
+    character = await async_crud.get_character(db, character_id)
+    if character is None:
+        logger.warning(f"Character with id {character_id} not found")
+        raise HTTPException(status_code=404, detail="Character not found")
+    return schemas.CharacterDescription.model_validate(character, from_attributes=True)
+
+@router.get("/api/ai-models", response_model=List[schemas.AIModel])
 def get_ai_models_endpoint():
     logger.info("Fetching available AI models.")
-    models = [GEMINI_FLASH, MISTRAL_LARGE, MISTRAL_SMALL]
-    logger.debug(f"Returning AI models: {models}")
+    models = llm_factory.describe_models()
+    logger.opt(lazy=True).debug("Returning AI models: {}", lambda: truncate(models))
     return models
 
-@app.get("/")
+def require_admin(request: Request, x_admin_token: Optional[str] = Header(None)):
+    """Admits requests carrying the configured admin token; 403 when none is configured."""
+    expected = request.app.state.settings.admin_token
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (GENANA_ADMIN_TOKEN is not set)")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token.encode(), expected.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@router.post("/api/ai-models/reload", response_model=List[str], dependencies=[Depends(require_admin)])
+def reload_ai_models_endpoint():
+    """
+    Reloads the LLM clients of the worker process that serves the request only.
+    With several workers, send SIGHUP to the gunicorn master instead: it
+    restarts every worker gracefully, and each re-reads the .env file.
+    """
+    logger.info("Reloading LLM client registry.")
+    return llm_factory.reload()
+
+@router.get("/api/stats")
+def get_stats_endpoint():
+    logger.debug("Fetching runtime stats.")
+    return {
+        "http_pools": http_pools.stats(),
+        "system_prompt_cache": system_prompt_cache.stats(),
+        "prompt_caches": prompt_caches.stats(),
+        "character_cache": character_cache.stats(),
+        "description_jobs": description_jobs.stats(),
+        "circuit_breakers": circuit_breakers.stats(),
+        "rate_limiters": rate_limiters.stats(),
+        "response_cache": response_cache.stats(),
+        "single_flight": single_flight.stats(),
+        "db_maintenance": db_maintenance.stats(),
+    }
+
+@router.get("/")
 def read_root():
     logger.info("Root endpoint accessed.")
     return {"message": "Welcome to the Genana Backend!"}
 
 
-@app.post("/api/chat/{character_id}", response_model=schemas.ChatResponse)
-async def chat_with_character_endpoint(
-    character_id: str, 
-    request: schemas.ChatRequest, 
+@router.post("/api/chat/{character_id}/conversations", response_model=schemas.Conversation)
+def create_conversation_endpoint(
+    character_id: str, conversation: schemas.ConversationCreate, db: Session = Depends(database.get_db)
+):
+    logger.info(f"Creating conversation for character_id: {character_id}")
+    if crud.get_character_cached(db, character_id) is None:
+        raise HTTPException(status_code=404, detail="Character not found")
+    return crud.create_conversation(db, character_id, title=conversation.title)
+
+@router.get("/api/chat/{character_id}/conversations", response_model=List[schemas.Conversation])
+def get_conversations_endpoint(
+    character_id: str,
+    skip: int = 0,
+    limit: int = Query(default=50, ge=1, le=100),
     db: Session = Depends(database.get_db)
 ):
-    logger.info(f"Received chat request for character_id: {character_id}")
+    logger.info(f"Fetching conversations for character_id: {character_id}")
+    return crud.get_conversations_by_character(db, character_id, skip=skip, limit=limit)
 
-    # 1. Fetch Character
-    db_character = crud.get_character(db, character_id=character_id)
-    if not db_character:
-        logger.error(f"Character with id {character_id} not found.")
-        raise HTTPException(status_code=404, detail="Character not found")
+@router.get("/api/chat/{character_id}/messages", response_model=schemas.ChatHistoryPage)
+def get_chat_history_endpoint(
+    character_id: str,
+    conversation_id: Optional[str] = None,
+    before: Optional[str] = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    db: Session = Depends(database.get_db)
+):
+    logger.info(f"Fetching chat history for character_id: {character_id} conversation: {conversation_id} before: {before}")
+    if conversation_id is None:
+        conversation_id = character_id
+    else:
+        conversation = crud.get_conversation(db, conversation_id)
+        if conversation is None or conversation.character_id != character_id:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+    page = crud.get_chat_history_page(db, conversation_id, before=before, limit=limit, include_archived=True)
+    if page is None:
+        raise HTTPException(status_code=400, detail="Invalid history cursor")
+    next_cursor = history_cursor(page[-1]) if len(page) == limit else None
+    return {"messages": list(reversed(page)), "next_cursor": next_cursor}
 
-    # 2. Fetch Chat History
-    history_db = crud.get_chat_messages_by_character(db, character_id=character_id, limit=20) # Get last 20 messages
-    history_for_prompt = [{"role": msg.role, "content": msg.content} for msg in history_db]
+async def _prepare_chat(character_id: str, conversation_id: Optional[str], db, timer: StageTimer):
+    """Runs the pre-generation stages of the chat pipeline shared by the regular and streaming endpoints."""
+    # 1. Fetch Character and 3. Build System Prompt.
+    # A hot character's compiled prompt is served from cache after reading only its
+    # version, so updates made by other workers apply to the very next turn.
+    with timer.stage("fetch_character"):
+        stamps = await async_crud.get_character_version(db, character_id)
+        if stamps is None:
+            logger.error(f"Character with id {character_id} not found.")
+            raise HTTPException(status_code=404, detail="Character not found")
+        updated_at, created_at = stamps
+        compiled = system_prompt_cache.lookup(character_id, updated_at or created_at)
+        if compiled is None:
+            # Not the per-process read cache: it may hold an older version
+            db_character = await async_crud.get_character(db, character_id=character_id)
+            if not db_character:
+                logger.error(f"Character with id {character_id} not found.")
+                raise HTTPException(status_code=404, detail="Character not found")
+    if compiled is None:
+        with timer.stage("build_prompt"):
+            compiled = system_prompt_cache.get_or_build(db_character)
+    timer.model = compiled.ai_model
 
-    # 3. Build System Prompt
-    system_prompt = build_system_prompt(db_character)
+    # 2. Fetch Chat History: the summary of older turns plus the newest
+    # messages that fit the model's token budget
+    with timer.stage("fetch_history"):
+        conversation = await async_crud.resolve_conversation(db, character_id, conversation_id)
+        if conversation is None:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        context = await build_chat_context(db, character_id, conversation.id, compiled.ai_model)
+    # The summary goes with the history, keeping the system prompt cacheable
+    system_prompt = compiled.system_prompt
+    history = with_conversation_summary(context.history, context.summary)
 
-    # 4. Get LLM Client from Factory
-    try:
-        llm_client = llm_factory.get_client(db_character.ai_model)
-    except (ValueError, KeyError) as e:
-        logger.error(f"Failed to get LLM client for model {db_character.ai_model}: {e}")
-        raise HTTPException(status_code=500, detail=f"Unsupported or invalid AI model configured for character: {db_character.ai_model}")
+    # 4. Get LLM Client from Factory; the call itself goes through the
+    # resilience layer, which may fall back to other models of the character's policy
+    with timer.stage("get_client"):
+        try:
+            llm_client = llm_factory.get_client(compiled.ai_model)
+        except (ValueError, KeyError) as e:
+            logger.error(f"Failed to get LLM client for model {compiled.ai_model}: {e}")
+            raise HTTPException(status_code=500, detail=f"Unsupported or invalid AI model configured for character: {compiled.ai_model}")
 
-    # 5. Generate LLM Response
-    try:
-        llm_response_content = await llm_client.generate_text(
-            system_prompt=system_prompt,
-            user_message=request.message,
-            history=history_for_prompt
+    return compiled, system_prompt, history, llm_client, conversation.id
+
+async def _cached_reply(compiled, llm_client, system_prompt: str, history, user_message: str) -> Optional[str]:
+    """Looks the turn up in the response cache, if the character opted in."""
+    return await response_cache.get(
+        compiled.response_cache, compiled.ai_model, system_prompt, history, user_message, llm_client.generation_params
+    )
+
+async def _cache_reply(compiled, llm_client, system_prompt: str, history, user_message: str, reply: str, model: str):
+    # A fallback model's reply is not cached under the character's own model
+    if model == compiled.ai_model:
+        await response_cache.put(
+            compiled.response_cache, compiled.ai_model, system_prompt, history, user_message, llm_client.generation_params, reply
+        )
+
+def _llm_error_to_http(e: Exception, model: str) -> HTTPException:
+    """Maps an error raised by an LLM client to the HTTPException returned to the frontend."""
+    if isinstance(e, ModelBusyError):
+        return HTTPException(status_code=503, detail=f"Model {model} is busy. Please try again shortly.")
+    if isinstance(e, CircuitOpenError):
+        logger.warning(f"Circuit breaker open for model {e.model}")
+        return HTTPException(
+            status_code=503,
+            detail=f"Model {model} is temporarily unavailable. Please try again shortly.",
+            headers={"Retry-After": str(math.ceil(e.retry_after))},
+        )
+    if isinstance(e, RateLimitedError):
+        return HTTPException(
+            status_code=429,
+            detail="Too many requests to the AI provider. Please try again later.",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
         )
-    except httpx.HTTPStatusError as e:
+    if isinstance(e, httpx.HTTPStatusError):
         if e.response.status_code == 429:
-            logger.warning(f"Rate limit exceeded for model {db_character.ai_model}. Details: {e.response.text}")
-            raise HTTPException(status_code=429, detail="API rate limit exceeded. Please try again later or check your plan.")
-        else:
-            logger.error(f"HTTP error during text generation with {db_character.ai_model}: {e}")
-            raise HTTPException(status_code=e.response.status_code, detail="An external API error occurred.")
-    except Exception as e:
-        logger.error(f"An unexpected error occurred during text generation with {db_character.ai_model}: {e}")
-        raise HTTPException(status_code=500, detail="An unexpected internal error occurred.")
-
-    # 6. Save messages to DB
-    user_message_db = crud.create_chat_message(db, message_data={
-        "character_id": character_id,
-        "role": "user",
-        "content": request.message
-    })
-    assistant_message_db = crud.create_chat_message(db, message_data={
-        "character_id": character_id,
-        "role": "assistant",
-        "content": llm_response_content
-    })
+            logger.warning("Rate limit exceeded for model {}. Details: {}", model, truncate(e.response.text))
+            retry_after = e.response.headers.get("retry-after")
+            return HTTPException(
+                status_code=429,
+                detail="API rate limit exceeded. Please try again later or check your plan.",
+                headers={"Retry-After": retry_after} if retry_after else None,
+            )
+        logger.error(f"HTTP error during text generation with {model}: {e}")
+        return HTTPException(status_code=e.response.status_code, detail="An external API error occurred.")
+    logger.error(f"An unexpected error occurred during text generation with {model}: {e}")
+    return HTTPException(status_code=500, detail="An unexpected internal error occurred.")
+
+async def _save_chat_turn(db, character_id: str, conversation_id: str, user_message: str, assistant_message: str):
+    _, assistant_message_db = await async_crud.append_chat_turn(db, character_id, conversation_id, user_message, assistant_message)
+    return assistant_message_db
+
+def _sse(event: str, data: dict) -> str:
+    """Formats one Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/api/chat/{character_id}", response_model=schemas.ChatResponse)
+async def chat_with_character_endpoint(
+    character_id: str, 
+    request: schemas.ChatRequest, 
+    db = Depends(database.get_session)
+):
+    logger.info(f"Received chat request for character_id: {character_id}")
+    timer = StageTimer("chat")
+    try:
+        compiled, system_prompt, history_for_prompt, llm_client, conversation_id = await _prepare_chat(
+            character_id, request.conversation_id, db, timer
+        )
+
+        # 5. Generate LLM Response (from the response cache, or with retries and
+        # the character's fallback models)
+        with timer.stage("llm_call"):
+            llm_response_content = await _cached_reply(compiled, llm_client, system_prompt, history_for_prompt, request.message)
+            if llm_response_content is None:
+                try:
+                    llm_response_content, answered_by = await resilience.generate_text(
+                        compiled.ai_model,
+                        compiled.policy,
+                        system_prompt=system_prompt,
+                        user_message=request.message,
+                        history=history_for_prompt,
+                        cache_key=compiled.cache_key,
+                    )
+                except Exception as e:
+                    raise _llm_error_to_http(e, compiled.ai_model)
+                await _cache_reply(compiled, llm_client, system_prompt, history_for_prompt, request.message, llm_response_content, answered_by)
+
+        # 6. Save messages to DB
+        with timer.stage("persist"):
+            assistant_message_db = await _save_chat_turn(db, character_id, conversation_id, request.message, llm_response_content)
+    finally:
+        timer.finish()
 
     logger.info(f"Successfully generated response for character {character_id}")
     
     return schemas.ChatResponse(
         response=llm_response_content,
         character_id=character_id,
+        conversation_id=conversation_id,
         message_id=assistant_message_db.id
     )
 
 
+@router.post("/api/chat/{character_id}/stream")
+async def chat_stream_endpoint(
+    character_id: str,
+    request: schemas.ChatRequest,
+    db = Depends(database.get_session)
+):
+    """
+    Streaming variant of the chat endpoint. Relays the completion as Server-Sent Events:
+    a `token` event per chunk, then a single `done` event (a ChatResponse) once the
+    reply has been persisted, or an `error` event if generation fails mid-stream.
+    """
+    logger.info(f"Received streaming chat request for character_id: {character_id}")
+    timer = StageTimer("chat_stream")
+    try:
+        compiled, system_prompt, history_for_prompt, llm_client, conversation_id = await _prepare_chat(
+            character_id, request.conversation_id, db, timer
+        )
+        with timer.stage("llm_call"):
+            cached = await _cached_reply(compiled, llm_client, system_prompt, history_for_prompt, request.message)
+    except BaseException:
+        timer.finish()
+        raise
+
+    async def event_stream():
+        try:
+            if cached is not None:
+                # A cached reply is sent as a single chunk
+                chunks = [cached]
+                yield _sse("token", {"delta": cached})
+            else:
+                chunks = []
+                answered_by = []
+                stream = resilience.stream_text(
+                    compiled.ai_model,
+                    compiled.policy,
+                    system_prompt=system_prompt,
+                    user_message=request.message,
+                    history=history_for_prompt,
+                    on_model=answered_by.append,
+                    cache_key=compiled.cache_key,
+                )
+                try:
+                    # Time spent waiting on the provider; the time the client takes
+                    # to read the events is not part of the stage
+                    while True:
+                        with timer.stage("llm_call"):
+                            try:
+                                chunk = await stream.__anext__()
+                            except StopAsyncIteration:
+                                break
+                        chunks.append(chunk)
+                        yield _sse("token", {"delta": chunk})
+                except Exception as e:
+                    error = _llm_error_to_http(e, compiled.ai_model)
+                    yield _sse("error", {"status_code": error.status_code, "detail": error.detail})
+                    return
+                finally:
+                    await stream.aclose()
+                if answered_by:
+                    await _cache_reply(compiled, llm_client, system_prompt, history_for_prompt, request.message, "".join(chunks), answered_by[0])
+
+            # The request-scoped session is released before the body is streamed,
+            # so the finished turn is written through a session of its own.
+            llm_response_content = "".join(chunks)
+            with timer.stage("persist"):
+                async with database.open_session() as session:
+                    assistant_message_db = await _save_chat_turn(
+                        session, character_id, conversation_id, request.message, llm_response_content
+                    )
+                    message_id = assistant_message_db.id
+
+            logger.info(f"Successfully streamed response for character {character_id}")
+            yield _sse("done", schemas.ChatResponse(
+                response=llm_response_content,
+                character_id=character_id,
+                conversation_id=conversation_id,
+                message_id=message_id
+            ).dict())
+        finally:
+            timer.finish()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,41 @@
+"""
+Applies database migrations. Run it once per deploy, before starting the
+workers, and start them with GENANA_MIGRATE_ON_STARTUP=false:
+
+    python -m backend.migrate            # upgrade to the current schema
+    python -m backend.migrate --check    # exit code 1 if migrations are pending
+    python -m backend.migrate --vacuum   # also rebuild the SQLite file (enables incremental VACUUM)
+"""
+import argparse
+import sys
+
+from loguru import logger
+
+from .database import database, migrations
+
+
+def migrate(check: bool = False, vacuum: bool = False) -> int:
+    with database.get_engine().connect() as connection:
+        current = migrations.get_schema_version(connection)
+    target = migrations.SCHEMA_VERSION
+    if check:
+        print(f"Schema version {current}, code expects {target}.")
+        return 0 if current >= target else 1
+    # Explicit runs always reconcile tables and indexes, even at the current version
+    database.create_db_and_tables(full=True)
+    logger.info(f"Database schema is at version {target} (was {current}).")
+    if vacuum:
+        database.vacuum()
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m backend.migrate", description="Upgrade the genana database schema.")
+    parser.add_argument("--check", action="store_true", help="only report whether migrations are pending")
+    parser.add_argument("--vacuum", action="store_true", help="rebuild the SQLite file afterwards; locks the database while it runs")
+    args = parser.parse_args(argv)
+    return migrate(check=args.check, vacuum=args.vacuum)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,17 @@ from pydantic import BaseModel
 from typing import List, Optional, Union
 from datetime import datetime
 
+class LLMPolicy(BaseModel):
+    """Per-character overrides of the provider resilience defaults; unset fields keep the defaults."""
+    max_attempts: Optional[int] = None
+    retry_base_delay: Optional[float] = None
+    retry_max_delay: Optional[float] = None
+    fallback_models: Optional[List[str]] = None  # e.g. ["mistral-small-latest", "gemini-2.5-flash"]
+    circuit_breaker: Optional[bool] = None
+    # Completion cache: "off" (e.g. when replies must be fresh), "exact", or
+    # "similar", which also matches near-identical first messages like greetings
+    response_cache: Optional[str] = None
+
 class CharacterBase(BaseModel):
     # General Info
     name: str
@@ -38,6 +49,9 @@ class CharacterBase(BaseModel):
     tags: Optional[List[str]] = []
     description: Optional[str] = None
 
+    # LLM request policy
+    llm_policy: Optional[LLMPolicy] = None
+
 class CharacterCreate(CharacterBase):
     pass
 
@@ -45,10 +59,54 @@ class Character(CharacterBase):
     id: str
     created_at: datetime
     updated_at: Optional[datetime] = None
+    description_status: Optional[str] = None
+
+    class Config:
+        orm_mode = True
+
+
+class CharacterSummary(BaseModel):
+    """List-view projection of a character, without the persona fields that only feed the prompt."""
+    id: str
+    name: str
+    role: str
+    ai_model: str
+    language: Optional[str] = None
+    target_audience: Optional[str] = None
+    avatar_url: Optional[str] = None
+    tags: Optional[List[str]] = []
+    description: Optional[str] = None
+    description_status: Optional[str] = None
+    created_at: datetime
 
     class Config:
         orm_mode = True
 
+class CharacterSearchPage(BaseModel):
+    characters: List[CharacterSummary]  # best match (or newest) first
+    next_cursor: Optional[str] = None  # pass as `cursor` to fetch the next page
+
+class BulkImportItem(BaseModel):
+    line: int  # 1-based line of the NDJSON body
+    id: Optional[str] = None  # set when the character was created
+    error: Optional[str] = None  # set when the line was rejected
+
+class BulkImportResult(BaseModel):
+    created: int
+    failed: int
+    items: List[BulkImportItem]  # one per non-empty line, in input order
+
+class ConversationCreate(BaseModel):
+    title: Optional[str] = None
+
+class Conversation(ConversationCreate):
+    id: str  # the default conversation has the character's id
+    character_id: str
+    created_at: datetime
+    updated_at: Optional[datetime] = None  # time of the last chat turn
+
+    class Config:
+        orm_mode = True
 
 class ChatMessageBase(BaseModel):
     role: str
@@ -60,12 +118,25 @@ class ChatMessageCreate(ChatMessageBase):
 class ChatMessage(ChatMessageBase):
     id: str
     character_id: str
+    conversation_id: Optional[str] = None
     datetime: datetime
+    archived: bool = False  # served from the compressed history archive
 
     class Config:
         orm_mode = True
 
 
+class CharacterDescription(BaseModel):
+    id: str
+    description: Optional[str] = None
+    description_status: Optional[str] = None
+
+
+class ChatHistoryPage(BaseModel):
+    messages: List[ChatMessage]  # chronological order
+    next_cursor: Optional[str] = None  # pass as `before` to fetch the previous page
+
+
 class ReviewBase(BaseModel):
     rating: int
     comment: Optional[str] = None
@@ -81,11 +152,20 @@ class Review(ReviewBase):
     class Config:
         orm_mode = True
 
+class AIModel(BaseModel):
+    name: str
+    provider: str
+    max_concurrency: int
+    in_flight: int
+    history_tokens: int
+
 # New schemas for the chat endpoint
 class ChatRequest(BaseModel):
     message: str
+    conversation_id: Optional[str] = None  # the character's default conversation if omitted
 
 class ChatResponse(BaseModel):
     response: str
     character_id: str
+    conversation_id: str
     message_id: str
\ No newline at end of file
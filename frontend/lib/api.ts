@@ -10,6 +10,9 @@ export const API_ENDPOINTS = {
   AI_MODELS: `${API_BASE_URL}/api/ai-models`,
   // Чат
   CHAT: (id: string) => `${API_BASE_URL}/api/chat/${id}`,
+  CHAT_STREAM: (id: string) => `${API_BASE_URL}/api/chat/${id}/stream`,
+  CHAT_MESSAGES: (id: string, before?: string) =>
+    `${API_BASE_URL}/api/chat/${id}/messages${before ? `?before=${encodeURIComponent(before)}` : ""}`,
 };
 
 // Типы для API запросов
@@ -133,8 +136,8 @@ export const apiService = {
         const errorData = await response.json();
         return { success: false, error: errorData, models: [] };
       }
-      const result = await response.json();
-      return { success: true, models: result };
+      const result: { name: string }[] = await response.json();
+      return { success: true, models: result.map((model) => model.name) };
     } catch (error) {
       return { success: false, error: (error as Error).message, models: [] };
     }
@@ -159,14 +162,55 @@ export const apiService = {
     }
   },
 
-  // Получение истории чата (из данных персонажа)
-  async getChatHistory(id: string) {
-    const { success, character, error } = await this.getCharacter(id);
-    if (success && character && character.chatMessages) {
-      // Сообщения уже в camelCase благодаря transformKeysToCamelCase в getCharacter
-      return { success: true, messages: character.chatMessages };
+  // Потоковая отправка сообщения в чат (Server-Sent Events)
+  async streamChatMessage(id: string, message: string, onToken: (delta: string) => void) {
+    try {
+      const response = await fetch(API_ENDPOINTS.CHAT_STREAM(id), {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ message }),
+      });
+      if (!response.ok || !response.body) {
+        const errorData = await response.json();
+        return { success: false, error: errorData };
+      }
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const frames = buffer.split("\n\n");
+        buffer = frames.pop() || "";
+        for (const frame of frames) {
+          const event = frame.match(/^event: (.*)$/m)?.[1];
+          const data = JSON.parse(frame.match(/^data: (.*)$/m)?.[1] || "{}");
+          if (event === "token") onToken(data.delta);
+          if (event === "done") return { success: true, data: transformKeysToCamelCase(data) };
+          if (event === "error") return { success: false, error: data };
+        }
+      }
+      return { success: false, error: "Stream ended unexpectedly" };
+    } catch (error) {
+      return { success: false, error: (error as Error).message };
+    }
+  },
+
+  // Получение истории чата постранично (before — курсор предыдущей страницы)
+  async getChatHistory(id: string, before?: string) {
+    try {
+      const response = await fetch(API_ENDPOINTS.CHAT_MESSAGES(id, before));
+      if (!response.ok) {
+        const errorData = await response.json();
+        return { success: false, error: errorData, messages: [], nextCursor: null };
+      }
+      const result = transformKeysToCamelCase(await response.json());
+      const messages = result.messages.map((m: any) => ({ ...m, timestamp: m.datetime }));
+      return { success: true, messages, nextCursor: result.nextCursor as string | null };
+    } catch (error) {
+      return { success: false, error: (error as Error).message, messages: [], nextCursor: null };
     }
-    return { success: false, error: error || "Chat history not found", messages: [] };
   },
 };
 